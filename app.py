@@ -1,29 +1,199 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-import mysql.connector
 from datetime import datetime, timedelta
 import jwt
-import bcrypt
 from functools import wraps
 import os
+import hmac
+import time
+import click
 from flask import request
 from werkzeug.utils import secure_filename
-from flask_socketio import SocketIO
+from flask_socketio import ConnectionRefusedError, SocketIO, join_room
 from flask_swagger_ui import get_swaggerui_blueprint
 from flask import jsonify
+from bus import UnixSocketManager
+from cache import TTLCache
+from compression import ResponseCompressor
+from slowlog import SlowQueryLog
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsRegistry
+from jsoncodec import FastJSONProvider
+from db import ConnectionPool, DB_ERRORS, INTEGRITY_ERRORS, MySQLBackend, SQLiteBackend, normalize_statement
+from openapi import SpecCache, api_doc, build_spec
+from search import StoreSearchIndex
+from streaming import stream_query, wants_stream
+from passwords import PasswordHasher, PasswordHasherBusy
+from tokens import TokenVerifier
+from migrations import migrate, pending
+from queryplans import check_query_plans, sample_params, source_queries
+from outbox import OrderEventDispatcher, record_event
+from catalog_import import MIMETYPES, import_products, import_shops, read_records
+from rowmap import ROWS, RowMapper
+from pagination import InvalidPageRequest, NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, page_size, split_page
 
 app = Flask(__name__)
-socketio = SocketIO(app, cors_allowed_origins="*")
-CORS(app, resources={r"/*": {"origins": "*"}}) 
+# Filas con datetime/Decimal/bytes serializadas con orjson (o json si no está instalado)
+app.json = FastJSONProvider(app)
+
+# Cola de mensajes de Socket.IO entre workers: unix:///ruta.sock usa el broker
+# local de bus.py; redis://... usa Redis (requiere el paquete redis). Sin ella,
+# cada worker sólo notifica a los sockets conectados a él.
+socketio_queue = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+if socketio_queue and socketio_queue.startswith('unix://'):
+    socketio_bus = UnixSocketManager(socketio_queue)
+    socketio = SocketIO(app, cors_allowed_origins="*", client_manager=socketio_bus)
+else:
+    socketio_bus = None
+    socketio = SocketIO(app, cors_allowed_origins="*", message_queue=socketio_queue)
+CORS(app, resources={r"/*": {"origins": "*"}}, expose_headers=[NEXT_CURSOR_HEADER])
+
+# Métricas de Prometheus en /metrics; con METRICS_DIR se suman las de todos los workers
+metrics = MetricsRegistry(
+    directory=os.environ.get('METRICS_DIR'),
+    flush_interval=float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+)
+http_requests = metrics.counter('paso_http_requests_total', 'Peticiones HTTP por ruta, método y código de estado', ('route', 'method', 'status'))
+http_duration = metrics.histogram('paso_http_request_duration_seconds', 'Duración de las peticiones HTTP por ruta', ('route', 'method'))
+db_query_duration = metrics.histogram('paso_db_query_duration_seconds', 'Tiempo por sentencia SQL (ejecución y lectura de filas)', ('statement',))
+db_query_rows = metrics.counter('paso_db_query_rows_total', 'Filas leídas o afectadas por sentencia SQL', ('statement',))
+db_acquire_duration = metrics.histogram('paso_db_pool_acquire_seconds', 'Tiempo para obtener una conexión del pool')
+bcrypt_duration = metrics.histogram('paso_bcrypt_duration_seconds', 'Tiempo de bcrypt por operación', ('operation',))
+bcrypt_queue_duration = metrics.histogram('paso_bcrypt_queue_seconds', 'Espera en la cola de bcrypt por operación', ('operation',))
+socketio_emits = metrics.counter('paso_socketio_emits_total', 'Emits de Socket.IO por evento', ('event',))
+socketio_emit_rooms = metrics.counter('paso_socketio_emit_rooms_total', 'Salas alcanzadas por los emits de Socket.IO', ('event',))
+
+@app.before_request
+def start_request_timer():
+    metrics.start()
+    g.request_started = time.perf_counter()
+
+# Registrado antes que la compresión: Flask corre estos hooks en orden inverso,
+# así la duración incluye el tiempo de comprimir
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Las URLs sin ruta (404) se agrupan para no crear una serie por URL
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        http_requests.inc(route, request.method, str(response.status_code))
+        http_duration.observe(time.perf_counter() - started, route, request.method)
+    return response
+
+# Compresión gzip/brotli de las respuestas grandes (listados de tiendas, productos, viajes y pedidos)
+response_compressor = ResponseCompressor(
+    app,
+    min_size=int(os.environ.get('COMPRESS_MIN_SIZE', 500)),
+    level=int(os.environ.get('COMPRESS_LEVEL', 6)),
+    brotli_level=int(os.environ.get('COMPRESS_BROTLI_LEVEL', 5)),
+    cache_size=int(os.environ.get('COMPRESS_CACHE_SIZE', 512))
+)
 
 # Configuración de la conexión a la base de datos
 db_config = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': '',
-    'database': 'paso_db'
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'user': os.environ.get('DB_USER', 'root'),
+    'password': os.environ.get('DB_PASSWORD', ''),
+    'database': os.environ.get('DB_NAME', 'paso_db')
 }
 
+# Backend de base de datos: 'mysql' (producción) o 'sqlite' (pruebas y benchmarks)
+if os.environ.get('DB_BACKEND', 'mysql') == 'sqlite':
+    db_backend = SQLiteBackend(os.environ.get('SQLITE_PATH', 'paso_db.sqlite3'))
+else:
+    db_backend = MySQLBackend(db_config)
+
+# Pool de conexiones compartido (uno por worker de gunicorn)
+db_pool = ConnectionPool(
+    db_backend.connect,
+    size=int(os.environ.get('DB_POOL_SIZE', 5)),
+    timeout=float(os.environ.get('DB_POOL_TIMEOUT', 5)),
+    recycle=int(os.environ.get('DB_POOL_RECYCLE', 3600)),
+    ping_interval=float(os.environ.get('DB_POOL_PING_INTERVAL', 30))
+)
+
+def record_query_metrics(query, params, elapsed, rows):
+    statement = normalize_statement(query)
+    db_query_duration.observe(elapsed, statement)
+    db_query_rows.inc(statement, amount=rows)
+
+db_pool.acquire_listeners.append(db_acquire_duration.observe)
+db_pool.query_listeners.append(record_query_metrics)
+
+# Sentencias de más de SLOW_QUERY_MS a un log rotativo, con su EXPLAIN (SLOW_QUERY_LOG vacío lo apaga)
+slow_query_path = os.environ.get('SLOW_QUERY_LOG', 'slow_queries.log')
+if slow_query_path:
+    slow_query_log = SlowQueryLog(
+        slow_query_path,
+        threshold=float(os.environ.get('SLOW_QUERY_MS', 200)) / 1000,
+        max_bytes=int(os.environ.get('SLOW_QUERY_LOG_BYTES', 10 * 1024 * 1024)),
+        backup_count=int(os.environ.get('SLOW_QUERY_LOG_BACKUPS', 5)),
+        backend=db_backend,
+        connect=db_backend.connect
+    )
+    db_pool.query_listeners.append(slow_query_log)
+else:
+    slow_query_log = None
+
+# Hash de contraseñas fuera del hilo de la petición, con cola acotada
+password_hasher = PasswordHasher(
+    workers=int(os.environ.get('BCRYPT_WORKERS', os.cpu_count() or 2)),
+    queue_limit=int(os.environ.get('BCRYPT_QUEUE_LIMIT', 32)),
+    rounds=int(os.environ.get('BCRYPT_ROUNDS', 12)),
+    timeout=float(os.environ.get('BCRYPT_TIMEOUT', 10))
+)
+
+def record_bcrypt_metrics(kind, queue_time, run_time):
+    operation = 'hash' if kind == 'hashes' else 'check'
+    bcrypt_queue_duration.observe(queue_time, operation)
+    bcrypt_duration.observe(run_time, operation)
+
+password_hasher.listeners.append(record_bcrypt_metrics)
+
+# Tokens JWT ya verificados, válidos hasta su expiración
+token_verifier = TokenVerifier(maxsize=int(os.environ.get('TOKEN_CACHE_SIZE', 10000)))
+
+# Caché del catálogo (tiendas y productos); la invalidan /add-shop, /add-product y las
+# importaciones. Como la de perfiles, es de cada worker de gunicorn: un alta atendida
+# por otro worker se ve a lo más en CATALOG_CACHE_TTL segundos.
+catalog_cache = TTLCache(
+    maxsize=int(os.environ.get('CATALOG_CACHE_SIZE', 2000)),
+    ttl=float(os.environ.get('CATALOG_CACHE_TTL', 5))
+)
+
+# Tiendas indexadas para la búsqueda de /get-tiendas (nombre, ciudad y dirección)
+def load_stores_for_search():
+    connection = db_pool.get_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT id, nombre, ciudad, direccion, promedio_calificacion FROM tiendas /* full-scan */")
+        while True:
+            rows = ROWS.fetchmany(cursor, 1000)
+            if not rows:
+                break
+            yield from rows
+        cursor.close()
+    finally:
+        connection.close()
+
+store_search = StoreSearchIndex(
+    load_stores_for_search,
+    refresh_interval=float(os.environ.get('STORE_SEARCH_REFRESH', 300))
+)
+
+# Caché corta de productos, usuarios y dueños de viaje para las búsquedas por lote
+lookup_cache = TTLCache(
+    maxsize=int(os.environ.get('LOOKUP_CACHE_SIZE', 10000)),
+    ttl=float(os.environ.get('LOOKUP_CACHE_TTL', 30))
+)
+
+# Caché de /profile por usuario; la invalidan las rutas que modifican sus datos.
+# Cada worker de gunicorn tiene la suya y las invalidaciones no se comparten:
+# un cambio atendido por otro worker se ve a lo más en PROFILE_CACHE_TTL segundos.
+profile_cache = TTLCache(
+    maxsize=int(os.environ.get('PROFILE_CACHE_SIZE', 10000)),
+    ttl=float(os.environ.get('PROFILE_CACHE_TTL', 5))
+)
+
 # Configuración para Swagger
 SWAGGER_URL = '/api/docs'  # URL para acceder a la documentación
 API_URL = '/swagger'  # URL permanente para obtener el JSON de Swagger
@@ -38,294 +208,8 @@ app.register_blueprint(swaggerui_blueprint, url_prefix=SWAGGER_URL)
 
 @app.route('/swagger')
 def swagger_spec():
-    return jsonify({
-        "swagger": "2.0",
-        "info": {
-            "version": "1.0",
-            "title": "API Paso"
-        },
-        "paths": {
-            "/login": {
-                "post": {
-                    "summary": "Login",
-                    "description": "User login endpoint",
-                    "responses": {
-                        "200": {"description": "Successful login"}
-                    }
-                },
-            },
-            "/register": {
-                "post": {
-                    "summary": "Register",
-                    "description": "User registration endpoint",
-                    "responses": {
-                        "201": {"description": "Successful registration"}
-                    }
-                },
-            },
-            "/registrarViaje": {
-                "post": {
-                    "summary": "Registrar Viaje",
-                    "description": "Endpoint para registrar un nuevo viaje",
-                    "responses": {
-                        "201": {"description": "Viaje registrado exitosamente"}
-                    }
-                },
-            },
-            "/viajes/recientes": {
-                "get": {
-                    "summary": "Viajes Recientes",
-                    "description": "Obtener los 10 viajes más recientes",
-                    "responses": {
-                        "200": {"description": "Lista de viajes"}
-                    }
-                },
-            },
-            "/viajes": {
-                "get": {
-                    "summary": "Filtrar Viajes",
-                    "description": "Obtener viajes filtrados por destino y fecha de llegada",
-                    "responses": {
-                        "200": {"description": "Lista de viajes"}
-                    }
-                },
-            },
-            "/profile": {
-                "get": {
-                    "summary": "Perfil",
-                    "description": "Obtener el perfil del usuario autenticado",
-                    "responses": {
-                        "200": {"description": "Perfil del usuario"}
-                    }
-                },
-            },
-            "/update-profile-image": {
-                "put": {
-                    "summary": "Actualizar Imagen de Perfil",
-                    "description": "Actualizar la imagen de perfil del usuario autenticado",
-                    "responses": {
-                        "200": {"description": "Imagen actualizada exitosamente"}
-                    }
-                },
-            },
-            "/viaje/detalle/{trip_id}": {
-                "get": {
-                    "summary": "Detalles del Viaje",
-                    "description": "Obtener los detalles de un viaje específico",
-                    "responses": {
-                        "200": {"description": "Detalles del viaje"}
-                    }
-                },
-            },
-            "/calificarConductor": {
-                "post": {
-                    "summary": "Calificar Conductor",
-                    "description": "Calificar al conductor de un viaje",
-                    "responses": {
-                        "200": {"description": "Calificación actualizada correctamente"}
-                    }
-                },
-            },
-            "/get-tiendas": {
-                "get": {
-                    "summary": "Obtener Tiendas",
-                    "description": "Obtener tiendas filtradas por nombre, ciudad y calificación",
-                    "responses": {
-                        "200": {"description": "Lista de tiendas"}
-                    }
-                },
-            },
-            "/store-details": {
-                "get": {
-                    "summary": "Detalles de Tienda",
-                    "description": "Obtener los detalles de una tienda específica",
-                    "responses": {
-                        "200": {"description": "Detalles de la tienda"}
-                    }
-                },
-            },
-            "/products": {
-                "get": {
-                    "summary": "Obtener Productos",
-                    "description": "Obtener productos de una tienda específica",
-                    "responses": {
-                        "200": {"description": "Lista de productos"}
-                    }
-                },
-            },
-            "/cards/add": {
-                "post": {
-                    "summary": "Añadir Tarjeta",
-                    "description": "Añadir una nueva tarjeta de crédito",
-                    "responses": {
-                        "201": {"description": "Tarjeta añadida exitosamente"}
-                    }
-                },
-            },
-            "/cards": {
-                "get": {
-                    "summary": "Listar Tarjetas",
-                    "description": "Obtener las tarjetas de crédito del usuario autenticado",
-                    "responses": {
-                        "200": {"description": "Lista de tarjetas"}
-                    }
-                },
-            },
-            "/cards/delete/{card_id}": {
-                "put": {
-                    "summary": "Desactivar Tarjeta",
-                    "description": "Desactivar una tarjeta de crédito",
-                    "responses": {
-                        "200": {"description": "Tarjeta desactivada exitosamente"}
-                    }
-                },
-            },
-            "/enviarPedido": {
-                "post": {
-                    "summary": "Enviar Pedido",
-                    "description": "Enviar un nuevo pedido",
-                    "responses": {
-                        "201": {"description": "Pedido enviado exitosamente"}
-                    }
-                },
-            },
-            "/pedidos/pendientes": {
-                "get": {
-                    "summary": "Pedidos Pendientes",
-                    "description": "Obtener los pedidos pendientes del usuario autenticado",
-                    "responses": {
-                        "200": {"description": "Lista de pedidos"}
-                    }
-                },
-            },
-            "/pedidos/aceptados": {
-                "get": {
-                    "summary": "Pedidos Aceptados",
-                    "description": "Obtener los pedidos aceptados del usuario autenticado",
-                    "responses": {
-                        "200": {"description": "Lista de pedidos"}
-                    }
-                },
-            },
-            "/pedidos/rechazados": {
-                "get": {
-                    "summary": "Pedidos Rechazados",
-                    "description": "Obtener los pedidos rechazados del usuario autenticado",
-                    "responses": {
-                        "200": {"description": "Lista de pedidos"}
-                    }
-                },
-            },
-            "/pedidos/en-progreso": {
-                "get": {
-                    "summary": "Pedidos en Progreso",
-                    "description": "Obtener los pedidos en progreso del usuario autenticado",
-                    "responses": {
-                        "200": {"description": "Lista de pedidos"}
-                    }
-                },
-            },
-            "/viajes/en-progreso": {
-                "get": {
-                    "summary": "Viajes en Progreso",
-                    "description": "Obtener los viajes en progreso del usuario autenticado",
-                    "responses": {
-                        "200": {"description": "Lista de viajes"}
-                    }
-                },
-            },
-            "/notificaciones/descartar/{order_id}": {
-                "put": {
-                    "summary": "Descartar Notificación",
-                    "description": "Descartar una notificación de pedido",
-                    "responses": {
-                        "200": {"description": "Notificación descartada exitosamente"}
-                    }
-                },
-            },
-            "/pedidos/{order_id}/estado": {
-                "put": {
-                    "summary": "Actualizar Estado de Pedido",
-                    "description": "Actualizar el estado de un pedido",
-                    "responses": {
-                        "200": {"description": "Estado actualizado correctamente"}
-                    }
-                },
-            },
-            "/pedidos/{order_id}/entregado": {
-                "put": {
-                    "summary": "Marcar Pedido como Entregado",
-                    "description": "Marcar un pedido como entregado",
-                    "responses": {
-                        "200": {"description": "Pedido marcado como entregado con éxito"}
-                    }
-                },
-            },
-            "/producto/{product_id}": {
-                "get": {
-                    "summary": "Obtener Producto",
-                    "description": "Obtener un producto por su ID",
-                    "responses": {
-                        "200": {"description": "Detalles del producto"}
-                    }
-                },
-            },
-            "/usuario/{user_id}": {
-                "get": {
-                    "summary": "Obtener Usuario",
-                    "description": "Obtener un usuario por su ID",
-                    "responses": {
-                        "200": {"description": "Detalles del usuario"}
-                    }
-                },
-            },
-            "/viaje/propietario/{trip_id}": {
-                "get": {
-                    "summary": "Obtener Propietario del Viaje",
-                    "description": "Obtener el propietario de un viaje por su ID",
-                    "responses": {
-                        "200": {"description": "Detalles del propietario del viaje"}
-                    }
-                },
-            },
-            "/add-shop": {
-                "post": {
-                    "summary": "Añadir Tienda",
-                    "description": "Añadir una nueva tienda",
-                    "responses": {
-                        "201": {"description": "Tienda añadida exitosamente"}
-                    }
-                },
-            },
-            "/shops": {
-                "get": {
-                    "summary": "Obtener Tiendas",
-                    "description": "Obtener todas las tiendas",
-                    "responses": {
-                        "200": {"description": "Lista de tiendas"}
-                    }
-                },
-            },
-            "/add-product": {
-                "post": {
-                    "summary": "Añadir Producto",
-                    "description": "Añadir un nuevo producto",
-                    "responses": {
-                        "201": {"description": "Producto añadido exitosamente"}
-                    }
-                },
-            },
-            "/": {
-                "get": {
-                    "summary": "Health Check",
-                    "description": "Verificar que el servidor funcione correctamente",
-                    "responses": {
-                        "200": {"description": "El servidor está funcionando correctamente"}
-                    }
-                },
-            },
-        }
-    })
+    # Especificación precalculada al arrancar (ver final del módulo)
+    return swagger_cache.response(request)
 
 # Decorador para proteger las rutas con autenticación JWT
 def token_required(f):
@@ -339,19 +223,58 @@ def token_required(f):
             return jsonify({'message': 'Token es necesario'}), 403
 
         try:
-            # Decodificar el token
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-            current_user = data['user_id']  # Obtener el user_id del token
+            # Decodificar el token (o tomarlo de la caché de tokens ya verificados)
+            current_user = token_verifier.verify(token, app.config['SECRET_KEY'])
         except jwt.ExpiredSignatureError:
             return jsonify({'message': 'El token ha expirado'}), 403
         except jwt.InvalidTokenError:
             return jsonify({'message': 'Token inválido'}), 403
 
         return f(current_user, *args, **kwargs)
+    decorator.requires_token = True
     return decorator
 
+# Rutas de operación (/metrics, /internal/stats): sólo desde INTERNAL_ALLOWED_IPS (loopback
+# por defecto) o con `Authorization: Bearer <INTERNAL_TOKEN>`. Detrás de un proxy en la misma
+# máquina todas las peticiones llegan desde 127.0.0.1: ahí conviene vaciar la lista y usar el token.
+INTERNAL_ALLOWED_IPS = {ip.strip() for ip in os.environ.get('INTERNAL_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip.strip()}
+INTERNAL_TOKEN = os.environ.get('INTERNAL_TOKEN')
+
+def internal_only(f):
+    @wraps(f)
+    def decorator(*args, **kwargs):
+        authorization = request.headers.get('Authorization', '').encode('utf-8')
+        if INTERNAL_TOKEN and hmac.compare_digest(authorization, f'Bearer {INTERNAL_TOKEN}'.encode('utf-8')):
+            return f(*args, **kwargs)
+        if request.remote_addr in INTERNAL_ALLOWED_IPS:
+            return f(*args, **kwargs)
+        return jsonify({'message': 'Acceso restringido'}), 403
+    return decorator
+
+# Respuesta cuando el pool de bcrypt está saturado
+def busy_response(error):
+    response = jsonify({'error': str(error)})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+# Volver a hashear la contraseña con el costo actual (best effort, no afecta al login)
+def rehash_password(user_id, password):
+    try:
+        new_hash = password_hasher.hash(password)
+        connection = db_pool.get_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("UPDATE usuarios SET contraseña = %s WHERE id = %s", (new_hash, user_id))
+            connection.commit()
+            cursor.close()
+        finally:
+            connection.close()
+    except (PasswordHasherBusy, *DB_ERRORS):
+        pass
+
 # Ruta para registrar usuarios
 @app.route('/register', methods=['POST'])
+@api_doc('Register', 'User registration endpoint', '201', 'Successful registration')
 def register():
     try:
         data = request.json
@@ -371,10 +294,10 @@ def register():
             return jsonify({'error': 'El usuario debe ser mayor de 18 años.'}), 400
 
         # Encriptar la contraseña
-        hashed_password = bcrypt.hashpw(data['contraseña'].encode('utf-8'), bcrypt.gensalt())
+        hashed_password = password_hasher.hash(data['contraseña'])
 
         # Conectar a la base de datos
-        connection = mysql.connector.connect(**db_config)
+        connection = db_pool.get_connection()
         cursor = connection.cursor()
 
         # Verificar si el correo ya está registrado
@@ -391,7 +314,7 @@ def register():
         cursor.execute(query_insert_user, (
             data['usuario'],
             data['correo'],
-            hashed_password.decode('utf-8'),  # Guardar la contraseña encriptada como string
+            hashed_password,  # Guardar la contraseña encriptada como string
             data['APaterno'],
             data['AMaterno'],
             data['fecha_nacimiento'],
@@ -416,7 +339,9 @@ def register():
         connection.commit()
 
         return jsonify({'message': 'Usuario y perfil registrados exitosamente.'}), 201
-    except mysql.connector.Error as db_err:
+    except PasswordHasherBusy as busy:
+        return busy_response(busy)
+    except DB_ERRORS as db_err:
         return jsonify({'error': f'Error en la base de datos: {str(db_err)}'}), 500
     except Exception as e:
         return jsonify({'error': f'Error en el servidor: {str(e)}'}), 500
@@ -428,6 +353,7 @@ def register():
 
 
 @app.route('/login', methods=['POST'])
+@api_doc('Login', 'User login endpoint', '200', 'Successful login')
 def login():
     try:
         data = request.json
@@ -435,7 +361,7 @@ def login():
         password = data['password']
 
         # Conectar a la base de datos
-        connection = mysql.connector.connect(**db_config)
+        connection = db_pool.get_connection()
         cursor = connection.cursor()
 
         # Verificar si el correo existe
@@ -443,13 +369,22 @@ def login():
         cursor.execute(query_check_user, (correo,))
         user = cursor.fetchone()
 
+        # Liberar la conexión antes de verificar la contraseña (bcrypt tarda cientos de ms)
+        cursor.close()
+        connection.close()
+        del cursor, connection
+
         if not user:
             return jsonify({'error': 'Correo o contraseña incorrectos.'}), 400
 
         # Verificar la contraseña
-        if not bcrypt.checkpw(password.encode('utf-8'), user[2].encode('utf-8')):
+        if not password_hasher.check(password, user[2]):
             return jsonify({'error': 'Correo o contraseña incorrectos.'}), 400
 
+        # Actualizar hashes guardados con un costo menor al configurado
+        if password_hasher.needs_rehash(user[2]):
+            rehash_password(user[0], password)
+
         # Asegurarse de que la clave secreta sea una cadena de texto
         if not isinstance(app.config['SECRET_KEY'], str):
             app.config['SECRET_KEY'] = '137950'  # O usa os.urandom(24)
@@ -466,6 +401,8 @@ def login():
 
         return jsonify({'message': 'Login exitoso', 'token': token}), 200
 
+    except PasswordHasherBusy as busy:
+        return busy_response(busy)
     except Exception as e:
         return jsonify({'error': f'Error en el servidor: {str(e)}'}), 500
     finally:
@@ -474,6 +411,7 @@ def login():
         
 # Ruta para registrar un viaje
 @app.route('/registrarViaje', methods=['POST'])
+@api_doc('Registrar Viaje', 'Endpoint para registrar un nuevo viaje', '201', 'Viaje registrado exitosamente')
 @token_required
 def registrar_viaje(current_user):
     data = request.json
@@ -485,7 +423,7 @@ def registrar_viaje(current_user):
             return jsonify({'error': f'Campos faltantes: {", ".join(missing_fields)}'}), 400
 
         # Conectar a la base de datos
-        connection = mysql.connector.connect(**db_config)
+        connection = db_pool.get_connection()
         cursor = connection.cursor()
 
         # Registrar el viaje
@@ -493,7 +431,6 @@ def registrar_viaje(current_user):
             INSERT INTO viajes (usuario_id, departure_city, destination, arrival_date, return_date, cold_containers, hot_containers, comments)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s);
         """
-        print("Ejecutando consulta SQL...")
         cursor.execute(query_insert_trip, (
             current_user,
             data['departureCity'],
@@ -504,15 +441,16 @@ def registrar_viaje(current_user):
             data['hotContainers'],
             data.get('comments', '')
         ))
+
+        # Contador de viajes del perfil, en la misma transacción
+        cursor.execute("UPDATE profiles SET travel_count = travel_count + 1 WHERE user_id = %s", (current_user,))
         connection.commit()
-        print("Viaje registrado exitosamente.")
+        profile_cache.invalidate(current_user)
 
         return jsonify({'message': 'Viaje registrado exitosamente.'}), 201
-    except mysql.connector.Error as db_err:
-        print(f'Error en la base de datos: {str(db_err)}')
+    except DB_ERRORS as db_err:
         return jsonify({'error': f'Error en la base de datos: {str(db_err)}'}), 500
     except Exception as e:
-        print(f'Error al registrar el viaje: {str(e)}')
         return jsonify({'error': f'Error al registrar el viaje: {str(e)}'}), 500
     finally:
         if 'cursor' in locals():
@@ -521,10 +459,11 @@ def registrar_viaje(current_user):
             connection.close()
             
 @app.route('/viajes/recientes', methods=['GET'])
+@api_doc('Viajes Recientes', 'Obtener los 10 viajes más recientes', '200', 'Lista de viajes')
 def get_recent_trips():
     try:
-        connection = mysql.connector.connect(**db_config)
-        cursor = connection.cursor(dictionary=True)
+        connection = db_pool.get_connection()
+        cursor = connection.cursor()
 
         query = """
             SELECT id, departure_city AS ciudad_salida, destination AS ciudad_destino,
@@ -534,106 +473,136 @@ def get_recent_trips():
             LIMIT 10;
         """
         cursor.execute(query)
-        trips = cursor.fetchall()
+        trips = ROWS.fetchall(cursor)
         return jsonify({'trips': trips}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     finally:
-        cursor.close()
-        connection.close()
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
+
+# Consulta de /viajes con sus filtros opcionales, ordenada por (arrival_date, id)
+def build_trips_query(destination, arrival_date, after):
+    query_conditions = []
+    params = []
+
+    if destination:
+        query_conditions.append("destination = %s")
+        params.append(destination)
+
+    if arrival_date:
+        query_conditions.append("arrival_date = %s")
+        params.append(arrival_date)
+
+    if after:
+        query_conditions.append("(arrival_date > %s OR (arrival_date = %s AND id > %s))")
+        params.extend([after[0], after[0], after[1]])
+
+    query_condition = " AND ".join(query_conditions)
+    query = f"""
+        SELECT id, departure_city AS ciudad_salida, destination AS ciudad_destino,
+               arrival_date AS fecha_salida, return_date AS fecha_regreso
+        FROM viajes
+        {f'WHERE {query_condition}' if query_condition else ''}
+        ORDER BY arrival_date, id
+    """
+    return query, params
 
 @app.route('/viajes', methods=['GET'])
+@api_doc('Filtrar Viajes', 'Obtener viajes filtrados por destino y fecha de llegada (paginado con limit y cursor; stream=1 o Accept: application/x-ndjson para descargarlos todos)', '200', 'Lista de viajes')
 def get_filtered_trips():
     try:
         destination = request.args.get('destination')  # Ciudad de destino
         arrival_date = request.args.get('arrival_date')  # Fecha de llegada
+        limit = page_size(request.args)
+        after = decode_cursor(request.args, 2)  # (arrival_date, id) del último viaje visto
 
-        query_conditions = []
-        params = []
+        query, params = build_trips_query(destination, arrival_date, after)
 
-        if destination:
-            query_conditions.append("destination = %s")
-            params.append(destination)
+        # Descarga completa sin paginar (herramientas de administración)
+        if wants_stream(request):
+            return stream_query(db_pool, request, query, params, wrap_key='trips')
 
-        if arrival_date:
-            query_conditions.append("arrival_date = %s")
-            params.append(arrival_date)
+        query += " LIMIT %s"
+        params.append(limit + 1)  # Una fila extra indica si hay otra página
 
-        query_condition = " AND ".join(query_conditions)
-        query = f"""
-            SELECT id, departure_city AS ciudad_salida, destination AS ciudad_destino,
-                   arrival_date AS fecha_salida, return_date AS fecha_regreso
-            FROM viajes
-            {f'WHERE {query_condition}' if query_condition else ''}
-            ORDER BY arrival_date;
-        """
-
-        connection = mysql.connector.connect(**db_config)
-        cursor = connection.cursor(dictionary=True)
+        connection = db_pool.get_connection()
+        cursor = connection.cursor()
         cursor.execute(query, params)
-        trips = cursor.fetchall()
-
-        return jsonify({'trips': trips}), 200
+        trips, next_cursor = split_page(ROWS.fetchall(cursor), limit, lambda t: (t['fecha_salida'], t['id']))
+
+        response = jsonify({'trips': trips, 'next_cursor': next_cursor})
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return response, 200
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     finally:
-        cursor.close()
-        connection.close()
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
 
 
 @app.route('/profile', methods=['GET'])
+@api_doc('Perfil', 'Obtener el perfil del usuario autenticado', '200', 'Perfil del usuario')
 @token_required
 def get_profile(current_user):
-    try:
-        connection = mysql.connector.connect(**db_config)
-        cursor = connection.cursor(dictionary=True)
-
-        # Consultar el número de viajes y pedidos
-        query_travels_count = "SELECT COUNT(*) AS travel_count FROM viajes WHERE usuario_id = %s"
-        cursor.execute(query_travels_count, (current_user,))
-        travel_count = cursor.fetchone()['travel_count']
+    cached = profile_cache.get(current_user)
+    if cached is not None:
+        return jsonify(cached), 200
 
-        query_orders_count = "SELECT COUNT(*) AS order_count FROM pedidos WHERE usuario_id = %s"
-        cursor.execute(query_orders_count, (current_user,))
-        order_count = cursor.fetchone()['order_count']
+    try:
+        snapshot = profile_cache.snapshot()
+        connection = db_pool.get_connection()
+        cursor = connection.cursor()
 
-        # Consultar el perfil y la imagen
+        # Perfil, contadores y tarjetas activas en una sola consulta
+        # (una fila por tarjeta activa, o una sola fila sin tarjeta)
         query_get_profile = """
-            SELECT username, bio, image_url 
-            FROM profiles 
-            WHERE user_id = %s 
+            SELECT pr.username, pr.bio, pr.image_url, pr.travel_count, pr.order_count,
+                   t.id AS card_id, t.nombre_en_tarjeta, t.numero_enmascarado,
+                   t.fecha_expiracion, t.tipo_tarjeta
+            FROM profiles pr
+            LEFT JOIN tarjetas t ON t.usuario_id = pr.user_id AND t.estado = 'activo'
+            WHERE pr.user_id = %s
+            ORDER BY t.id
         """
         cursor.execute(query_get_profile, (current_user,))
-        profile = cursor.fetchone()
+        rows = ROWS.fetchall(cursor)
 
-        if not profile:
+        if not rows:
             return jsonify({'error': 'Perfil no encontrado.'}), 404
 
         # Crear el diccionario del perfil
+        profile = rows[0]
         profile_data = {
             'user_id': current_user,
             'username': profile['username'],
             'bio': profile['bio'],
-            'travelCount': travel_count,
-            'orderCount': order_count,
-            'image_url': profile['image_url']
+            'travelCount': profile['travel_count'],
+            'orderCount': profile['order_count'],
+            'image_url': profile['image_url'],
+            'cards': [
+                {
+                    'id': row['card_id'],
+                    'nombre_en_tarjeta': row['nombre_en_tarjeta'],
+                    'numero_enmascarado': row['numero_enmascarado'],
+                    'fecha_expiracion': row['fecha_expiracion'],
+                    'tipo_tarjeta': row['tipo_tarjeta']
+                }
+                for row in rows if row['card_id'] is not None
+            ]
         }
-
-        # Consultar solo tarjetas activas relacionadas al usuario
-        query_get_cards = """
-            SELECT id, nombre_en_tarjeta, numero_enmascarado, fecha_expiracion, tipo_tarjeta 
-            FROM tarjetas 
-            WHERE usuario_id = %s AND estado = 'activo'
-        """
-        cursor.execute(query_get_cards, (current_user,))
-        cards = cursor.fetchall()
-
-        # Añadir las tarjetas al resultado del perfil
-        profile_data['cards'] = cards
+        profile_cache.set(current_user, profile_data, since=snapshot)
 
         return jsonify(profile_data), 200
 
-    except mysql.connector.Error as db_err:
+    except DB_ERRORS as db_err:
         return jsonify({'error': f'Error en la base de datos: {str(db_err)}'}), 500
     except Exception as e:
         return jsonify({'error': f'Error en el servidor: {str(e)}'}), 500
@@ -645,6 +614,7 @@ def get_profile(current_user):
 
 
 @app.route('/update-profile-image', methods=['PUT'])
+@api_doc('Actualizar Imagen de Perfil', 'Actualizar la imagen de perfil del usuario autenticado', '200', 'Imagen actualizada exitosamente')
 @token_required
 def update_profile_image(current_user):
     try:
@@ -656,7 +626,7 @@ def update_profile_image(current_user):
             return jsonify({'error': 'Falta la URL de la nueva imagen.'}), 400
 
         # Conectar a la base de datos
-        connection = mysql.connector.connect(**db_config)
+        connection = db_pool.get_connection()
         cursor = connection.cursor()
 
         # Actualizar la URL de la imagen en el perfil del usuario
@@ -667,10 +637,11 @@ def update_profile_image(current_user):
         """
         cursor.execute(query_update_image, (new_image_url, current_user))
         connection.commit()
+        profile_cache.invalidate(current_user)
 
         return jsonify({'message': 'Imagen actualizada exitosamente.'}), 200
 
-    except mysql.connector.Error as db_err:
+    except DB_ERRORS as db_err:
         return jsonify({'error': f'Error en la base de datos: {str(db_err)}'}), 500
     except Exception as e:
         return jsonify({'error': f'Error en el servidor: {str(e)}'}), 500
@@ -680,13 +651,30 @@ def update_profile_image(current_user):
         if 'connection' in locals():
             connection.close()
 
+# Respuesta de /viaje/detalle armada directamente desde la tupla de la consulta
+TRIP_DETAILS = RowMapper(
+    nested={'conductor': {
+        'nombre': 'conductor_nombre',
+        'viajes_realizados': 'viajes_realizados',
+        'calificacion': 'calificacion',
+        'cantidad_calificaciones': 'cantidad_calificaciones',
+        'imagen': 'conductor_imagen'
+    }},
+    defaults={
+        'comentarios': 'No hay comentarios disponibles.',
+        'contenedor_caliente': 'No disponible',
+        'contenedor_frio': 'No disponible'
+    }
+)
+
 @app.route('/viaje/detalle/<int:trip_id>', methods=['GET'])
+@api_doc('Detalles del Viaje', 'Obtener los detalles de un viaje específico', '200', 'Detalles del viaje')
 @token_required  # Asegúrate de que solo usuarios autenticados puedan acceder a esta ruta
 def get_trip_details(current_user, trip_id):
     try:
         # Conectar a la base de datos
-        connection = mysql.connector.connect(**db_config)
-        cursor = connection.cursor(dictionary=True)
+        connection = db_pool.get_connection()
+        cursor = connection.cursor()
 
         # Consultar los detalles del viaje y la información del conductor
         query_trip_details = """
@@ -709,30 +697,11 @@ def get_trip_details(current_user, trip_id):
             WHERE v.id = %s
         """
         cursor.execute(query_trip_details, (trip_id,))
-        trip_details = cursor.fetchone()
+        trip_data = TRIP_DETAILS.fetchone(cursor)
 
-        if not trip_details:
+        if not trip_data:
             return jsonify({'error': 'Viaje no encontrado.'}), 404
 
-        # Crear el diccionario de los detalles del viaje
-        trip_data = {
-            'id': trip_details['id'],
-            'ciudad_salida': trip_details['ciudad_salida'],
-            'ciudad_destino': trip_details['ciudad_destino'],
-            'fecha_salida': trip_details['fecha_salida'],
-            'fecha_regreso': trip_details['fecha_regreso'],
-            'comentarios': trip_details['comentarios'] if trip_details['comentarios'] else 'No hay comentarios disponibles.',
-            'contenedor_caliente': trip_details['contenedor_caliente'] if trip_details['contenedor_caliente'] else 'No disponible',
-            'contenedor_frio': trip_details['contenedor_frio'] if trip_details['contenedor_frio'] else 'No disponible',
-            'conductor': {
-                'nombre': trip_details['conductor_nombre'],
-                'viajes_realizados': trip_details['viajes_realizados'],
-                'calificacion': trip_details['calificacion'],
-                'cantidad_calificaciones': trip_details['cantidad_calificaciones'],
-                'imagen': trip_details['conductor_imagen']
-            }
-        }
-
         return jsonify(trip_data), 200
 
     except Exception as e:
@@ -743,7 +712,23 @@ def get_trip_details(current_user, trip_id):
         if 'connection' in locals():
             connection.close()
 
+# Con RATINGS_DEFERRED=1 las calificaciones sólo se guardan y `flask recompute-ratings`
+# (programado cada pocos segundos) las suma al perfil por lotes: las ráfagas de
+# calificaciones no se forman en fila sobre la misma fila de profiles
+RATINGS_DEFERRED = os.environ.get('RATINGS_DEFERRED') == '1'
+
+# Suma n calificaciones (con su total) al promedio del conductor en una sola sentencia.
+# rating va primero: MySQL evalúa las asignaciones en orden y así usa el rating_count anterior
+# (el 1.0 evita la división entera en SQLite)
+APPLY_RATINGS_QUERY = """
+    UPDATE profiles
+    SET rating = (1.0 * rating * rating_count + %s) / (rating_count + %s),
+        rating_count = rating_count + %s
+    WHERE user_id = %s
+"""
+
 @app.route('/calificarConductor', methods=['POST'])
+@api_doc('Calificar Conductor', 'Calificar al conductor de un viaje (una vez por viaje y usuario)', '200', 'Calificación actualizada correctamente')
 @token_required
 def rate_driver(current_user):
     if not current_user:
@@ -751,11 +736,17 @@ def rate_driver(current_user):
     data = request.json
     try:
         trip_id = data['tripId']
-        rating = data['rating']  # Valor de calificación (por ejemplo, entre 1 y 5)
+        rating = data['rating']  # Valor de calificación: entero entre 1 y 5
+        # Sólo enteros (4.0 cuenta como 4): la columna es TINYINT en MySQL e INTEGER en SQLite,
+        # y el modo diferido suma lo guardado; un 4.5 daría promedios distintos en cada modo
+        if isinstance(rating, float) and rating.is_integer():
+            rating = int(rating)
+        if isinstance(rating, bool) or not isinstance(rating, int) or not 1 <= rating <= 5:
+            return jsonify({'error': 'La calificación debe ser un número entero entre 1 y 5.'}), 400
 
         # Conectar a la base de datos
-        connection = mysql.connector.connect(**db_config)
-        cursor = connection.cursor()
+        connection = db_pool.get_connection()
+        cursor = connection.cursor(dictionary=True)
 
         # Obtener el usuario (conductor) que creó el viaje
         query_get_driver = """
@@ -769,33 +760,23 @@ def rate_driver(current_user):
         if not driver_id:
             return jsonify({'error': 'Viaje no encontrado.'}), 404
 
-        # Consultar el perfil del conductor
-        query_get_profile = """
-            SELECT rating, rating_count
-            FROM profiles
-            WHERE user_id = %s
+        # La clave única (viaje_id, calificador_id) evita calificar dos veces el mismo viaje
+        query_insert_rating = """
+            INSERT INTO calificaciones (viaje_id, calificador_id, conductor_id, calificacion, aplicada)
+            VALUES (%s, %s, %s, %s, %s)
         """
-        cursor.execute(query_get_profile, (driver_id['usuario_id'],))
-        profile = cursor.fetchone()
+        cursor.execute(query_insert_rating, (trip_id, current_user, driver_id['usuario_id'], rating, int(not RATINGS_DEFERRED)))
 
-        if not profile:
-            return jsonify({'error': 'Perfil de conductor no encontrado.'}), 404
-
-        # Calcular nueva calificación promedio
-        new_rating_count = profile['rating_count'] + 1
-        new_rating = ((profile['rating'] * profile['rating_count']) + rating) / new_rating_count
-
-        # Actualizar calificación y contador en la tabla profiles
-        query_update_profile = """
-            UPDATE profiles
-            SET rating = %s, rating_count = %s
-            WHERE user_id = %s
-        """
-        cursor.execute(query_update_profile, (new_rating, new_rating_count, driver_id['usuario_id']))
+        # Promedio y contador en la misma transacción, sin leerlos antes
+        if not RATINGS_DEFERRED:
+            cursor.execute(APPLY_RATINGS_QUERY, (rating, 1, 1, driver_id['usuario_id']))
         connection.commit()
+        profile_cache.invalidate(driver_id['usuario_id'])
 
         return jsonify({'message': 'Calificación actualizada correctamente.'}), 200
 
+    except INTEGRITY_ERRORS:
+        return jsonify({'error': 'Ya calificaste a este conductor en este viaje.'}), 409
     except Exception as e:
         return jsonify({'error': f'Error al calificar al conductor: {str(e)}'}), 500
     finally:
@@ -803,94 +784,177 @@ def rate_driver(current_user):
             cursor.close()
         if 'connection' in locals():
             connection.close()
-            
+
+# Respuesta de un listado paginado (arreglo JSON + encabezado con el siguiente cursor)
+def page_response(rows, next_cursor):
+    response = jsonify(rows)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response, 200
+
+# Consulta de /get-tiendas sin texto: filtros por ciudad y calificación, paginada por id
+def build_stores_query(city, rating, after):
+    query_conditions = []
+    params = []
+
+    # Filtro por ciudad
+    if city:
+        query_conditions.append("ciudad = %s")
+        params.append(city)
+
+    # Filtro por calificación promedio
+    if rating:
+        query_conditions.append("promedio_calificacion >= %s")
+        params.append(rating)
+
+    # Paginación por id
+    query_conditions.append("id > %s")
+    params.append(after[0] if after else 0)
+
+    return f"SELECT * FROM tiendas WHERE {' AND '.join(query_conditions)} ORDER BY id", params
+
 @app.route('/get-tiendas', methods=['GET'])
+@api_doc('Obtener Tiendas', 'Buscar tiendas por nombre, ciudad o dirección (sin acentos, por prefijo o subcadena, ordenadas por relevancia) y filtrarlas por ciudad y calificación (paginado con limit y cursor)', '200', 'Lista de tiendas')
 def get_tiendas():
     try:
         # Obtener los parámetros de búsqueda de la solicitud
         search = request.args.get('search', '')
         city = request.args.get('city', '')
         rating = request.args.get('rating', '')
+        limit = page_size(request.args)
+        after = decode_cursor(request.args, 1)
+
+        cache_key = ('tiendas', search, city, rating, after[0] if after else 0, limit)
+        cached = catalog_cache.get(cache_key)
+        if cached is not None:
+            return page_response(*cached)
+        snapshot = catalog_cache.snapshot()
+
+        # Búsqueda por texto: el índice en memoria decide qué tiendas y en qué orden
+        if search:
+            try:
+                min_rating = float(rating) if rating else None
+            except ValueError:
+                return jsonify({'error': 'La calificación debe ser numérica.'}), 400
+            ranked_ids = store_search.search(search, city=city, min_rating=min_rating)
+
+            # El cursor es la posición dentro del ranking
+            offset = after[0] if after else 0
+            if not isinstance(offset, int) or offset < 0:
+                raise InvalidPageRequest('Cursor inválido.')
+            page_ids = ranked_ids[offset:offset + limit]
+            next_cursor = encode_cursor((offset + limit,)) if offset + limit < len(ranked_ids) else None
+
+            shops = []
+            if page_ids:
+                connection = db_pool.get_connection()
+                cursor = connection.cursor()
+                placeholders = ', '.join(['%s'] * len(page_ids))
+                cursor.execute("SELECT * FROM tiendas WHERE id IN ({})".format(placeholders), page_ids)
+                by_id = {shop['id']: shop for shop in ROWS.fetchall(cursor)}
+                shops = [by_id[store_id] for store_id in page_ids if store_id in by_id]
+
+            catalog_cache.set(cache_key, (shops, next_cursor), since=snapshot)
+            return page_response(shops, next_cursor)
 
         # Conectar a la base de datos
-        connection = mysql.connector.connect(**db_config)
-        cursor = connection.cursor(dictionary=True)
-
-        # Consulta básica para obtener tiendas
-        query = "SELECT * FROM tiendas WHERE nombre LIKE %s"
-        params = [f"%{search}%"]
-
-        # Filtro por ciudad
-        if city:
-            query += " AND ciudad = %s"
-            params.append(city)
-
-        # Filtro por calificación promedio
-        if rating:
-            query += " AND promedio_calificacion >= %s"
-            params.append(rating)
+        connection = db_pool.get_connection()
+        cursor = connection.cursor()
 
         # Ejecutar la consulta
-        cursor.execute(query, params)
-        shops = cursor.fetchall()
+        query, params = build_stores_query(city, rating, after)
+        cursor.execute(query + " LIMIT %s", params + [limit + 1])
+        shops, next_cursor = split_page(ROWS.fetchall(cursor), limit, lambda shop: (shop['id'],))
+        catalog_cache.set(cache_key, (shops, next_cursor), since=snapshot)
 
-        # Cerrar la conexión
-        cursor.close()
-        connection.close()
+        return page_response(shops, next_cursor)
 
-        return jsonify(shops), 200
-
-    except mysql.connector.Error as err:
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
+    except DB_ERRORS as err:
         return jsonify({"error": str(err)}), 500
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
     
 @app.route('/store-details', methods=['GET'])
+@api_doc('Detalles de Tienda', 'Obtener los detalles de una tienda específica', '200', 'Detalles de la tienda')
 def get_store_details():
     try:
         store_id = request.args.get('store_id')
         if not store_id:
             return jsonify({'error': 'ID de tienda no proporcionado.'}), 400
 
-        connection = mysql.connector.connect(**db_config)
-        cursor = connection.cursor(dictionary=True)
+        cache_key = ('store', str(store_id))
+        store = catalog_cache.get(cache_key)
+        if store is not None:
+            return jsonify(store), 200
+        snapshot = catalog_cache.snapshot()
+
+        connection = db_pool.get_connection()
+        cursor = connection.cursor()
 
         query = "SELECT * FROM tiendas WHERE id = %s"
         cursor.execute(query, (store_id,))
-        store = cursor.fetchone()
-
-        cursor.close()
-        connection.close()
+        store = ROWS.fetchone(cursor)
 
         if not store:
             return jsonify({'error': 'Tienda no encontrada.'}), 404
+        catalog_cache.set(cache_key, store, since=snapshot)
 
         return jsonify(store), 200
 
-    except mysql.connector.Error as err:
+    except DB_ERRORS as err:
         return jsonify({"error": str(err)}), 500
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
 
 @app.route('/products', methods=['GET'])
+@api_doc('Obtener Productos', 'Obtener productos de una tienda específica (paginado con limit y cursor; stream=1 o Accept: application/x-ndjson para descargarlos todos)', '200', 'Lista de productos')
 def get_products():
     try:
         store_id = request.args.get('store_id')
         if not store_id:
             return jsonify({'error': 'ID de tienda no proporcionado.'}), 400
+        limit = page_size(request.args)
+        after = decode_cursor(request.args, 1)
 
-        connection = mysql.connector.connect(**db_config)
-        cursor = connection.cursor(dictionary=True)
+        query = "SELECT * FROM productos WHERE tienda_id = %s AND id > %s ORDER BY id"
+        if wants_stream(request):
+            return stream_query(db_pool, request, query, (store_id, after[0] if after else 0))
 
-        query = "SELECT * FROM productos WHERE tienda_id = %s"
-        cursor.execute(query, (store_id,))
-        products = cursor.fetchall()
+        cache_key = ('products', str(store_id), after[0] if after else 0, limit)
+        cached = catalog_cache.get(cache_key)
+        if cached is not None:
+            return page_response(*cached)
+        snapshot = catalog_cache.snapshot()
 
-        cursor.close()
-        connection.close()
+        connection = db_pool.get_connection()
+        cursor = connection.cursor()
+
+        cursor.execute(query + " LIMIT %s", (store_id, after[0] if after else 0, limit + 1))
+        products, next_cursor = split_page(ROWS.fetchall(cursor), limit, lambda product: (product['id'],))
+        catalog_cache.set(cache_key, (products, next_cursor), since=snapshot)
 
-        return jsonify(products), 200
+        return page_response(products, next_cursor)
 
-    except mysql.connector.Error as err:
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
+    except DB_ERRORS as err:
         return jsonify({"error": str(err)}), 500
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
     
 @app.route('/cards/add', methods=['POST'])
+@api_doc('Añadir Tarjeta', 'Añadir una nueva tarjeta de crédito', '201', 'Tarjeta añadida exitosamente')
 @token_required
 def add_card(current_user):
     data = request.json
@@ -908,7 +972,7 @@ def add_card(current_user):
         tipo_tarjeta = get_card_type(data['cardNumber'])
 
         # Conectar a la base de datos
-        connection = mysql.connector.connect(**db_config)
+        connection = db_pool.get_connection()
         cursor = connection.cursor()
 
         # Insertar tarjeta en la base de datos
@@ -925,10 +989,11 @@ def add_card(current_user):
             'activo'  # Estado por defecto
         ))
         connection.commit()
+        profile_cache.invalidate(current_user)
 
         return jsonify({'message': 'Tarjeta añadida exitosamente.'}), 201
 
-    except mysql.connector.Error as db_err:
+    except DB_ERRORS as db_err:
         return jsonify({'error': f'Error en la base de datos: {str(db_err)}'}), 500
     except Exception as e:
         return jsonify({'error': f'Error al añadir tarjeta: {str(e)}'}), 500
@@ -948,22 +1013,23 @@ def get_card_type(card_number):
     return 'Desconocida'
 
 @app.route('/cards', methods=['GET'])
+@api_doc('Listar Tarjetas', 'Obtener las tarjetas de crédito del usuario autenticado', '200', 'Lista de tarjetas')
 @token_required
 def list_cards(current_user):
     try:
         # Conectar a la base de datos
-        connection = mysql.connector.connect(**db_config)
-        cursor = connection.cursor(dictionary=True)
+        connection = db_pool.get_connection()
+        cursor = connection.cursor()
 
         # Seleccionar tarjetas del usuario
         query_select_cards = "SELECT id, nombre_en_tarjeta, numero_enmascarado, fecha_expiracion, tipo_tarjeta, estado FROM tarjetas WHERE usuario_id = %s"
         cursor.execute(query_select_cards, (current_user,))
 
-        cards = cursor.fetchall()
+        cards = ROWS.fetchall(cursor)
 
         return jsonify(cards), 200
 
-    except mysql.connector.Error as db_err:
+    except DB_ERRORS as db_err:
         return jsonify({'error': f'Error en la base de datos: {str(db_err)}'}), 500
     except Exception as e:
         return jsonify({'error': f'Error al obtener tarjetas: {str(e)}'}), 500
@@ -974,10 +1040,11 @@ def list_cards(current_user):
             connection.close()
             
 @app.route('/cards/delete/<int:card_id>', methods=['PUT'])
+@api_doc('Desactivar Tarjeta', 'Desactivar una tarjeta de crédito', '200', 'Tarjeta desactivada exitosamente')
 @token_required
 def deactivate_card(current_user, card_id):
     try:
-        connection = mysql.connector.connect(**db_config)
+        connection = db_pool.get_connection()
         cursor = connection.cursor(dictionary=True)
 
         # Comprobar que la tarjeta pertenece al usuario
@@ -1010,10 +1077,11 @@ def deactivate_card(current_user, card_id):
         query_deactivate_card = "UPDATE tarjetas SET estado = 'inactivo' WHERE id = %s"
         cursor.execute(query_deactivate_card, (card_id,))
         connection.commit()
+        profile_cache.invalidate(current_user)
 
         return jsonify({'message': 'Tarjeta desactivada exitosamente.'}), 200
 
-    except mysql.connector.Error as db_err:
+    except DB_ERRORS as db_err:
         return jsonify({'error': f'Error en la base de datos: {str(db_err)}'}), 500
     except Exception as e:
         return jsonify({'error': f'Error al desactivar la tarjeta: {str(e)}'}), 500
@@ -1024,6 +1092,7 @@ def deactivate_card(current_user, card_id):
             connection.close()
             
 @app.route('/enviarPedido', methods=['POST'])
+@api_doc('Enviar Pedido', 'Enviar un nuevo pedido', '201', 'Pedido enviado exitosamente')
 @token_required
 def enviar_pedido(current_user):
     data = request.json
@@ -1034,8 +1103,14 @@ def enviar_pedido(current_user):
         if missing_fields:
             return jsonify({'error': f'Campos faltantes: {", ".join(missing_fields)}'}), 400
 
+        # El comprador como entero: la caché de /profile usa el id del token ("1" no invalidaría a 1)
+        try:
+            buyer_id = int(data['userId'])
+        except (TypeError, ValueError):
+            return jsonify({'error': 'userId debe ser un número entero.'}), 400
+
         # Conectar a la base de datos
-        connection = mysql.connector.connect(**db_config)
+        connection = db_pool.get_connection()
         cursor = connection.cursor()
 
         # Insertar el pedido incluyendo los datos requeridos
@@ -1044,7 +1119,7 @@ def enviar_pedido(current_user):
             VALUES (%s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP);
         """
         cursor.execute(query_insert_order, (
-            data['userId'],
+            buyer_id,
             data['storeId'],
             data['tripId'],
             data['cardId'],
@@ -1053,17 +1128,29 @@ def enviar_pedido(current_user):
             data['state']
         ))
 
+        order_id = cursor.lastrowid
+
+        # Contador de pedidos del perfil, en la misma transacción
+        cursor.execute("UPDATE profiles SET order_count = order_count + 1 WHERE user_id = %s", (buyer_id,))
+
+        # Dueño del viaje que llevará el pedido (destinatario de la notificación)
+        cursor.execute("SELECT usuario_id FROM viajes WHERE id = %s", (data['tripId'],))
+        trip = cursor.fetchone()
+
+        # Notificación para el comprador y el conductor, en la misma transacción
+        record_event(cursor, order_id, 'nuevo', {
+            'message': '¡Nuevo pedido recibido!',
+            'userId': buyer_id,
+            'orderId': order_id
+        }, [buyer_id, trip[0] if trip else None])
+
         # Confirmar los cambios
         connection.commit()
-        
-        # Emitir un evento de WebSocket para notificar a los clientes
-        socketio.emit('notification-update', {
-            'message': '¡Nuevo pedido recibido!',
-            'userId': data['userId']
-        })
+        profile_cache.invalidate(buyer_id)
+        order_events.wake()
 
         return jsonify({'message': 'Pedido enviado exitosamente.'}), 201
-    except mysql.connector.Error as db_err:
+    except DB_ERRORS as db_err:
         return jsonify({'error': f'Error en la base de datos: {str(db_err)}'}), 500
     except Exception as e:
         return jsonify({'error': f'Error al enviar el pedido: {str(e)}'}), 500
@@ -1073,28 +1160,156 @@ def enviar_pedido(current_user):
         if 'connection' in locals():
             connection.close()
             
+# Columna que relaciona el pedido con el usuario según su rol
+ORDER_ROLES = {
+    'comprador': 'p.usuario_id',  # Quien hizo el pedido
+    'conductor': 'v.usuario_id'   # Dueño del viaje que lo lleva
+}
+ORDER_STATES = ('Pendiente', 'Aceptado', 'Rechazado')
+
+# Comprador de cada pedido y dueño del viaje que lo lleva: {id: fila}.
+# Con `driver` sólo se devuelven los pedidos de viajes de ese conductor
+def order_participants(cursor, order_ids, driver=None, lock=False):
+    query = """
+        SELECT p.id, p.usuario_id, v.usuario_id AS conductor_id, p.entregado
+        FROM pedidos p
+        INNER JOIN viajes v ON p.viaje_id = v.id
+        WHERE p.id IN ({})
+    """.format(', '.join(['%s'] * len(order_ids)))
+    params = list(order_ids)
+    if driver is not None:
+        query += " AND v.usuario_id = %s"
+        params.append(driver)
+    if lock:
+        # Una entrega simultánea de los mismos pedidos espera a que esta transacción termine
+        query += db_backend.for_update
+    cursor.execute(query, params)
+    return {row['id']: row for row in cursor.fetchall()}
+
+# Cambiar el estado de varios pedidos con una sola sentencia
+def set_orders_state(cursor, order_ids, new_state):
+    placeholders = ', '.join(['%s'] * len(order_ids))
+    cursor.execute("UPDATE pedidos SET estado = %s WHERE id IN ({})".format(placeholders), [new_state, *order_ids])
+    return cursor.rowcount
+
+# Marcar pedidos como entregados; el viaje cuenta una sola vez en el perfil del conductor
+def mark_orders_delivered(cursor, order_ids, driver):
+    placeholders = ', '.join(['%s'] * len(order_ids))
+    cursor.execute("UPDATE pedidos SET entregado = 1 WHERE id IN ({}) AND entregado = 0".format(placeholders), order_ids)
+    delivered = cursor.rowcount
+    if delivered:
+        cursor.execute("UPDATE profiles SET travels = travels + 1 WHERE user_id = %s", (driver,))
+    return delivered
+
+# Ids de pedido del cuerpo JSON de las rutas por lote
+BULK_ORDER_LIMIT = int(os.environ.get('BULK_ORDER_LIMIT', 200))
+
+def parse_order_ids(data):
+    order_ids = (data or {}).get('orderIds')
+    if not isinstance(order_ids, list) or not order_ids:
+        raise ValueError('Falta orderIds (lista de ids de pedido).')
+    if any(isinstance(order_id, bool) or not isinstance(order_id, int) for order_id in order_ids):
+        raise ValueError('Los ids deben ser números enteros.')
+    order_ids = list(dict.fromkeys(order_ids))
+    if len(order_ids) > BULK_ORDER_LIMIT:
+        raise ValueError(f'Máximo {BULK_ORDER_LIMIT} pedidos por solicitud.')
+    return order_ids
+
+# Una notificación por usuario con todos sus pedidos afectados
+def record_bulk_events(cursor, orders, payload, roles):
+    by_user = {}
+    for order in orders:
+        for role in roles:
+            by_user.setdefault(order[role], []).append(order['id'])
+    for user_id, order_ids in by_user.items():
+        record_event(cursor, order_ids[0], 'lote', dict(payload, order_ids=order_ids), [user_id])
+
+# Pedidos del usuario (por rol) en cualquiera de los estados indicados, en una sola consulta
+def query_orders(cursor, user_id, role, states, delivered=None, notification=None):
+    cursor.execute(*build_orders_query(user_id, role, states, delivered, notification))
+    return ROWS.fetchall(cursor)
+
+def build_orders_query(user_id, role, states, delivered=None, notification=None):
+    placeholders = ', '.join(['%s'] * len(states))
+    query = f"""
+        SELECT p.*
+        FROM pedidos p
+        INNER JOIN viajes v ON p.viaje_id = v.id
+        WHERE {ORDER_ROLES[role]} = %s
+          AND p.estado IN ({placeholders})
+    """
+    params = [user_id, *states]
+    if delivered is not None:
+        query += " AND p.entregado = %s"
+        params.append(delivered)
+    if notification is not None:
+        query += " AND p.notification = %s"
+        params.append(notification)
+    return query + " ORDER BY p.id", params
+
+@app.route('/pedidos', methods=['GET'])
+@api_doc('Consultar Pedidos', 'Obtener en una sola consulta los pedidos del usuario autenticado en varios estados (estados=Pendiente,Aceptado; rol=comprador|conductor; entregado=0|1; notificacion=activa), agrupados por estado y con su conteo', '200', 'Pedidos agrupados por estado')
+@token_required
+def get_orders(current_user):
+    try:
+        states = list(dict.fromkeys(
+            state.strip() for state in request.args.get('estados', ','.join(ORDER_STATES)).split(',') if state.strip()
+        ))
+        role = request.args.get('rol', 'comprador')
+        delivered = request.args.get('entregado')
+        notification = request.args.get('notificacion')
+
+        if not states or len(states) > 10:
+            return jsonify({'error': 'Lista de estados inválida.'}), 400
+        if role not in ORDER_ROLES:
+            return jsonify({'error': f'Rol inválido, usa: {", ".join(ORDER_ROLES)}'}), 400
+        if delivered not in (None, '0', '1'):
+            return jsonify({'error': 'El filtro entregado debe ser 0 o 1.'}), 400
+
+        connection = db_pool.get_connection()
+        cursor = connection.cursor()
+
+        orders = query_orders(
+            cursor, current_user, role, states,
+            delivered=int(delivered) if delivered is not None else None,
+            notification=notification
+        )
+
+        # Agrupar por estado (los estados pedidos aparecen aunque no tengan pedidos)
+        grouped = {state: [] for state in states}
+        for order in orders:
+            grouped.setdefault(order['estado'], []).append(order)
+
+        return jsonify({
+            'orders': grouped,
+            'counts': {state: len(items) for state, items in grouped.items()},
+            'total': len(orders)
+        }), 200
+
+    except DB_ERRORS as db_err:
+        return jsonify({'error': f'Error en la base de datos: {str(db_err)}'}), 500
+    except Exception as e:
+        return jsonify({'error': f'Error en el servidor: {str(e)}'}), 500
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
+
 @app.route('/pedidos/pendientes', methods=['GET'])
+@api_doc('Pedidos Pendientes', 'Obtener los pedidos pendientes del usuario autenticado', '200', 'Lista de pedidos')
 @token_required
 def get_pending_orders(current_user):
     try:
-        connection = mysql.connector.connect(**db_config)
-        cursor = connection.cursor(dictionary=True)
+        connection = db_pool.get_connection()
+        cursor = connection.cursor()
 
         # Filtrar pedidos con estado 'Pendiente' y notificación activa
-        query = """
-            SELECT p.* 
-            FROM pedidos p
-            INNER JOIN viajes v ON p.viaje_id = v.id
-            WHERE p.estado = 'Pendiente' 
-              AND p.notification = 'activa'
-              AND v.usuario_id = %s
-        """
-        cursor.execute(query, (current_user,))
-        orders = cursor.fetchall()
+        orders = query_orders(cursor, current_user, 'conductor', ['Pendiente'], notification='activa')
 
         return jsonify({'orders': orders}), 200
 
-    except mysql.connector.Error as db_err:
+    except DB_ERRORS as db_err:
         return jsonify({'error': f'Error en la base de datos: {str(db_err)}'}), 500
     except Exception as e:
         return jsonify({'error': f'Error en el servidor: {str(e)}'}), 500
@@ -1105,27 +1320,19 @@ def get_pending_orders(current_user):
             connection.close()
 
 @app.route('/pedidos/aceptados', methods=['GET'])
+@api_doc('Pedidos Aceptados', 'Obtener los pedidos aceptados del usuario autenticado', '200', 'Lista de pedidos')
 @token_required
 def get_accepted_orders(current_user):
     try:
-        connection = mysql.connector.connect(**db_config)
-        cursor = connection.cursor(dictionary=True)
+        connection = db_pool.get_connection()
+        cursor = connection.cursor()
 
         # Filtrar pedidos con estado 'Aceptado' y notificación activa
-        query = """
-            SELECT p.* 
-            FROM pedidos p
-            INNER JOIN viajes v ON p.viaje_id = v.id
-            WHERE p.estado = 'Aceptado' 
-              AND p.notification = 'activa'
-              AND p.usuario_id = %s
-        """
-        cursor.execute(query, (current_user,))
-        orders = cursor.fetchall()
+        orders = query_orders(cursor, current_user, 'comprador', ['Aceptado'], notification='activa')
 
         return jsonify({'orders': orders}), 200
 
-    except mysql.connector.Error as db_err:
+    except DB_ERRORS as db_err:
         return jsonify({'error': f'Error en la base de datos: {str(db_err)}'}), 500
     except Exception as e:
         return jsonify({'error': f'Error en el servidor: {str(e)}'}), 500
@@ -1136,27 +1343,19 @@ def get_accepted_orders(current_user):
             connection.close()
 
 @app.route('/pedidos/rechazados', methods=['GET'])
+@api_doc('Pedidos Rechazados', 'Obtener los pedidos rechazados del usuario autenticado', '200', 'Lista de pedidos')
 @token_required
 def get_rejected_orders(current_user):
     try:
-        connection = mysql.connector.connect(**db_config)
-        cursor = connection.cursor(dictionary=True)
+        connection = db_pool.get_connection()
+        cursor = connection.cursor()
 
         # Filtrar pedidos con estado 'Rechazado' y notificación activa
-        query = """
-            SELECT p.* 
-            FROM pedidos p
-            INNER JOIN viajes v ON p.viaje_id = v.id
-            WHERE p.estado = 'Rechazado' 
-              AND p.notification = 'activa'
-              AND p.usuario_id = %s
-        """
-        cursor.execute(query, (current_user,))
-        orders = cursor.fetchall()
+        orders = query_orders(cursor, current_user, 'comprador', ['Rechazado'], notification='activa')
 
         return jsonify({'orders': orders}), 200
 
-    except mysql.connector.Error as db_err:
+    except DB_ERRORS as db_err:
         return jsonify({'error': f'Error en la base de datos: {str(db_err)}'}), 500
     except Exception as e:
         return jsonify({'error': f'Error en el servidor: {str(e)}'}), 500
@@ -1167,26 +1366,19 @@ def get_rejected_orders(current_user):
             connection.close()
             
 @app.route('/pedidos/en-progreso', methods=['GET'])
+@api_doc('Pedidos en Progreso', 'Obtener los pedidos en progreso del usuario autenticado', '200', 'Lista de pedidos')
 @token_required
 def get_orders_in_progress(current_user):
     try:
-        connection = mysql.connector.connect(**db_config)
-        cursor = connection.cursor(dictionary=True)
+        connection = db_pool.get_connection()
+        cursor = connection.cursor()
 
         # Filtrar pedidos donde entregado = False
-        query = """
-            SELECT p.* 
-            FROM pedidos p
-            INNER JOIN viajes v ON p.viaje_id = v.id
-            WHERE p.entregado = 0 && p.estado = 'Aceptado'
-              AND p.usuario_id = %s
-        """
-        cursor.execute(query, (current_user,))
-        orders = cursor.fetchall()
+        orders = query_orders(cursor, current_user, 'comprador', ['Aceptado'], delivered=0)
 
         return jsonify({'orders': orders}), 200
 
-    except mysql.connector.Error as db_err:
+    except DB_ERRORS as db_err:
         return jsonify({'error': f'Error en la base de datos: {str(db_err)}'}), 500
     except Exception as e:
         return jsonify({'error': f'Error en el servidor: {str(e)}'}), 500
@@ -1197,27 +1389,19 @@ def get_orders_in_progress(current_user):
             connection.close()
             
 @app.route('/viajes/en-progreso', methods=['GET'])
+@api_doc('Viajes en Progreso', 'Obtener los viajes en progreso del usuario autenticado', '200', 'Lista de viajes')
 @token_required
 def get_trips_in_progress(current_user):
     try:
-        connection = mysql.connector.connect(**db_config)
-        cursor = connection.cursor(dictionary=True)
+        connection = db_pool.get_connection()
+        cursor = connection.cursor()
 
         # Filtrar pedidos donde entregado = False
-        query = """
-            SELECT p.* 
-            FROM pedidos p
-            INNER JOIN viajes v ON p.viaje_id = v.id
-            WHERE p.entregado = 0 && p.estado = 'Aceptado'
-              AND v.usuario_id = %s
-        """
-        
-        cursor.execute(query, (current_user,))
-        orders = cursor.fetchall()
+        orders = query_orders(cursor, current_user, 'conductor', ['Aceptado'], delivered=0)
 
         return jsonify({'orders': orders}), 200
 
-    except mysql.connector.Error as db_err:
+    except DB_ERRORS as db_err:
         return jsonify({'error': f'Error en la base de datos: {str(db_err)}'}), 500
     except Exception as e:
         return jsonify({'error': f'Error en el servidor: {str(e)}'}), 500
@@ -1228,10 +1412,11 @@ def get_trips_in_progress(current_user):
             connection.close()
 
 @app.route('/notificaciones/descartar/<int:order_id>', methods=['PUT'])
+@api_doc('Descartar Notificación', 'Descartar una notificación de pedido', '200', 'Notificación descartada exitosamente')
 @token_required
 def discard_notification(current_user, order_id):
     try:
-        connection = mysql.connector.connect(**db_config)
+        connection = db_pool.get_connection()
         cursor = connection.cursor()
 
         # Actualizar el campo notification a 'desactivado' para el pedido especificado
@@ -1248,7 +1433,7 @@ def discard_notification(current_user, order_id):
 
         return jsonify({'message': 'Notificación descartada con éxito'}), 200
 
-    except mysql.connector.Error as db_err:
+    except DB_ERRORS as db_err:
         return jsonify({'error': f'Error en la base de datos: {str(db_err)}'}), 500
     except Exception as e:
         return jsonify({'error': f'Error en el servidor: {str(e)}'}), 500
@@ -1259,6 +1444,7 @@ def discard_notification(current_user, order_id):
             connection.close()
 
 @app.route('/pedidos/<int:order_id>/estado', methods=['PUT'])
+@api_doc('Actualizar Estado de Pedido', 'Actualizar el estado de un pedido', '200', 'Estado actualizado correctamente')
 @token_required
 def update_order_state(current_user, order_id):
     try:
@@ -1271,23 +1457,68 @@ def update_order_state(current_user, order_id):
             return jsonify({'error': 'El estado es requerido'}), 400
 
         # Conexión a la base de datos
-        connection = mysql.connector.connect(**db_config)
-        cursor = connection.cursor()
+        connection = db_pool.get_connection()
+        cursor = connection.cursor(dictionary=True)
+
+        # Comprador y conductor del pedido, para notificarles el cambio
+        order = order_participants(cursor, [order_id]).get(order_id)
 
         # Actualizar el estado en la base de datos
-        query = "UPDATE pedidos SET estado = %s WHERE id = %s"
-        cursor.execute(query, (new_state, order_id))
+        set_orders_state(cursor, [order_id], new_state)
+
+        # Evento para las salas de los involucrados, confirmado junto con el cambio
+        if order:
+            record_event(cursor, order_id, 'estado', {
+                'type': new_state.lower(),  # 'aceptado', 'rechazado', etc.
+                'order_id': order_id
+            }, [order['usuario_id'], order['conductor_id']])
         connection.commit()
-
-        # Emitir un evento de WebSocket para notificar a los clientes
-        socketio.emit('notification-update', {
-            'type': new_state.lower(),  # 'aceptado', 'rechazado', etc.
-            'order_id': order_id
-        })
+        order_events.wake()
 
         return jsonify({'message': 'Estado actualizado correctamente'}), 200
 
-    except mysql.connector.Error as db_err:
+    except DB_ERRORS as db_err:
+        return jsonify({'error': f'Error en la base de datos: {str(db_err)}'}), 500
+    except Exception as e:
+        return jsonify({'error': f'Error en el servidor: {str(e)}'}), 500
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
+
+@app.route('/pedidos/estado', methods=['PUT'])
+@api_doc('Actualizar Estado de Pedidos por Lote', 'Actualizar el estado de varios pedidos de los viajes del conductor autenticado en una sola transacción (orderIds, state)', '200', 'Pedidos actualizados y pedidos no encontrados')
+@token_required
+def update_orders_state(current_user):
+    try:
+        data = request.json
+        new_state = (data or {}).get('state')
+        if not new_state:
+            return jsonify({'error': 'El estado es requerido'}), 400
+        order_ids = parse_order_ids(data)
+
+        connection = db_pool.get_connection()
+        cursor = connection.cursor(dictionary=True)
+
+        # Sólo pedidos de viajes del conductor autenticado
+        orders = order_participants(cursor, order_ids, driver=current_user)
+        updated = [order_id for order_id in order_ids if order_id in orders]
+        if updated:
+            set_orders_state(cursor, updated, new_state)
+            record_bulk_events(cursor, [orders[order_id] for order_id in updated],
+                               {'type': new_state.lower()}, ('usuario_id', 'conductor_id'))
+        connection.commit()
+        order_events.wake()
+
+        return jsonify({
+            'updated': updated,
+            'not_found': [order_id for order_id in order_ids if order_id not in orders]
+        }), 200
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except DB_ERRORS as db_err:
         return jsonify({'error': f'Error en la base de datos: {str(db_err)}'}), 500
     except Exception as e:
         return jsonify({'error': f'Error en el servidor: {str(e)}'}), 500
@@ -1298,38 +1529,65 @@ def update_order_state(current_user, order_id):
             connection.close()
 
 @app.route('/pedidos/<int:order_id>/entregado', methods=['PUT'])
+@api_doc('Marcar Pedido como Entregado', 'Marcar un pedido como entregado', '200', 'Pedido marcado como entregado con éxito')
 @token_required
 def mark_order_as_delivered(current_user, order_id):
     try:
-        connection = mysql.connector.connect(**db_config)
+        connection = db_pool.get_connection()
         cursor = connection.cursor()
 
-        # Actualizar el campo entregado a True para el pedido especificado
-        query = """
-            UPDATE pedidos 
-            SET entregado = 1
-            WHERE id = %s
-        """
-        cursor.execute(query, (order_id,))
+        # Pedido entregado e incremento del contador de viajes, en una sola transacción
+        delivered = mark_orders_delivered(cursor, [order_id], current_user)
         connection.commit()
-        
-        # Incrementar el contador de viajes en la tabla `profiles`
-        query_update_profile = """
-            UPDATE profiles
-            SET travels = travels + 1
-            WHERE user_id = %s;
-        """
-        cursor.execute(query_update_profile, (current_user,))
 
-        # Confirmar los cambios
-        connection.commit()
-
-        if cursor.rowcount == 0:
+        if not delivered:
             return jsonify({'error': 'No se encontró el pedido o ya estaba marcado como entregado'}), 404
+        profile_cache.invalidate(current_user)
 
         return jsonify({'message': 'Pedido marcado como entregado con éxito'}), 200
 
-    except mysql.connector.Error as db_err:
+    except DB_ERRORS as db_err:
+        return jsonify({'error': f'Error en la base de datos: {str(db_err)}'}), 500
+    except Exception as e:
+        return jsonify({'error': f'Error en el servidor: {str(e)}'}), 500
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
+
+@app.route('/pedidos/entregado', methods=['PUT'])
+@api_doc('Marcar Pedidos como Entregados por Lote', 'Marcar como entregados varios pedidos de los viajes del conductor autenticado en una sola transacción (orderIds); el viaje se suma una vez al perfil', '200', 'Pedidos entregados, ya entregados y no encontrados')
+@token_required
+def mark_orders_as_delivered(current_user):
+    try:
+        order_ids = parse_order_ids(request.json)
+
+        connection = db_pool.get_connection()
+        cursor = connection.cursor(dictionary=True)
+
+        # Con bloqueo: lo que se reporta y notifica es exactamente lo que esta petición actualiza
+        orders = order_participants(cursor, order_ids, driver=current_user, lock=True)
+        pending = [order_id for order_id in order_ids if order_id in orders and not orders[order_id]['entregado']]
+        if pending:
+            mark_orders_delivered(cursor, pending, current_user)
+            # Cada comprador recibe un solo aviso con sus pedidos entregados
+            record_bulk_events(cursor, [orders[order_id] for order_id in pending],
+                               {'type': 'entregado'}, ('usuario_id',))
+        connection.commit()
+        if pending:
+            profile_cache.invalidate(current_user)
+            order_events.wake()
+
+        return jsonify({
+            'updated': pending,
+            'already_delivered': [order_id for order_id in order_ids if order_id in orders and orders[order_id]['entregado']],
+            'not_found': [order_id for order_id in order_ids if order_id not in orders]
+        }), 200
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except DB_ERRORS as db_err:
         return jsonify({'error': f'Error en la base de datos: {str(db_err)}'}), 500
     except Exception as e:
         return jsonify({'error': f'Error en el servidor: {str(e)}'}), 500
@@ -1340,22 +1598,23 @@ def mark_order_as_delivered(current_user, order_id):
             connection.close()
 
 @app.route('/producto/<int:product_id>', methods=['GET'])
+@api_doc('Obtener Producto', 'Obtener un producto por su ID', '200', 'Detalles del producto')
 @token_required
 def get_product_by_id(current_user, product_id):
     try:
-        connection = mysql.connector.connect(**db_config)
-        cursor = connection.cursor(dictionary=True)
+        connection = db_pool.get_connection()
+        cursor = connection.cursor()
 
         query = "SELECT id, nombre FROM productos WHERE id = %s"
         cursor.execute(query, (product_id,))
-        product = cursor.fetchone()
+        product = ROWS.fetchone(cursor)
 
         if not product:
             return jsonify({'error': 'Producto no encontrado'}), 404
 
         return jsonify(product), 200
 
-    except mysql.connector.Error as db_err:
+    except DB_ERRORS as db_err:
         return jsonify({'error': f'Error en la base de datos: {str(db_err)}'}), 500
     finally:
         if 'cursor' in locals():
@@ -1364,22 +1623,23 @@ def get_product_by_id(current_user, product_id):
             connection.close()
 
 @app.route('/usuario/<int:user_id>', methods=['GET'])
+@api_doc('Obtener Usuario', 'Obtener un usuario por su ID', '200', 'Detalles del usuario')
 @token_required
 def get_user_name_by_id(current_user, user_id):
     try:
-        connection = mysql.connector.connect(**db_config)
-        cursor = connection.cursor(dictionary=True)
+        connection = db_pool.get_connection()
+        cursor = connection.cursor()
 
         query = "SELECT id, usuario FROM usuarios WHERE id = %s"
         cursor.execute(query, (user_id,))
-        user = cursor.fetchone()
+        user = ROWS.fetchone(cursor)
 
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 404
 
         return jsonify(user), 200
 
-    except mysql.connector.Error as db_err:
+    except DB_ERRORS as db_err:
         return jsonify({'error': f'Error en la base de datos: {str(db_err)}'}), 500
     finally:
         if 'cursor' in locals():
@@ -1388,31 +1648,107 @@ def get_user_name_by_id(current_user, user_id):
             connection.close()
             
 @app.route('/viaje/propietario/<int:trip_id>', methods=['GET'])
+@api_doc('Obtener Propietario del Viaje', 'Obtener el propietario de un viaje por su ID', '200', 'Detalles del propietario del viaje')
 @token_required
 def get_trip_owner(current_user, trip_id):
     try:
-        connection = mysql.connector.connect(**db_config)
-        cursor = connection.cursor(dictionary=True)
+        connection = db_pool.get_connection()
+        cursor = connection.cursor()
 
         query = "SELECT usuario_id FROM viajes WHERE id = %s"
         cursor.execute(query, (trip_id,))
-        trip = cursor.fetchone()
+        trip = ROWS.fetchone(cursor)
 
         if not trip:
             return jsonify({'error': 'Viaje no encontrado'}), 404
 
         return jsonify(trip), 200
 
-    except mysql.connector.Error as db_err:
+    except DB_ERRORS as db_err:
         return jsonify({'error': f'Error en la base de datos: {str(db_err)}'}), 500
     finally:
         if 'cursor' in locals():
             cursor.close()
         if 'connection' in locals():
             connection.close()
-         
+
+# Búsquedas por lote para resolver los detalles de varios pedidos en una sola petición
+BATCH_LOOKUPS = {
+    'productos': "SELECT id, nombre FROM productos WHERE id IN ({})",
+    'usuarios': "SELECT id, usuario FROM usuarios WHERE id IN ({})",
+    'viajes': "SELECT id, usuario_id FROM viajes WHERE id IN ({})"
+}
+BATCH_LOOKUP_LIMIT = int(os.environ.get('BATCH_LOOKUP_LIMIT', 100))
+
+def parse_ids(args):
+    raw = [value.strip() for value in args.get('ids', '').split(',') if value.strip()]
+    if not raw:
+        raise ValueError('Falta el parámetro ids (por ejemplo ids=1,2,3).')
+    try:
+        ids = list(dict.fromkeys(int(value) for value in raw))
+    except ValueError:
+        raise ValueError('Los ids deben ser números enteros.')
+    if len(ids) > BATCH_LOOKUP_LIMIT:
+        raise ValueError(f'Máximo {BATCH_LOOKUP_LIMIT} ids por solicitud.')
+    return ids
+
+# Devuelve {id: fila o None}; las filas se cachean un momento porque casi no cambian
+def batch_lookup(kind, ids):
+    found = {}
+    missing = []
+    for item_id in ids:
+        row = lookup_cache.get((kind, item_id))
+        if row is None:
+            missing.append(item_id)
+        else:
+            found[item_id] = row
+
+    if missing:
+        snapshot = lookup_cache.snapshot()
+        connection = db_pool.get_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(BATCH_LOOKUPS[kind].format(', '.join(['%s'] * len(missing))), missing)
+            for row in ROWS.fetchall(cursor):
+                found[row['id']] = row
+                lookup_cache.set((kind, row['id']), row, since=snapshot)
+            cursor.close()
+        finally:
+            connection.close()
+
+    return {str(item_id): found.get(item_id) for item_id in ids}
+
+def batch_lookup_response(kind):
+    try:
+        ids = parse_ids(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        return jsonify(batch_lookup(kind, ids)), 200
+    except DB_ERRORS as db_err:
+        return jsonify({'error': f'Error en la base de datos: {str(db_err)}'}), 500
+
+@app.route('/productos', methods=['GET'])
+@api_doc('Obtener Productos por Lote', 'Obtener varios productos por ID en una sola consulta (ids=1,2,3)', '200', 'Mapa de ID a producto (null si no existe)')
+@token_required
+def get_products_by_ids(current_user):
+    return batch_lookup_response('productos')
+
+@app.route('/usuarios', methods=['GET'])
+@api_doc('Obtener Usuarios por Lote', 'Obtener varios usuarios por ID en una sola consulta (ids=1,2,3)', '200', 'Mapa de ID a usuario (null si no existe)')
+@token_required
+def get_users_by_ids(current_user):
+    return batch_lookup_response('usuarios')
+
+@app.route('/viajes/propietarios', methods=['GET'])
+@api_doc('Obtener Propietarios de Viajes por Lote', 'Obtener el propietario de varios viajes por ID en una sola consulta (ids=1,2,3)', '200', 'Mapa de ID de viaje a propietario (null si no existe)')
+@token_required
+def get_trip_owners(current_user):
+    return batch_lookup_response('viajes')
+
 ## Proyecto Administracion Paso            
 @app.route('/add-shop', methods=['POST'])
+@api_doc('Añadir Tienda', 'Añadir una nueva tienda', '201', 'Tienda añadida exitosamente')
 def add_shop():
     try:
         data = request.json
@@ -1425,7 +1761,7 @@ def add_shop():
         email = data.get('email')
         logo_url = data.get('logo_url')
 
-        connection = mysql.connector.connect(**db_config)
+        connection = db_pool.get_connection()
         cursor = connection.cursor()
 
         query = """
@@ -1434,36 +1770,66 @@ def add_shop():
         """
         cursor.execute(query, (name, address, state, city, schedule, phone, email, logo_url))
         connection.commit()
+        store_search.add({
+            'id': cursor.lastrowid,
+            'nombre': name,
+            'ciudad': city,
+            'direccion': address,
+            'promedio_calificacion': 0
+        })
+
+        # Los listados de tiendas cambian; las fichas y productos de otras tiendas no
+        catalog_cache.invalidate_prefix(('shops',))
+        catalog_cache.invalidate_prefix(('tiendas',))
 
         return jsonify({'message': 'Tienda registrada exitosamente'}), 201
-    except mysql.connector.Error as err:
+    except DB_ERRORS as err:
         return jsonify({'error': str(err)}), 500
     finally:
-        if cursor:
+        if 'cursor' in locals():
             cursor.close()
-        if connection:
+        if 'connection' in locals():
             connection.close()
             
 @app.route('/shops', methods=['GET'])
+@api_doc('Obtener Tiendas', 'Obtener todas las tiendas (paginado con limit y cursor; stream=1 o Accept: application/x-ndjson para descargarlas todas)', '200', 'Lista de tiendas')
 def get_shops():
     try:
-        connection = mysql.connector.connect(**db_config)
-        cursor = connection.cursor(dictionary=True)
+        limit = page_size(request.args)
+        after = decode_cursor(request.args, 1)
 
-        # Consultar todas las tiendas
-        cursor.execute("SELECT * FROM tiendas")
-        shops = cursor.fetchall()
+        query = "SELECT * FROM tiendas WHERE id > %s ORDER BY id"
+        if wants_stream(request):
+            return stream_query(db_pool, request, query, (after[0] if after else 0,))
 
-        # Cerrar la conexión
-        cursor.close()
-        connection.close()
+        cache_key = ('shops', after[0] if after else 0, limit)
+        cached = catalog_cache.get(cache_key)
+        if cached is not None:
+            return page_response(*cached)
+        snapshot = catalog_cache.snapshot()
 
-        return jsonify(shops), 200
+        connection = db_pool.get_connection()
+        cursor = connection.cursor()
+
+        # Consultar las tiendas página por página
+        cursor.execute(query + " LIMIT %s", (after[0] if after else 0, limit + 1))
+        shops, next_cursor = split_page(ROWS.fetchall(cursor), limit, lambda shop: (shop['id'],))
+        catalog_cache.set(cache_key, (shops, next_cursor), since=snapshot)
+
+        return page_response(shops, next_cursor)
 
-    except mysql.connector.Error as err:
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
+    except DB_ERRORS as err:
         return jsonify({"error": str(err)}), 500
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
     
 @app.route('/add-product', methods=['POST'])
+@api_doc('Añadir Producto', 'Añadir un nuevo producto', '201', 'Producto añadido exitosamente')
 def add_product():
     # Obtener los datos del cuerpo de la solicitud
     tienda_id = request.json.get('shop')
@@ -1481,7 +1847,7 @@ def add_product():
     
     # Conexión a la base de datos
     try:
-        connection = mysql.connector.connect(**db_config)
+        connection = db_pool.get_connection()
         cursor = connection.cursor()
 
         # Insertar el nuevo producto en la base de datos
@@ -1496,26 +1862,313 @@ def add_product():
         # Ejecutar la consulta
         cursor.execute(insert_query, (tienda_id, nombre, descripcion, cantidad, unidad_medida, precio_tienda, precio_publico, imagen_url, fecha_creacion))
         connection.commit()
-        
-        # Cerrar la conexión
-        cursor.close()
-        connection.close()
+
+        # Sólo cambian las páginas de productos de esta tienda
+        catalog_cache.invalidate_prefix(('products', str(tienda_id)))
 
         return jsonify({"message": "Producto agregado exitosamente"}), 201
 
-    except mysql.connector.Error as err:
+    except DB_ERRORS as err:
         return jsonify({"error": str(err)}), 500
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
+
+# Cuerpo de una importación masiva: arreglo JSON, NDJSON o CSV, leído en streaming
+def import_records():
+    mimetype = request.mimetype
+    if mimetype not in MIMETYPES:
+        raise ValueError('Content-Type debe ser ' + ', '.join(MIMETYPES))
+    return read_records(request.stream, mimetype)
+
+# Las filas se confirman por bloques: si el cuerpo se corta a la mitad, lo anterior ya
+# quedó guardado. Por eso sólo es 400 cuando no se insertó nada; con filas guardadas
+# es 200 con `aborted` en el resumen, y reintentar el archivo completo las duplicaría.
+def import_response(summary):
+    return jsonify(summary), 400 if 'aborted' in summary and not summary['inserted'] else 200
+
+@app.route('/import-shops', methods=['POST'])
+@api_doc('Importar Tiendas', 'Alta masiva de tiendas desde un arreglo JSON, NDJSON o CSV (mismos campos que /add-shop); reporta los errores por fila; un cuerpo mal formado a la mitad responde 200 con aborted y las filas ya guardadas (400 sólo si no se guardó ninguna)', '200', 'Resumen de la importación')
+def import_shops_route():
+    try:
+        summary = import_shops(db_pool, import_records())
+
+        if summary['inserted']:
+            # Los ids de un executemany no son portables: se reconstruye el índice antes de
+            # responder, para que las búsquedas (y lo que guarden en caché) ya vean las altas
+            store_search.refresh()
+            catalog_cache.invalidate_prefix(('shops',))
+            catalog_cache.invalidate_prefix(('tiendas',))
+
+        return import_response(summary)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 415
+    except DB_ERRORS as err:
+        return jsonify({'error': str(err)}), 500
+
+@app.route('/import-products', methods=['POST'])
+@api_doc('Importar Productos', 'Alta masiva de productos desde un arreglo JSON, NDJSON o CSV (mismos campos que /add-product); reporta los errores por fila; un cuerpo mal formado a la mitad responde 200 con aborted y las filas ya guardadas (400 sólo si no se guardó ninguna)', '200', 'Resumen de la importación')
+def import_products_route():
+    try:
+        summary, shop_ids = import_products(db_pool, import_records())
+
+        if summary['inserted']:
+            for tienda_id in shop_ids:
+                catalog_cache.invalidate_prefix(('products', str(tienda_id)))
+
+        return import_response(summary)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 415
+    except DB_ERRORS as err:
+        return jsonify({'error': str(err)}), 500
 
 # Verificar que el servidor funcione correctamente
 @app.route('/', methods=['GET'])
+@api_doc('Health Check', 'Verificar que el servidor funcione correctamente', '200', 'El servidor está funcionando correctamente')
 def health_check():
     return jsonify({'message': 'El servidor está funcionando correctamente.'})
 
+# Métricas para Prometheus (todas las del servicio si METRICS_DIR está configurado)
+@app.route('/metrics', methods=['GET'])
+@api_doc('Métricas', 'Métricas de peticiones, consultas SQL, pool, bcrypt y Socket.IO en formato de texto de Prometheus (sólo desde INTERNAL_ALLOWED_IPS o con INTERNAL_TOKEN)', '200', 'Métricas en formato de texto')
+@internal_only
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+# Estadísticas internas del worker (pool de conexiones) para dimensionarlo
+@app.route('/internal/stats', methods=['GET'])
+@api_doc('Estadísticas Internas', 'Estadísticas del pool de conexiones y de las cachés del worker (sólo desde INTERNAL_ALLOWED_IPS o con INTERNAL_TOKEN)', '200', 'Estadísticas del worker')
+@internal_only
+def internal_stats():
+    return jsonify({
+        'pid': os.getpid(),
+        'db_backend': db_backend.name,
+        'db_pool': db_pool.stats(),
+        'profile_cache': profile_cache.stats(),
+        'catalog_cache': catalog_cache.stats(),
+        'store_search': store_search.stats(),
+        'compression': response_compressor.stats(),
+        'slow_queries': slow_query_log.stats() if slow_query_log else None,
+        'password_hasher': password_hasher.stats(),
+        'token_cache': token_verifier.stats(),
+        'lookup_cache': lookup_cache.stats(),
+        'socketio_bus': socketio_bus.stats() if socketio_bus else None,
+        'order_events': order_events.stats()
+    }), 200
+
+# Reparar los contadores desnormalizados de profiles a partir de viajes y pedidos
+def reconcile_profile_counters(connection):
+    cursor = connection.cursor()
+    try:
+        cursor.execute("""
+            UPDATE profiles /* full-scan */
+            SET travel_count = (SELECT COUNT(*) FROM viajes v WHERE v.usuario_id = profiles.user_id),
+                order_count = (SELECT COUNT(*) FROM pedidos p WHERE p.usuario_id = profiles.user_id)
+            WHERE travel_count <> (SELECT COUNT(*) FROM viajes v WHERE v.usuario_id = profiles.user_id)
+               OR order_count <> (SELECT COUNT(*) FROM pedidos p WHERE p.usuario_id = profiles.user_id)
+        """)
+        connection.commit()
+        if cursor.rowcount:
+            profile_cache.clear()
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+# Sumar a profiles las calificaciones pendientes (modo diferido), por lotes y por conductor
+def apply_pending_ratings(connection, batch_size=5000):
+    cursor = connection.cursor(dictionary=True)
+    applied = 0
+    drivers = set()
+    try:
+        while True:
+            cursor.execute("""
+                SELECT id, conductor_id, calificacion
+                FROM calificaciones
+                WHERE aplicada = 0
+                ORDER BY id
+                LIMIT %s
+            """, (batch_size,))
+            rows = cursor.fetchall()
+            if not rows:
+                return applied, drivers
+
+            # Marcar primero: si otro proceso tomó alguna de estas filas, se reintenta el lote
+            placeholders = ', '.join(['%s'] * len(rows))
+            cursor.execute(
+                "UPDATE calificaciones SET aplicada = 1 WHERE id IN ({}) AND aplicada = 0".format(placeholders),
+                [row['id'] for row in rows]
+            )
+            if cursor.rowcount != len(rows):
+                connection.rollback()
+                continue
+
+            totals = {}
+            for row in rows:
+                count, total = totals.get(row['conductor_id'], (0, 0))
+                totals[row['conductor_id']] = (count + 1, total + row['calificacion'])
+            for driver, (count, total) in totals.items():
+                cursor.execute(APPLY_RATINGS_QUERY, (total, count, count, driver))
+            connection.commit()
+
+            applied += len(rows)
+            drivers.update(totals)
+            for driver in totals:
+                profile_cache.invalidate(driver)
+    finally:
+        cursor.close()
+
+@app.cli.command('recompute-ratings')
+@click.option('--batch-size', default=5000, show_default=True)
+def recompute_ratings_command(batch_size):
+    connection = db_pool.get_connection()
+    try:
+        applied, drivers = apply_pending_ratings(connection, batch_size)
+        click.echo(f'Calificaciones aplicadas: {applied} ({len(drivers)} conductores)')
+    finally:
+        connection.close()
+
+@app.cli.command('reconcile-counters')
+def reconcile_counters_command():
+    connection = db_pool.get_connection()
+    try:
+        repaired = reconcile_profile_counters(connection)
+        click.echo(f'Perfiles corregidos: {repaired}')
+    finally:
+        connection.close()
+
+# Mostrar el plan de ejecución de una consulta en el backend configurado
+@app.cli.command('explain')
+@click.argument('query')
+@click.argument('params', nargs=-1)
+def explain_query(query, params):
+    connection = db_pool.get_connection()
+    try:
+        for row in db_backend.explain(connection, query, params):
+            click.echo(row)
+    finally:
+        connection.close()
+
+# Aplicar las migraciones pendientes del esquema (en SQLite se aplican solas al abrir la base)
+@app.cli.command('migrate')
+@click.option('--list', 'list_only', is_flag=True, help='Sólo mostrar las migraciones pendientes.')
+def migrate_command(list_only):
+    connection = db_backend.connect()
+    try:
+        if list_only:
+            for version, description in pending(connection):
+                click.echo(f'{version:>4}  {description}')
+            return
+        applied = migrate(connection, db_backend.name)
+        click.echo(f'Migraciones aplicadas: {", ".join(map(str, applied)) or "ninguna"}')
+    finally:
+        connection.close()
+
+# Ejemplos de las consultas que se arman en tiempo de ejecución (no son literales en el código)
+def dynamic_query_samples():
+    paged = [
+        build_trips_query('Ciudad', '2025-01-01', ('2025-01-01', 1)),
+        build_trips_query('Ciudad', None, None),
+        build_trips_query(None, None, None),
+        build_stores_query('Ciudad', '4', (1,)),
+        build_stores_query(None, '4', None)
+    ]
+    return [(query + " LIMIT %s", params + [10]) for query, params in paged] + [
+        build_orders_query(1, 'comprador', ORDER_STATES, 0, 'activa'),
+        build_orders_query(1, 'conductor', ['Aceptado'], 0)
+    ]
+
+# Módulos cuyas consultas literales revisa `flask check-plans`
+QUERY_MODULES = ('app.py', 'outbox.py', 'catalog_import.py')
+
+# EXPLAIN de todas las consultas de esos módulos: [(consulta, plan, recorridos completos)]
+def verify_query_plans():
+    base = os.path.dirname(os.path.abspath(__file__))
+    queries = [(query, sample_params(query)) for module in QUERY_MODULES for query in source_queries(os.path.join(base, module))]
+    queries += dynamic_query_samples()
+    connection = db_pool.get_connection()
+    try:
+        return check_query_plans(db_backend, connection, queries)
+    finally:
+        connection.close()
+
+@app.cli.command('check-plans')
+@click.option('--verbose', is_flag=True, help='Mostrar el plan de cada consulta.')
+def check_plans_command(verbose):
+    failures = 0
+    for query, plan, scans in verify_query_plans():
+        summary = ' '.join(query.split())[:100]
+        if scans:
+            failures += 1
+            click.echo(f'RECORRIDO COMPLETO  {summary}')
+            for scan in scans:
+                click.echo(f'    {scan}')
+        else:
+            click.echo(f'ok                  {summary}')
+        if verbose:
+            for row in plan:
+                click.echo(f'    {row}')
+    if failures:
+        raise click.ClickException(f'{failures} consultas recorren una tabla completa sin índice.')
+
+# Sala de Socket.IO de cada usuario: sólo recibe las notificaciones de sus pedidos y viajes
+def user_room(user_id):
+    return f'usuario:{user_id}'
+
+def notify_users(user_ids, payload):
+    rooms = sorted({user_room(user_id) for user_id in user_ids if user_id is not None})
+    if rooms:
+        socketio.emit('notification-update', payload, to=rooms)
+        socketio_emits.inc('notification-update')
+        socketio_emit_rooms.inc('notification-update', amount=len(rooms))
+
+# Las notificaciones de pedidos salen de la bandeja pedido_eventos, en segundo plano
+order_events = OrderEventDispatcher(
+    db_pool,
+    notify_users,
+    batch_size=int(os.environ.get('ORDER_EVENTS_BATCH', 100)),
+    poll_interval=float(os.environ.get('ORDER_EVENTS_POLL', 1)),
+    coalesce_window=float(os.environ.get('ORDER_EVENTS_WINDOW', 0.05)),
+    max_attempts=int(os.environ.get('ORDER_EVENTS_MAX_ATTEMPTS', 5))
+)
+
+@app.before_request
+def start_order_events():
+    order_events.start(socketio.start_background_task)
+
+# El socket se autentica con el mismo JWT que las rutas: auth={'token': ...},
+# encabezado Authorization o ?token= en la URL de conexión
 @socketio.on('connect')
-def handle_connect():
-    print('Cliente conectado')
+def handle_connect(auth=None):
+    token = auth.get('token') if isinstance(auth, dict) else None
+    if not token and ' ' in request.headers.get('Authorization', ''):
+        token = request.headers['Authorization'].split(" ")[1]
+    token = token or request.args.get('token')
+    if token and token.startswith('Bearer '):
+        token = token[len('Bearer '):]
+
+    if not token:
+        raise ConnectionRefusedError('Token es necesario')
+    try:
+        current_user = token_verifier.verify(token, app.config['SECRET_KEY'])
+    except jwt.ExpiredSignatureError:
+        raise ConnectionRefusedError('El token ha expirado')
+    except jwt.InvalidTokenError:
+        raise ConnectionRefusedError('Token inválido')
+
+    join_room(user_room(current_user))
     return {'message': 'Conexión exitosa'}
 
+# Especificación Swagger generada una sola vez, cuando ya están registradas todas las rutas
+swagger_cache = SpecCache(app.json.dumps(build_spec(app, exclude=('swagger_spec',))))
+
+# Con QUERY_PLAN_CHECK=1 el worker no arranca si alguna consulta perdió su índice
+if os.environ.get('QUERY_PLAN_CHECK') == '1':
+    failed = [' '.join(query.split()) for query, _, scans in verify_query_plans() if scans]
+    if failed:
+        raise RuntimeError('Consultas que recorren una tabla completa:\n' + '\n'.join(failed))
+
 # Iniciar SocketIO
 if __name__ == '__main__':
     socketio.run(app, host='0.0.0.0', port=5000)
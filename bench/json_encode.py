@@ -0,0 +1,88 @@
+# Serialización de listados de pedidos y tiendas: proveedor JSON por defecto
+# de Flask contra FastJSONProvider (json de la biblioteca estándar y orjson).
+#
+#   python bench/json_encode.py --rows 1000 --repeat 50
+#
+# Las filas imitan lo que devuelve cursor(dictionary=True) de MySQL:
+# datetime, date y Decimal.
+import argparse
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jsoncodec import FastJSONProvider, orjson
+
+
+def orders(rows):
+    start = datetime(2025, 1, 1, 8, 30)
+    return [{
+        'id': n,
+        'usuario_id': n % 97,
+        'viaje_id': n % 13,
+        'tienda_id': n % 31,
+        'tarjeta_id': n % 7,
+        'total': Decimal(f'{n % 500}.{n % 100:02d}'),
+        'detalles': f'2 x Producto {n}, 1 x Producto {n + 1}',
+        'estado': 'Pendiente',
+        'notification': n % 2,
+        'entregado': 0,
+        'fecha_creacion': start + timedelta(minutes=n),
+        'arrival_date': date(2025, 2, 1) + timedelta(days=n % 30),
+        'nombre_tienda': f'Tienda Café {n % 31}'
+    } for n in range(rows)]
+
+
+def stores(rows):
+    return [{
+        'id': n,
+        'nombre': f'Tienda Café {n}',
+        'direccion': f'Calle {n} #{n % 300}',
+        'estado': 'Guanajuato',
+        'ciudad': 'León',
+        'horarios': '9:00 - 18:00',
+        'telefono': f'477{n:07d}',
+        'email': f'tienda{n}@paso.mx',
+        'logo_url': f'https://cdn.paso.mx/logos/{n}.png',
+        'promedio_calificacion': Decimal(f'{n % 5}.{n % 100:02d}')
+    } for n in range(rows)]
+
+
+def measure(provider, payload, repeat):
+    provider.dumps(payload)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        provider.dumps(payload)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rendimiento de serialización JSON de filas de MySQL')
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    providers = [('flask (default)', DefaultJSONProvider(app)), ('json (respaldo)', FastJSONProvider(app, use_orjson=False))]
+    if orjson is not None:
+        providers.append(('orjson', FastJSONProvider(app, use_orjson=True)))
+    else:
+        print('orjson no está instalado; sólo se mide el respaldo')
+
+    payloads = [('pedidos', orders(args.rows)), ('tiendas', stores(args.rows))]
+
+    print(f'{args.rows} filas, {args.repeat} repeticiones')
+    for name, payload in payloads:
+        for label, provider in providers:
+            elapsed = measure(provider, payload, args.repeat)
+            print(f'{name:>8} {label:>16}: {elapsed * 1000:8.2f} ms, {args.rows / elapsed:12,.0f} filas/s')
+
+
+if __name__ == '__main__':
+    main()
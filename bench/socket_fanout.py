@@ -0,0 +1,59 @@
+# Costo de enviar una notificación de pedido con miles de sockets conectados:
+# difusión global (antes) contra salas por usuario (ahora).
+#
+#   python bench/socket_fanout.py --sockets 5000 --events 200
+#
+# No abre conexiones reales: registra los sockets en el manager de
+# python-socketio y cuenta los paquetes que el servidor enviaría, que es
+# el trabajo que crece con el número de clientes.
+import argparse
+import time
+
+import socketio
+
+
+def build_server(sockets):
+    server = socketio.Server(async_mode='threading')
+    sent = [0]
+
+    def send(eio_sid, pkt):
+        sent[0] += 1
+
+    server._send_eio_packet = send
+    for n in range(sockets):
+        sid = server.manager.connect(f'eio-{n}', '/')
+        # Un socket por usuario, en su sala (como hace handle_connect)
+        server.manager.enter_room(sid, '/', f'usuario:{n}')
+    return server, sent
+
+
+def run(server, sent, events, rooms_for):
+    sent[0] = 0
+    start = time.perf_counter()
+    for n in range(events):
+        payload = {'message': '¡Nuevo pedido recibido!', 'userId': n, 'orderId': n}
+        server.emit('notification-update', payload, to=rooms_for(n))
+    return time.perf_counter() - start, sent[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Costo de fan-out de notificaciones Socket.IO')
+    parser.add_argument('--sockets', type=int, default=5000)
+    parser.add_argument('--events', type=int, default=200)
+    args = parser.parse_args()
+
+    server, sent = build_server(args.sockets)
+    scenarios = [
+        ('difusión global', lambda n: None),
+        ('salas por usuario', lambda n: [f'usuario:{n % args.sockets}', f'usuario:{(n + 1) % args.sockets}'])
+    ]
+
+    print(f'{args.sockets} sockets, {args.events} eventos')
+    for name, rooms_for in scenarios:
+        elapsed, packets = run(server, sent, args.events, rooms_for)
+        print(f'{name:>18}: {elapsed * 1000 / args.events:8.3f} ms/evento, '
+              f'{packets / args.events:8.1f} paquetes/evento')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+# Bus de mensajes entre procesos para Flask-SocketIO: un broker local sobre un socket Unix
+#
+# Cada worker se conecta al broker y publica ahí sus emits; el broker los
+# reenvía a los demás workers, que los entregan a sus propios sockets. El
+# broker puede correr aparte (`python bus.py /ruta.sock`) o dentro del
+# primer worker que lo necesite: un candado de archivo decide quién lo
+# aloja y, si ese proceso muere, otro worker lo levanta al reconectarse.
+import fcntl
+import logging
+import os
+import pickle
+import socket
+import struct
+import sys
+import threading
+import time
+
+import socketio
+
+logger = logging.getLogger('socketio.bus')
+
+DEFAULT_PATH = '/tmp/paso_socketio.sock'
+
+# Mensajes con prefijo de longitud (4 bytes, big-endian)
+FRAME = struct.Struct('!I')
+MAX_FRAME = 16 * 1024 * 1024
+
+# Un worker que no lee sus mensajes en este tiempo se desconecta (se reconectará)
+SEND_TIMEOUT = 5
+
+
+def send_frame(sock, payload):
+    sock.sendall(FRAME.pack(len(payload)) + payload)
+
+
+def _recv_exactly(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+
+def recv_frame(sock):
+    """Siguiente mensaje del socket, o None si el otro extremo cerró."""
+    header = _recv_exactly(sock, FRAME.size)
+    if header is None:
+        return None
+    (size,) = FRAME.unpack(header)
+    if size > MAX_FRAME:
+        raise OSError(f'Mensaje de {size} bytes excede el máximo del bus')
+    return _recv_exactly(sock, size)
+
+
+class UnixSocketBroker:
+    """Reenvía cada mensaje recibido a todos los demás clientes conectados."""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._server = None
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._stats = {'connections': 0, 'messages': 0, 'bytes': 0, 'dropped': 0}
+
+    def bind(self):
+        # Un archivo que quedó de un broker anterior ya no tiene a nadie escuchando
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.path)
+        os.chmod(self.path, 0o600)
+        server.listen(128)
+        self._server = server
+
+    def serve_forever(self):
+        while True:
+            client, _ = self._server.accept()
+            # Tiempo máximo de envío; la lectura sigue siendo bloqueante
+            client.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, struct.pack('ll', SEND_TIMEOUT, 0))
+            with self._lock:
+                self._clients[client] = threading.Lock()
+                self._stats['connections'] += 1
+            threading.Thread(target=self._serve_client, args=(client,), daemon=True).start()
+
+    def _serve_client(self, client):
+        try:
+            while True:
+                payload = recv_frame(client)
+                if payload is None:
+                    break
+                self._broadcast(client, payload)
+        except OSError:
+            pass
+        finally:
+            self._drop(client)
+
+    def _broadcast(self, sender, payload):
+        data = FRAME.pack(len(payload)) + payload
+        with self._lock:
+            targets = [(client, lock) for client, lock in self._clients.items() if client is not sender]
+            self._stats['messages'] += 1
+            self._stats['bytes'] += len(payload)
+        for client, lock in targets:
+            try:
+                with lock:
+                    client.sendall(data)
+            except OSError:
+                with self._lock:
+                    self._stats['dropped'] += 1
+                self._drop(client)
+
+    def _drop(self, client):
+        with self._lock:
+            self._clients.pop(client, None)
+        try:
+            client.close()
+        except OSError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data['clients'] = len(self._clients)
+        data['path'] = self.path
+        return data
+
+
+def start_broker(path):
+    """Levanta el broker en un hilo si ningún otro proceso lo tiene; si no, devuelve None."""
+    lock_file = open(path + '.lock', 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    broker = UnixSocketBroker(path)
+    broker.bind()
+    # El candado se conserva mientras viva el proceso
+    broker.lock_file = lock_file
+    threading.Thread(target=broker.serve_forever, name='socketio-bus', daemon=True).start()
+    logger.info('Broker del bus de Socket.IO escuchando en %s', path)
+    return broker
+
+
+class UnixSocketManager(socketio.PubSubManager):
+    """Client manager de python-socketio que comparte emits y salas por el broker.
+
+    `url` tiene la forma unix:///ruta/al/socket. Con `embedded_broker` el
+    worker levanta el broker si no encuentra uno escuchando.
+    """
+
+    name = 'unix'
+
+    def __init__(self, url='unix://' + DEFAULT_PATH, channel='flask-socketio', write_only=False,
+                 logger=None, embedded_broker=True):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.path = url[len('unix://'):] if url.startswith('unix://') else url
+        self.embedded_broker = embedded_broker
+        self.broker = None
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+        self._stats = {'published': 0, 'received': 0, 'connections': 0, 'publish_errors': 0}
+
+    def _connect(self):
+        with self._connect_lock:
+            if self._sock is not None:
+                return self._sock
+            for attempt in range(2):
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                try:
+                    sock.connect(self.path)
+                    self._sock = sock
+                    self._stats['connections'] += 1
+                    return sock
+                except (FileNotFoundError, ConnectionRefusedError):
+                    sock.close()
+                    if attempt or not self.embedded_broker or self.broker is not None:
+                        raise
+                    self.broker = start_broker(self.path)
+                    if self.broker is None:
+                        time.sleep(0.1)  # Otro proceso lo está levantando
+
+    def _disconnect(self, sock):
+        with self._connect_lock:
+            if self._sock is sock:
+                self._sock = None
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+    def _publish(self, data):
+        payload = pickle.dumps(data)
+        for retry in (True, False):
+            sock = None
+            try:
+                sock = self._connect()
+                with self._send_lock:
+                    send_frame(sock, payload)
+                self._stats['published'] += 1
+                return
+            except OSError:
+                if sock is not None:
+                    self._disconnect(sock)
+                if not retry:
+                    self._stats['publish_errors'] += 1
+                    self._get_logger().error('No se pudo publicar en el bus de Socket.IO (%s)', self.path)
+
+    def _listen(self):
+        retry_sleep = 1
+        while True:
+            sock = None
+            try:
+                sock = self._connect()
+                retry_sleep = 1
+                while True:
+                    payload = recv_frame(sock)
+                    if payload is None:
+                        break
+                    self._stats['received'] += 1
+                    yield payload
+            except OSError:
+                self._get_logger().error('Sin conexión al bus de Socket.IO; reintento en %s s', retry_sleep)
+                time.sleep(retry_sleep)
+                retry_sleep = min(retry_sleep * 2, 60)
+            if sock is not None:
+                self._disconnect(sock)
+
+    def stats(self):
+        data = dict(self._stats)
+        data['path'] = self.path
+        data['connected'] = self._sock is not None
+        data['broker'] = self.broker.stats() if self.broker is not None else None
+        return data
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH
+    broker = start_broker(path)
+    if broker is None:
+        sys.exit(f'Ya hay un broker del bus escuchando en {path}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
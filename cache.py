@@ -0,0 +1,108 @@
+# Caché en memoria (LRU + TTL) compartida por los hilos de un worker
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """LRU acotado a `maxsize` entradas, cada una válida durante `ttl` segundos.
+
+    Para no guardar datos leídos antes de una invalidación concurrente, quien
+    lee de la base toma `snapshot()` antes de consultar y lo pasa a
+    `set(..., since=snapshot)`: si la clave se invalidó mientras tanto, el
+    valor se descarta. Las claves tupla pueden invalidarse por prefijo
+    (p. ej. todas las páginas de productos de una tienda).
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Secuencia de invalidaciones: clave -> número de la última invalidación
+        self._sequence = 0
+        self._invalidated = OrderedDict()
+        self._forgotten = 0
+
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return default
+            self._data.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def snapshot(self):
+        with self._lock:
+            return self._sequence
+
+    def set(self, key, value, ttl=None, since=None):
+        with self._lock:
+            if since is not None and self._invalidated_since(key, since):
+                return False
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats['evictions'] += 1
+            return True
+
+    def _invalidated_since(self, key, since):
+        if since < self._forgotten or self._invalidated.get(key, -1) > since:
+            return True
+        if isinstance(key, tuple):
+            return any(self._invalidated.get(key[:i], -1) > since for i in range(1, len(key)))
+        return False
+
+    def _record_invalidation(self, key):
+        self._sequence += 1
+        self._invalidated[key] = self._sequence
+        self._invalidated.move_to_end(key)
+        # Registro acotado: lo olvidado cuenta como invalidado para lecturas anteriores
+        while len(self._invalidated) > self.maxsize:
+            _, sequence = self._invalidated.popitem(last=False)
+            self._forgotten = sequence
+
+    def invalidate(self, key):
+        with self._lock:
+            self._record_invalidation(key)
+            if self._data.pop(key, None) is not None:
+                self._stats['invalidations'] += 1
+
+    def invalidate_prefix(self, prefix):
+        prefix = tuple(prefix)
+        with self._lock:
+            self._record_invalidation(prefix)
+            stale = [key for key in self._data if isinstance(key, tuple) and key[:len(prefix)] == prefix]
+            for key in stale:
+                del self._data[key]
+            self._stats['invalidations'] += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._sequence += 1
+            self._forgotten = self._sequence
+            self._invalidated.clear()
+            self._stats['invalidations'] += len(self._data)
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data['size'] = len(self._data)
+        data['maxsize'] = self.maxsize
+        data['ttl'] = self.ttl
+        lookups = data['hits'] + data['misses']
+        data['hit_ratio'] = data['hits'] / lookups if lookups else 0.0
+        return data
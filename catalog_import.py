@@ -0,0 +1,328 @@
+# Importación masiva del catálogo (tiendas y productos) desde JSON, NDJSON o CSV
+#
+# El cuerpo se lee en streaming y se valida fila por fila; las filas válidas
+# se insertan con executemany en transacciones de `chunk_size` filas, así que
+# la memoria no crece con el tamaño del archivo. Una fila inválida o que la
+# base rechaza se reporta con su número sin detener el resto de la carga. Si el
+# cuerpo deja de poderse leer, lo insertado hasta ahí se conserva y el resumen
+# lleva `aborted`.
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from db import DB_ERRORS
+
+CSV_MIMETYPE = 'text/csv'
+NDJSON_MIMETYPE = 'application/x-ndjson'
+JSON_MIMETYPE = 'application/json'
+MIMETYPES = (JSON_MIMETYPE, NDJSON_MIMETYPE, CSV_MIMETYPE)
+
+CHUNK_SIZE = 500
+READ_SIZE = 64 * 1024
+
+# Tamaño máximo (en caracteres) de un elemento del arreglo JSON o de una línea NDJSON:
+# el búfer de lectura nunca crece más allá de esto y un bloque leído
+MAX_RECORD_SIZE = 1024 * 1024
+
+# Errores por fila que se devuelven; el total siempre se cuenta
+MAX_REPORTED_ERRORS = 100
+
+INSERT_SHOP = """
+    INSERT INTO tiendas (nombre, direccion, estado, ciudad, horarios, telefono, email, logo_url)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+INSERT_PRODUCT = """
+    INSERT INTO productos (tienda_id, nombre, descripcion, cantidad, unidad_medida, precio_tienda, precio_publico, imagen, fecha_creacion)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+EXISTING_SHOPS = "SELECT id FROM tiendas WHERE id IN ({})"
+
+
+class ImportFormatError(ValueError):
+    """El cuerpo no se puede seguir leyendo (JSON mal formado, codificación inválida)."""
+
+
+def _text(record, key, max_length, required=False):
+    value = record.get(key)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            raise ValueError(f'{key} es requerido')
+        return None
+    value = str(value).strip()
+    if len(value) > max_length:
+        raise ValueError(f'{key} excede {max_length} caracteres')
+    return value
+
+
+def _integer(record, key):
+    value = record.get(key)
+    try:
+        if isinstance(value, bool) or value is None or value == '':
+            raise ValueError
+        number = Decimal(str(value).strip())
+        if number != number.to_integral_value():
+            raise ValueError
+    except (ValueError, InvalidOperation):
+        raise ValueError(f'{key} debe ser un número entero')
+    return int(number)
+
+
+def _price(record, key):
+    value = record.get(key)
+    try:
+        if isinstance(value, bool) or value is None or value == '':
+            raise ValueError
+        price = Decimal(str(value).strip())
+        if not price.is_finite() or price < 0 or price >= Decimal('100000000'):
+            raise ValueError
+    except (ValueError, InvalidOperation):
+        raise ValueError(f'{key} debe ser un precio válido')
+    return price.quantize(Decimal('0.01'))
+
+
+def shop_row(record):
+    """Parámetros de INSERT_SHOP para una fila con las claves de /add-shop."""
+    return (
+        _text(record, 'name', 150, required=True),
+        _text(record, 'address', 255),
+        _text(record, 'state', 100),
+        _text(record, 'city', 100),
+        _text(record, 'schedule', 255),
+        _text(record, 'phone', 30),
+        _text(record, 'email', 150),
+        _text(record, 'logo_url', 255)
+    )
+
+
+def product_row(record):
+    """Parámetros de INSERT_PRODUCT para una fila con las claves de /add-product."""
+    return (
+        _integer(record, 'shop'),
+        _text(record, 'name', 150, required=True),
+        _text(record, 'description', 65535),
+        _integer(record, 'quantity'),
+        _text(record, 'unit', 50, required=True),
+        _price(record, 'storePrice'),
+        _price(record, 'publicPrice'),
+        _text(record, 'image', 255, required=True),
+        datetime.now()
+    )
+
+
+def _truncated(error, length):
+    # Una cadena sin cerrar se reporta en su inicio; el resto de errores, donde se detuvo
+    # la lectura (al final, o dentro de una secuencia de escape \uXXXX cortada)
+    return error.msg.startswith('Unterminated string') or error.pos >= length - 6
+
+
+def _json_array(stream):
+    # Decodifica los elementos del arreglo a medida que llegan los bytes
+    decoder = json.JSONDecoder()
+    reader = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    buffer = ''
+    position = 0
+    eof = False
+    started = False
+
+    def fill():
+        nonlocal buffer, position, eof
+        chunk = reader.read(READ_SIZE)
+        if not chunk:
+            eof = True
+        buffer = buffer[position:] + chunk
+        position = 0
+
+    def refill():
+        if len(buffer) - position > MAX_RECORD_SIZE:
+            raise ImportFormatError(f'Un elemento del arreglo supera {MAX_RECORD_SIZE} caracteres')
+        fill()
+
+    def skip_whitespace():
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer) or eof:
+                return
+            fill()
+
+    skip_whitespace()
+    if position >= len(buffer) or buffer[position] != '[':
+        raise ImportFormatError('Se esperaba un arreglo JSON')
+    position += 1
+    while True:
+        skip_whitespace()
+        if position >= len(buffer):
+            raise ImportFormatError('Arreglo JSON incompleto')
+        if buffer[position] == ']':
+            return
+        if started:
+            if buffer[position] != ',':
+                raise ImportFormatError('Se esperaba "," entre los elementos del arreglo')
+            position += 1
+            skip_whitespace()
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as e:
+                # Sólo se lee más si el elemento está cortado por el fin del búfer; un error
+                # antes de eso es un cuerpo mal formado y no tiene caso leer el resto
+                if eof or not _truncated(e, len(buffer)):
+                    raise ImportFormatError(f'JSON inválido: {e.msg}')
+                refill()
+                continue
+            # Un número al final del búfer podría seguir en el siguiente bloque
+            if end == len(buffer) and not eof:
+                refill()
+                continue
+            break
+        position = end
+        started = True
+        yield item
+
+
+def read_records(stream, mimetype):
+    """Genera (número de fila, registro) del cuerpo; un registro ilegible llega como ValueError."""
+    try:
+        if mimetype == JSON_MIMETYPE:
+            yield from enumerate(_json_array(stream), 1)
+            return
+
+        reader = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if mimetype == CSV_MIMETYPE else None)
+        if mimetype == CSV_MIMETYPE:
+            for number, record in enumerate(csv.DictReader(reader), 1):
+                if None in record:
+                    yield number, ValueError('La fila tiene más columnas que el encabezado')
+                else:
+                    yield number, record
+            return
+
+        number = 0
+        for line in iter(lambda: reader.readline(MAX_RECORD_SIZE + 1), ''):
+            if len(line) > MAX_RECORD_SIZE:
+                raise ImportFormatError(f'Una línea supera {MAX_RECORD_SIZE} caracteres')
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                yield number, json.loads(line)
+            except ValueError as e:
+                yield number, ValueError(f'JSON inválido: {e}')
+    except UnicodeDecodeError:
+        raise ImportFormatError('El archivo debe estar codificado en UTF-8')
+
+
+class CatalogImport:
+    """Valida e inserta filas por lotes y lleva el resumen de la carga."""
+
+    def __init__(self, pool, insert, to_row, check_chunk=None, chunk_size=CHUNK_SIZE):
+        self._pool = pool
+        self._insert = insert
+        self._to_row = to_row
+        self._check_chunk = check_chunk
+        self.chunk_size = chunk_size
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, number, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': number, 'error': message})
+
+    def run(self, records):
+        start = time.perf_counter()
+        aborted = None
+        connection = self._pool.get_connection()
+        try:
+            cursor = connection.cursor()
+            try:
+                chunk = []
+                try:
+                    for number, record in records:
+                        try:
+                            if isinstance(record, Exception):
+                                raise record
+                            if not isinstance(record, dict):
+                                raise ValueError('Cada fila debe ser un objeto')
+                            chunk.append((number, self._to_row(record)))
+                        except ValueError as e:
+                            self.error(number, str(e))
+                        if len(chunk) >= self.chunk_size:
+                            self._flush(connection, cursor, chunk)
+                            chunk = []
+                except ImportFormatError as e:
+                    # Lo leído hasta aquí se guarda; el resto del cuerpo no se puede interpretar
+                    aborted = str(e)
+                if chunk:
+                    self._flush(connection, cursor, chunk)
+            finally:
+                cursor.close()
+        finally:
+            connection.close()
+
+        elapsed = time.perf_counter() - start
+        summary = {
+            'inserted': self.inserted,
+            'failed': self.failed,
+            'errors': self.errors,
+            'elapsed': round(elapsed, 3),
+            'rows_per_second': round((self.inserted + self.failed) / elapsed) if elapsed else None
+        }
+        if aborted:
+            summary['aborted'] = aborted
+        return summary
+
+    def _flush(self, connection, cursor, chunk):
+        if self._check_chunk:
+            rejected = self._check_chunk(cursor, [row for _, row in chunk])
+            for number, row in chunk:
+                if id(row) in rejected:
+                    self.error(number, rejected[id(row)])
+            chunk = [(number, row) for number, row in chunk if id(row) not in rejected]
+            if not chunk:
+                return
+        try:
+            cursor.executemany(self._insert, [row for _, row in chunk])
+            connection.commit()
+            self.inserted += len(chunk)
+        except DB_ERRORS:
+            # Se repite fila por fila para saber cuáles rechaza la base
+            connection.rollback()
+            for number, row in chunk:
+                try:
+                    cursor.execute(self._insert, row)
+                    self.inserted += 1
+                except DB_ERRORS as err:
+                    self.error(number, str(err))
+            connection.commit()
+
+
+def missing_shops(cursor, rows):
+    """Filas de productos cuya tienda no existe: {id(fila): mensaje}."""
+    shop_ids = sorted({row[0] for row in rows})
+    cursor.execute(EXISTING_SHOPS.format(', '.join(['%s'] * len(shop_ids))), shop_ids)
+    existing = {row[0] for row in cursor.fetchall()}
+    return {id(row): f'La tienda {row[0]} no existe' for row in rows if row[0] not in existing}
+
+
+def import_shops(pool, records, chunk_size=CHUNK_SIZE):
+    return CatalogImport(pool, INSERT_SHOP, shop_row, chunk_size=chunk_size).run(records)
+
+
+def import_products(pool, records, chunk_size=CHUNK_SIZE):
+    """Devuelve el resumen y las tiendas que recibieron productos (para invalidar su caché)."""
+    shop_ids = set()
+
+    def to_row(record):
+        row = product_row(record)
+        shop_ids.add(row[0])
+        return row
+
+    summary = CatalogImport(pool, INSERT_PRODUCT, to_row, check_chunk=missing_shops, chunk_size=chunk_size).run(records)
+    return summary, shop_ids
@@ -0,0 +1,126 @@
+# Compresión de respuestas (brotli y gzip) negociada con Accept-Encoding
+#
+# Brotli viene en requirements.txt; si el módulo falta (un entorno armado a mano)
+# sólo se usa gzip, y /internal/stats lo indica con compression.brotli = false.
+import gzip
+import hashlib
+import threading
+import time
+
+from flask import request
+
+from cache import TTLCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Tipos que vale la pena comprimir; imágenes y binarios ya vienen comprimidos
+COMPRESSIBLE = ('application/json', 'application/x-ndjson', 'application/javascript', 'application/xml',
+                'text/')
+
+
+class ResponseCompressor:
+    """Comprime en `after_request` las respuestas de al menos `min_size` bytes.
+
+    Prefiere brotli cuando el cliente lo acepta y el módulo está instalado.
+    No toca respuestas en streaming, ya codificadas o con `no-transform`.
+    Las respuestas GET públicas (sin Authorization) guardan sus bytes
+    comprimidos en una caché indexada por el hash del cuerpo, así una
+    página servida desde la caché del catálogo no se comprime dos veces.
+    """
+
+    def __init__(self, app=None, min_size=500, level=6, brotli_level=5, cache_size=512, cache_ttl=300):
+        self.min_size = min_size
+        self.level = level
+        self.brotli_level = brotli_level
+        self._cache = TTLCache(maxsize=cache_size, ttl=cache_ttl) if cache_size else None
+        self._lock = threading.Lock()
+        self._routes = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.after_request(self.compress)
+
+    def _encoding(self):
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br'] > 0:
+            return 'br'
+        if accepted['gzip'] > 0:
+            return 'gzip'
+        return None
+
+    def _compress(self, encoding, body):
+        if encoding == 'br':
+            return brotli.compress(body, quality=self.brotli_level)
+        return gzip.compress(body, compresslevel=self.level, mtime=0)
+
+    def compress(self, response):
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code < 200 or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers
+                or 'no-transform' in response.headers.get('Cache-Control', '')
+                or not response.mimetype.startswith(COMPRESSIBLE)):
+            return response
+
+        # La respuesta depende del encabezado aunque esta vez no se comprima
+        response.vary.add('Accept-Encoding')
+        encoding = self._encoding()
+        if encoding is None:
+            return response
+        body = response.get_data()
+        if len(body) < self.min_size:
+            return response
+
+        start = time.perf_counter()
+        cache_key = None
+        compressed = None
+        if self._cache is not None and request.method == 'GET' and 'Authorization' not in request.headers:
+            cache_key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+            compressed = self._cache.get(cache_key)
+        cached = compressed is not None
+        if compressed is None:
+            compressed = self._compress(encoding, body)
+            if cache_key is not None:
+                self._cache.set(cache_key, compressed)
+        elapsed = time.perf_counter() - start
+
+        # Si no se gana nada se envía el original
+        if len(compressed) >= len(body):
+            return response
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        if response.headers.get('ETag'):
+            etag, weak = response.get_etag()
+            response.set_etag(f'{etag}-{encoding}', weak)
+        self._record(len(body), len(compressed), elapsed, cached)
+        return response
+
+    def _record(self, raw, compressed, elapsed, cached):
+        route = request.url_rule.rule if request.url_rule else request.path
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = {'responses': 0, 'raw_bytes': 0, 'compressed_bytes': 0,
+                                               'cache_hits': 0, 'compress_time_total': 0.0}
+            stats['responses'] += 1
+            stats['raw_bytes'] += raw
+            stats['compressed_bytes'] += compressed
+            stats['cache_hits'] += cached
+            stats['compress_time_total'] += elapsed
+
+    def stats(self):
+        with self._lock:
+            routes = {route: dict(stats) for route, stats in self._routes.items()}
+        for stats in routes.values():
+            stats['ratio'] = round(stats['compressed_bytes'] / stats['raw_bytes'], 3) if stats['raw_bytes'] else None
+        return {
+            'brotli': brotli is not None,
+            'min_size': self.min_size,
+            'level': self.level,
+            'cache': self._cache.stats() if self._cache is not None else None,
+            'routes': routes
+        }
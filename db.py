@@ -0,0 +1,503 @@
+# Capa de acceso a datos: backends (MySQL / SQLite) y pool de conexiones compartido
+import logging
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+import mysql.connector
+from mysql.connector import errors
+
+from migrations import migrate
+
+# Errores que pueden lanzar las consultas, sea cual sea el backend
+DB_ERRORS = (mysql.connector.Error, sqlite3.Error)
+
+# Violación de una clave única o foránea
+INTEGRITY_ERRORS = (mysql.connector.IntegrityError, sqlite3.IntegrityError)
+
+logger = logging.getLogger('paso.db')
+
+_WHITESPACE = re.compile(r'\s+')
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)', re.IGNORECASE)
+_normalized = {}
+
+
+def normalize_statement(query):
+    """SQL en una línea y con las listas IN (%s, %s, ...) reducidas a IN (...).
+
+    Las variantes de una misma consulta (espacios, tamaño de la lista) quedan
+    como una sola sentencia para métricas y registros.
+    """
+    statement = _normalized.get(query)
+    if statement is None:
+        statement = _IN_LIST.sub('IN (...)', _WHITESPACE.sub(' ', query).strip().rstrip(';').strip())
+        if len(_normalized) >= 1024:
+            _normalized.clear()
+        _normalized[query] = statement
+    return statement
+
+
+class MySQLBackend:
+    name = 'mysql'
+    # Sufijo de una lectura que bloquea las filas hasta el fin de la transacción
+    for_update = ' FOR UPDATE'
+
+    def __init__(self, config):
+        self.config = config
+
+    def connect(self):
+        return mysql.connector.connect(**self.config)
+
+    def explain(self, connection, query, params=()):
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute('EXPLAIN ' + query, params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+
+def _convert_date(value):
+    try:
+        return date.fromisoformat(value.decode())
+    except ValueError:
+        return value.decode()
+
+
+def _convert_datetime(value):
+    try:
+        return datetime.fromisoformat(value.decode())
+    except ValueError:
+        return value.decode()
+
+
+def _convert_decimal(value):
+    try:
+        return Decimal(value.decode())
+    except InvalidOperation:
+        return value.decode()
+
+
+class SQLiteBackend:
+    """Motor embebido con el mismo esquema que MySQL, para pruebas y benchmarks.
+
+    Acepta las consultas de app.py tal cual (placeholders `%s`,
+    `cursor(dictionary=True)`) y devuelve fechas y decimales con los mismos
+    tipos de Python que mysql.connector.
+    """
+
+    name = 'sqlite'
+    # Sin FOR UPDATE: SQLite bloquea la base completa al escribir, y una segunda
+    # transacción que intenta escribir falla en vez de leer filas ya cambiadas
+    for_update = ''
+
+    def __init__(self, path):
+        self.path = path
+        self._uri = False
+        self._keeper = None
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+        # Una base en memoria se comparte entre las conexiones del pool
+        if path == ':memory:':
+            self.path = f'file:paso_db_{id(self)}?mode=memory&cache=shared'
+            self._uri = True
+
+        sqlite3.register_adapter(date, date.isoformat)
+        sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+        sqlite3.register_adapter(Decimal, str)
+        sqlite3.register_converter('DATE', _convert_date)
+        sqlite3.register_converter('DATETIME', _convert_datetime)
+        sqlite3.register_converter('TIMESTAMP', _convert_datetime)
+        sqlite3.register_converter('DECIMAL', _convert_decimal)
+
+    def connect(self):
+        raw = sqlite3.connect(
+            self.path,
+            uri=self._uri,
+            timeout=30,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False
+        )
+        raw.execute('PRAGMA foreign_keys = ON')
+        if not self._uri:
+            raw.execute('PRAGMA journal_mode = WAL')
+        self._ensure_schema(raw)
+        return SQLiteConnection(raw)
+
+    def _ensure_schema(self, raw):
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            # Mismas migraciones que `flask migrate` aplica en MySQL
+            migrate(SQLiteConnection(raw), self.name)
+            # La base en memoria desaparece al cerrar su última conexión
+            if self._uri:
+                self._keeper = raw
+            self._schema_ready = True
+
+    def explain(self, connection, query, params=()):
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute('EXPLAIN QUERY PLAN ' + query, params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+
+class SQLiteConnection:
+    """Adapta sqlite3 a la interfaz de mysql.connector que usan las rutas."""
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def cursor(self, dictionary=False, buffered=None):
+        return SQLiteCursor(self._raw.cursor(), dictionary)
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def close(self):
+        self._raw.close()
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        self._raw.execute('SELECT 1').fetchone()
+
+    def is_connected(self):
+        try:
+            self.ping()
+        except sqlite3.Error:
+            return False
+        return True
+
+    @property
+    def in_transaction(self):
+        return self._raw.in_transaction
+
+
+class SQLiteCursor:
+    _translated = {}
+
+    def __init__(self, raw, dictionary):
+        self._raw = raw
+        self._dictionary = dictionary
+        self.column_names = ()
+
+    @classmethod
+    def _translate(cls, query):
+        translated = cls._translated.get(query)
+        if translated is None:
+            translated = query.replace('%s', '?')
+            if len(cls._translated) >= 1024:
+                cls._translated.clear()
+            cls._translated[query] = translated
+        return translated
+
+    def execute(self, query, params=()):
+        self._raw.execute(self._translate(query), tuple(params or ()))
+        description = self._raw.description
+        self.column_names = tuple(column[0] for column in description) if description else ()
+        return None
+
+    def executemany(self, query, seq_params):
+        self._raw.executemany(self._translate(query), [tuple(params) for params in seq_params])
+        self.column_names = ()
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip(self.column_names, row))
+
+    def fetchone(self):
+        return self._row(self._raw.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(row) for row in self._raw.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._raw.fetchall()]
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self._raw.close()
+
+    @property
+    def description(self):
+        return self._raw.description
+
+    @property
+    def lastrowid(self):
+        return self._raw.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._raw.rowcount
+
+
+class PoolTimeoutError(errors.PoolError):
+    """No se obtuvo una conexión libre dentro del tiempo de espera."""
+
+
+class InstrumentedCursor:
+    """Cursor que mide cada sentencia y la reporta a los listeners del pool al terminarla.
+
+    Una sentencia termina con el siguiente execute o con close(); su tiempo
+    incluye la lectura de las filas (con cursores sin buffer el execute
+    regresa antes de que lleguen). Los listeners reciben
+    `(consulta, parámetros, segundos, filas)`: las filas leídas en un SELECT
+    o las afectadas en el resto.
+    """
+
+    def __init__(self, cursor, listeners):
+        self._cursor = cursor
+        self._listeners = listeners
+        self._query = None
+
+    def _start(self, query, params):
+        self._finish()
+        self._query = query
+        self._params = params
+        self._rows = 0
+        self._elapsed = 0.0
+
+    def _executed(self, start):
+        self._elapsed += time.perf_counter() - start
+        if self._cursor.description is None:
+            self._rows = max(self._cursor.rowcount or 0, 0)
+
+    def execute(self, query, params=()):
+        self._start(query, params)
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(query, params)
+        finally:
+            self._executed(start)
+
+    def executemany(self, query, seq_params):
+        seq_params = list(seq_params)
+        self._start(query, seq_params)
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, seq_params)
+        finally:
+            self._executed(start)
+
+    def _fetched(self, start, rows):
+        self._elapsed += time.perf_counter() - start
+        self._rows += rows
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(start, row is not None)
+        return row
+
+    def fetchmany(self, size=1):
+        start = time.perf_counter()
+        rows = self._cursor.fetchmany(size)
+        self._fetched(start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(start, len(rows))
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def _finish(self):
+        if self._query is None:
+            return
+        query, self._query = self._query, None
+        for listener in self._listeners:
+            try:
+                listener(query, self._params, self._elapsed, self._rows)
+            except Exception:
+                # Medir nunca debe romper la consulta
+                logger.exception('Error en un listener de consultas')
+
+    def close(self):
+        self._finish()
+        return self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class PooledConnection:
+    """Envoltura de una conexión del pool; close() la devuelve en lugar de cerrarla."""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._raw.cursor(*args, **kwargs)
+        if self._pool is not None and self._pool.query_listeners:
+            return InstrumentedCursor(cursor, self._pool.query_listeners)
+        return cursor
+
+    def close(self):
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            pool._release(self)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class ConnectionPool:
+    """Pool de conexiones con tamaño máximo, espera acotada, health-check y reciclaje.
+
+    Las conexiones se crean bajo demanda hasta `size`. Al entregarse se les
+    hace ping si llevan más de `ping_interval` segundos sin usarse, y se
+    reemplazan cuando superan `recycle` segundos de vida.
+
+    `acquire_listeners` reciben los segundos que tardó cada get_connection()
+    (espera, ping o conexión nueva) y `query_listeners` cada sentencia
+    ejecutada con un cursor de una conexión del pool (ver InstrumentedCursor).
+    """
+
+    def __init__(self, connect, size=5, timeout=5.0, recycle=3600, ping_interval=30):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_interval = ping_interval
+
+        self.acquire_listeners = []
+        self.query_listeners = []
+
+        self._lock = threading.Condition()
+        self._idle = []
+        self._in_use = 0
+        self._stats = {
+            'created': 0,
+            'recycled': 0,
+            'failed_pings': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+    def get_connection(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+
+        with self._lock:
+            while not self._idle and self._in_use >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        f'No hay conexiones disponibles tras {self.timeout}s (pool de {self.size})'
+                    )
+                waited = True
+                self._lock.wait(remaining)
+
+            conn = self._idle.pop() if self._idle else None
+            self._in_use += 1
+            self._stats['checkouts'] += 1
+            if waited:
+                wait = time.monotonic() - start
+                self._stats['waits'] += 1
+                self._stats['wait_time_total'] += wait
+                self._stats['wait_time_max'] = max(self._stats['wait_time_max'], wait)
+
+        try:
+            raw = self._checkout(conn)
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+                self._lock.notify()
+            raise
+
+        wrapper = PooledConnection(self, raw)
+        if conn is not None:
+            wrapper.created_at = conn.created_at
+        if self.acquire_listeners:
+            elapsed = time.monotonic() - start
+            for listener in self.acquire_listeners:
+                listener(elapsed)
+        return wrapper
+
+    def _checkout(self, conn):
+        # Sin conexiones libres: abrir una nueva
+        if conn is None:
+            return self._new_raw()
+
+        now = time.monotonic()
+        if self.recycle and now - conn.created_at > self.recycle:
+            self._discard(conn._raw)
+            with self._lock:
+                self._stats['recycled'] += 1
+            return self._new_raw()
+
+        if now - conn.last_used >= self.ping_interval:
+            try:
+                conn._raw.ping(reconnect=False)
+            except Exception:
+                self._discard(conn._raw)
+                with self._lock:
+                    self._stats['failed_pings'] += 1
+                return self._new_raw()
+
+        return conn._raw
+
+    def _new_raw(self):
+        raw = self._connect()
+        with self._lock:
+            self._stats['created'] += 1
+        return raw
+
+    def _release(self, wrapper):
+        raw = wrapper._raw
+        healthy = True
+        try:
+            # No dejar transacciones abiertas de una petición a otra
+            if raw.in_transaction:
+                raw.rollback()
+        except Exception:
+            healthy = False
+
+        if not healthy:
+            self._discard(raw)
+
+        with self._lock:
+            self._in_use -= 1
+            if healthy:
+                idle = PooledConnection(None, raw)
+                idle.created_at = wrapper.created_at
+                self._idle.append(idle)
+            self._lock.notify()
+
+    @staticmethod
+    def _discard(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data['size'] = self.size
+            data['in_use'] = self._in_use
+            data['idle'] = len(self._idle)
+        data['wait_time_avg'] = data['wait_time_total'] / data['waits'] if data['waits'] else 0.0
+        return data
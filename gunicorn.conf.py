@@ -0,0 +1,11 @@
+# Configuración de gunicorn (la lee por defecto desde el directorio de trabajo)
+import os
+
+from metrics import clear_directory
+
+
+# Las fotos de métricas de un arranque anterior no pertenecen a estos workers
+def on_starting(server):
+    directory = os.environ.get('METRICS_DIR')
+    if directory and os.path.isdir(directory):
+        clear_directory(directory)
@@ -0,0 +1,124 @@
+# Proveedor JSON de Flask para las filas de MySQL: orjson si está instalado, json de la biblioteca estándar si no
+#
+# Los dos caminos producen el mismo texto: claves ordenadas, sin espacios,
+# UTF-8 sin escapar, fechas en el formato HTTP (RFC 822) del proveedor por
+# defecto de Flask, Decimal como texto (precios y totales sin pérdida), TIME
+# de MySQL (timedelta) como [-]H:MM:SS y bytes como texto UTF-8 (base64 si
+# no lo son).
+import base64
+import dataclasses
+import json
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _timedelta(value):
+    sign = '-' if value < timedelta(0) else ''
+    total = abs(value)
+    seconds = total.days * 86400 + total.seconds
+    text = f'{sign}{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}'
+    if total.microseconds:
+        text += f'.{total.microseconds:06d}'
+    return text
+
+
+_DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+def _http_date(value):
+    # Mismo texto que werkzeug.http.http_date (lo que usa Flask) sin pasar por email.utils
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, time())
+    elif value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return (f'{_DAYS[value.weekday()]}, {value.day:02d} {_MONTHS[value.month - 1]} {value.year:04d} '
+            f'{value.hour:02d}:{value.minute:02d}:{value.second:02d} GMT')
+
+
+def _bytes(value):
+    try:
+        return bytes(value).decode('utf-8')
+    except UnicodeDecodeError:
+        return base64.b64encode(value).decode('ascii')
+
+
+def native_default(value):
+    """Tipos que orjson no serializa por sí mismo (las fechas se le pasan tal cual)."""
+    if isinstance(value, Decimal):
+        return str(value)
+    # datetime es subclase de date: "Wed, 01 Jan 2025 08:30:00 GMT", como Flask
+    if isinstance(value, date):
+        return _http_date(value)
+    if isinstance(value, time):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return _timedelta(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return _bytes(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def python_default(value):
+    """Todos los tipos de `native_default` más los que orjson maneja de forma nativa."""
+    # Decimal primero: precios, totales y calificaciones son los más frecuentes
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    return native_default(value)
+
+
+class FastJSONProvider(JSONProvider):
+    """`app.json` respaldado por orjson, con el módulo json como respaldo."""
+
+    mimetype = 'application/json'
+
+    def __init__(self, app, use_orjson=None):
+        super().__init__(app)
+        self.use_orjson = orjson is not None if use_orjson is None else use_orjson
+        if self.use_orjson:
+            # Sin PASSTHROUGH orjson escribiría las fechas en ISO 8601
+            self._options = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def _indent(self, kwargs):
+        # Igual que el proveedor por defecto: legible sólo en modo debug
+        return kwargs.pop('indent', None) or (2 if self._app.debug else None)
+
+    def dumps_bytes(self, obj, **kwargs):
+        indent = self._indent(kwargs)
+        if self.use_orjson:
+            return orjson.dumps(obj, default=native_default,
+                                option=self._options | (orjson.OPT_INDENT_2 if indent else 0))
+        return self.dumps(obj, indent=indent).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        indent = self._indent(kwargs)
+        if self.use_orjson:
+            return self.dumps_bytes(obj, indent=indent).decode('utf-8')
+        return json.dumps(obj, default=python_default, sort_keys=True, ensure_ascii=False,
+                          indent=indent, separators=(',', ': ') if indent else (',', ':'))
+
+    def loads(self, s, **kwargs):
+        if self.use_orjson:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = self.dumps_bytes(obj)
+        if self._app.debug:
+            body += b'\n'
+        return self._app.response_class(body, mimetype=self.mimetype)
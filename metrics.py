@@ -0,0 +1,266 @@
+# Métricas en formato de texto de Prometheus, sumadas entre los workers de gunicorn
+#
+# Cada worker acumula contadores e histogramas en memoria (un lock y unas
+# sumas por observación) y cada `flush_interval` segundos escribe una foto
+# en `directory/metrics-<pid>.json`. /metrics suma las fotos de todos los
+# workers, así no importa a cuál llegue la petición. La foto de un worker
+# que ya no existe se suma a `metrics-retired.json` y se borra: los totales
+# no bajan cuando gunicorn recicla workers (una baja sería para Prometheus
+# un reinicio del contador). Sólo gunicorn.conf.py vacía el directorio, al
+# arrancar el maestro.
+import bisect
+import fcntl
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger('paso.metrics')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Totales acumulados de los workers que ya terminaron
+RETIRED_FILE = 'metrics-retired.json'
+
+# Segundos: de una consulta por índice (~1 ms) a un bcrypt lento (~1 s) o una descarga completa
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Existe, pero es de otro usuario
+        return True
+    return True
+
+
+def clear_directory(directory):
+    """Borra las fotos de los workers; se llama antes de arrancarlos."""
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')) + glob.glob(os.path.join(directory, '.metrics-*')):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, registry, name, help, labelnames):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._registry = registry
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._registry.lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _snapshot(self):
+        return {json.dumps(labels): value for labels, value in self._values.items()}
+
+    @staticmethod
+    def _merge(total, value):
+        return (total or 0) + value
+
+    def _render(self, samples):
+        for key, value in samples.items():
+            yield f'{self.name}{_labels(self.labelnames, json.loads(key))} {_number(value)}'
+
+
+class Histogram:
+    """Cuenta por cubeta (no acumulada en memoria), suma y total por combinación de etiquetas."""
+
+    type = 'histogram'
+
+    def __init__(self, registry, name, help, labelnames, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._registry = registry
+        self._values = {}
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._registry.lock:
+            state = self._values.get(labels)
+            if state is None:
+                # Una cubeta por límite más +Inf, luego suma y total
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def _snapshot(self):
+        return {json.dumps(labels): list(state) for labels, state in self._values.items()}
+
+    def _merge(self, total, value):
+        if total is None:
+            return list(value)
+        if len(total) != len(value):
+            # Un worker con otras cubetas (versión anterior): se ignora
+            return total
+        return [a + b for a, b in zip(total, value)]
+
+    def _render(self, samples):
+        for key, state in samples.items():
+            labels = json.loads(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state):
+                cumulative += count
+                le = 'le="%s"' % _number(bound)
+                yield f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(state[-2])}'
+            yield f'{self.name}_count{_labels(self.labelnames, labels)} {state[-1]}'
+
+
+class MetricsRegistry:
+    """Registro de métricas del worker; con `directory` se agregan las de todos los workers."""
+
+    def __init__(self, directory=None, flush_interval=5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self._metrics = {}
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(self, name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, help, labelnames, buckets))
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f'Métrica duplicada: {metric.name}')
+        self._metrics[metric.name] = metric
+        return metric
+
+    def start(self):
+        """Hilo que publica la foto del worker; se llama en cada worker (tras el fork)."""
+        if not self.directory or self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Proceso hijo de un worker precargado: sus números son del padre
+                with self.lock:
+                    for metric in self._metrics.values():
+                        metric._values.clear()
+            self._pid = os.getpid()
+            os.makedirs(self.directory, exist_ok=True)
+            threading.Thread(target=self._flush_forever, name='metrics-flush', daemon=True).start()
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError:
+                logger.exception('No se pudieron publicar las métricas del worker')
+
+    def snapshot(self):
+        with self.lock:
+            return {name: metric._snapshot() for name, metric in self._metrics.items()}
+
+    def flush(self):
+        self._write(os.path.join(self.directory, f'metrics-{os.getpid()}.json'), self.snapshot())
+
+    def _write(self, path, data):
+        fd, temporary = tempfile.mkstemp(dir=self.directory, prefix='.metrics-')
+        try:
+            with os.fdopen(fd, 'w') as out:
+                json.dump(data, out)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as source:
+                return json.load(source)
+        except (OSError, ValueError):
+            # Archivo a medio reemplazar o ilegible: se toma en la siguiente lectura
+            return None
+
+    def _merge(self, snapshots):
+        totals = {name: {} for name in self._metrics}
+        for snapshot in snapshots:
+            for name, samples in snapshot.items():
+                metric = self._metrics.get(name)
+                if metric is None:
+                    continue
+                merged = totals[name]
+                for key, value in samples.items():
+                    merged[key] = metric._merge(merged.get(key), value)
+        return totals
+
+    def _retire(self, paths):
+        """Suma las fotos de workers terminados a la de retirados y las borra."""
+        retired_path = os.path.join(self.directory, RETIRED_FILE)
+        snapshots = [self._read(path) for path in paths]
+        self._write(retired_path, self._merge([self._read(retired_path) or {}] + [s for s in snapshots if s]))
+        for path in paths:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def collect(self):
+        """Muestras de todos los workers (vivos y retirados) sumadas: {métrica: {etiquetas: valor}}."""
+        if not self.directory:
+            return self.snapshot()
+        own = os.path.join(self.directory, f'metrics-{os.getpid()}.json')
+        # Un solo lector a la vez: otro worker podría estar retirando las fotos que se leen
+        with open(os.path.join(self.directory, 'metrics.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            paths = [path for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')) if path != own]
+            dead = []
+            for path in paths:
+                pid = os.path.basename(path)[len('metrics-'):-len('.json')]
+                if pid.isdigit() and not _alive(int(pid)):
+                    dead.append(path)
+            if dead:
+                self._retire(dead)
+                paths = [path for path in paths if path not in dead]
+                paths.append(os.path.join(self.directory, RETIRED_FILE))
+            snapshots = [self.snapshot()] + [snapshot for snapshot in map(self._read, sorted(set(paths))) if snapshot]
+        return self._merge(snapshots)
+
+    def render(self):
+        lines = []
+        for name, samples in self.collect().items():
+            metric = self._metrics[name]
+            lines.append(f'# HELP {name} {metric.help}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            lines.extend(metric._render(samples))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,441 @@
+# Migraciones versionadas del esquema de paso_db (MySQL y SQLite)
+#
+# Cada migración tiene un número, una descripción y los pasos de cada
+# dialecto: sentencias SQL o funciones step(cursor, dialect). Las aplicadas
+# quedan en schema_migrations; `flask migrate` (o el backend SQLite al
+# abrir la base) aplica las que falten, en orden.
+
+SCHEMA_MIGRATIONS = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        descripcion VARCHAR(255) NOT NULL,
+        aplicada_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+# Nombre del candado de MySQL para que dos procesos no migren a la vez
+MYSQL_LOCK = 'paso_db_migrations'
+
+MYSQL_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS usuarios (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        usuario VARCHAR(100) NOT NULL,
+        correo VARCHAR(150) NOT NULL UNIQUE,
+        contraseña VARCHAR(255) NOT NULL,
+        apaterno VARCHAR(100),
+        amaterno VARCHAR(100),
+        fecha_nacimiento DATE,
+        edad INT,
+        sexo VARCHAR(20)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS profiles (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT NOT NULL UNIQUE,
+        username VARCHAR(100),
+        bio TEXT,
+        travels INT NOT NULL DEFAULT 0,
+        orders INT NOT NULL DEFAULT 0,
+        rating DECIMAL(3,2) NOT NULL DEFAULT 0,
+        rating_count INT NOT NULL DEFAULT 0,
+        image_url VARCHAR(255),
+        FOREIGN KEY (user_id) REFERENCES usuarios(id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS viajes (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        usuario_id INT NOT NULL,
+        departure_city VARCHAR(100) NOT NULL,
+        destination VARCHAR(100) NOT NULL,
+        arrival_date DATE NOT NULL,
+        return_date DATE,
+        cold_containers INT NOT NULL DEFAULT 0,
+        hot_containers INT NOT NULL DEFAULT 0,
+        comments TEXT,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS tiendas (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        nombre VARCHAR(150) NOT NULL,
+        direccion VARCHAR(255),
+        estado VARCHAR(100),
+        ciudad VARCHAR(100),
+        horarios VARCHAR(255),
+        telefono VARCHAR(30),
+        email VARCHAR(150),
+        logo_url VARCHAR(255),
+        promedio_calificacion DECIMAL(3,2) NOT NULL DEFAULT 0
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS productos (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        tienda_id INT NOT NULL,
+        nombre VARCHAR(150) NOT NULL,
+        descripcion TEXT,
+        cantidad INT,
+        unidad_medida VARCHAR(50),
+        precio_tienda DECIMAL(10,2),
+        precio_publico DECIMAL(10,2),
+        imagen VARCHAR(255),
+        fecha_creacion DATETIME,
+        FOREIGN KEY (tienda_id) REFERENCES tiendas(id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS tarjetas (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        usuario_id INT NOT NULL,
+        nombre_en_tarjeta VARCHAR(150) NOT NULL,
+        numero_enmascarado VARCHAR(30) NOT NULL,
+        fecha_expiracion VARCHAR(10) NOT NULL,
+        tipo_tarjeta VARCHAR(30),
+        estado VARCHAR(20) NOT NULL DEFAULT 'activo',
+        FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS pedidos (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        usuario_id INT NOT NULL,
+        tienda_id INT,
+        viaje_id INT NOT NULL,
+        tarjeta_id INT,
+        detalles TEXT,
+        total DECIMAL(10,2),
+        estado VARCHAR(20) NOT NULL DEFAULT 'Pendiente',
+        notification VARCHAR(20) NOT NULL DEFAULT 'activa',
+        entregado TINYINT(1) NOT NULL DEFAULT 0,
+        fecha_pedido TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios(id),
+        FOREIGN KEY (tienda_id) REFERENCES tiendas(id),
+        FOREIGN KEY (viaje_id) REFERENCES viajes(id),
+        FOREIGN KEY (tarjeta_id) REFERENCES tarjetas(id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """
+]
+
+SQLITE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS usuarios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario VARCHAR(100) NOT NULL,
+        correo VARCHAR(150) NOT NULL UNIQUE,
+        contraseña VARCHAR(255) NOT NULL,
+        apaterno VARCHAR(100),
+        amaterno VARCHAR(100),
+        fecha_nacimiento DATE,
+        edad INTEGER,
+        sexo VARCHAR(20)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS profiles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL UNIQUE REFERENCES usuarios(id),
+        username VARCHAR(100),
+        bio TEXT,
+        travels INTEGER NOT NULL DEFAULT 0,
+        orders INTEGER NOT NULL DEFAULT 0,
+        rating DECIMAL(3,2) NOT NULL DEFAULT 0,
+        rating_count INTEGER NOT NULL DEFAULT 0,
+        image_url VARCHAR(255)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS viajes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL REFERENCES usuarios(id),
+        departure_city VARCHAR(100) NOT NULL,
+        destination VARCHAR(100) NOT NULL,
+        arrival_date DATE NOT NULL,
+        return_date DATE,
+        cold_containers INTEGER NOT NULL DEFAULT 0,
+        hot_containers INTEGER NOT NULL DEFAULT 0,
+        comments TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS tiendas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre VARCHAR(150) NOT NULL,
+        direccion VARCHAR(255),
+        estado VARCHAR(100),
+        ciudad VARCHAR(100),
+        horarios VARCHAR(255),
+        telefono VARCHAR(30),
+        email VARCHAR(150),
+        logo_url VARCHAR(255),
+        promedio_calificacion DECIMAL(3,2) NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS productos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tienda_id INTEGER NOT NULL REFERENCES tiendas(id),
+        nombre VARCHAR(150) NOT NULL,
+        descripcion TEXT,
+        cantidad INTEGER,
+        unidad_medida VARCHAR(50),
+        precio_tienda DECIMAL(10,2),
+        precio_publico DECIMAL(10,2),
+        imagen VARCHAR(255),
+        fecha_creacion DATETIME
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS tarjetas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL REFERENCES usuarios(id),
+        nombre_en_tarjeta VARCHAR(150) NOT NULL,
+        numero_enmascarado VARCHAR(30) NOT NULL,
+        fecha_expiracion VARCHAR(10) NOT NULL,
+        tipo_tarjeta VARCHAR(30),
+        estado VARCHAR(20) NOT NULL DEFAULT 'activo'
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS pedidos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL REFERENCES usuarios(id),
+        tienda_id INTEGER REFERENCES tiendas(id),
+        viaje_id INTEGER NOT NULL REFERENCES viajes(id),
+        tarjeta_id INTEGER REFERENCES tarjetas(id),
+        detalles TEXT,
+        total DECIMAL(10,2),
+        estado VARCHAR(20) NOT NULL DEFAULT 'Pendiente',
+        notification VARCHAR(20) NOT NULL DEFAULT 'activa',
+        entregado INTEGER NOT NULL DEFAULT 0,
+        fecha_pedido TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """
+]
+
+
+def _column_exists(cursor, dialect, table, column):
+    if dialect == 'mysql':
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        """, (table, column))
+        return cursor.fetchall()[0][0] > 0
+    cursor.execute(f"PRAGMA table_info({table})")
+    return any(row[1] == column for row in cursor.fetchall())
+
+
+def _index_exists(cursor, dialect, table, name):
+    if dialect == 'mysql':
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        """, (table, name))
+        return cursor.fetchall()[0][0] > 0
+    cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' AND name = %s", (name,))
+    return cursor.fetchall()[0][0] > 0
+
+
+def add_column(table, column, definition):
+    """Paso que añade una columna si todavía no existe (bases creadas a mano)."""
+    def step(cursor, dialect):
+        if not _column_exists(cursor, dialect, table, column):
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return step
+
+
+def create_index(name, table, columns):
+    """Paso que crea un índice si todavía no existe (MySQL no admite IF NOT EXISTS)."""
+    def step(cursor, dialect):
+        if not _index_exists(cursor, dialect, table, name):
+            cursor.execute(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})")
+    return step
+
+
+# Contadores desnormalizados de viajes y pedidos que muestra /profile
+PROFILE_COUNTERS = [
+    add_column('profiles', 'travel_count', 'INT NOT NULL DEFAULT 0'),
+    add_column('profiles', 'order_count', 'INT NOT NULL DEFAULT 0'),
+    # Carga inicial; después se mantiene con `flask reconcile-counters`
+    """
+    UPDATE profiles
+    SET travel_count = (SELECT COUNT(*) FROM viajes v WHERE v.usuario_id = profiles.user_id),
+        order_count = (SELECT COUNT(*) FROM pedidos p WHERE p.usuario_id = profiles.user_id)
+    """
+]
+
+# Índices de las consultas frecuentes de app.py (ver `flask check-plans`)
+INDEXES = [
+    # Pedidos de los viajes de un conductor y pedidos de un comprador, por estado
+    ('idx_pedidos_viaje_estado', 'pedidos', ('viaje_id', 'estado', 'notification', 'entregado')),
+    ('idx_pedidos_usuario_estado', 'pedidos', ('usuario_id', 'estado', 'notification', 'entregado')),
+    ('idx_pedidos_tarjeta_estado', 'pedidos', ('tarjeta_id', 'estado')),
+    # Viajes de un usuario y filtros de /viajes (ordenados por fecha de llegada)
+    ('idx_viajes_usuario', 'viajes', ('usuario_id', 'arrival_date')),
+    ('idx_viajes_destino_llegada', 'viajes', ('destination', 'arrival_date')),
+    ('idx_viajes_llegada', 'viajes', ('arrival_date',)),
+    # Filtros de /get-tiendas
+    ('idx_tiendas_ciudad_calificacion', 'tiendas', ('ciudad', 'promedio_calificacion')),
+    ('idx_tiendas_calificacion', 'tiendas', ('promedio_calificacion',)),
+    ('idx_productos_tienda', 'productos', ('tienda_id',)),
+    ('idx_tarjetas_usuario_estado', 'tarjetas', ('usuario_id', 'estado'))
+]
+
+QUERY_INDEXES = [create_index(*index) for index in INDEXES]
+
+# Bandeja de salida de notificaciones de pedidos (la drena outbox.OrderEventDispatcher)
+ORDER_EVENTS_INDEX = create_index('idx_pedido_eventos_pendientes', 'pedido_eventos', ('despachado_en', 'disponible_en'))
+ORDER_EVENTS = {
+    'mysql': [
+        """
+        CREATE TABLE IF NOT EXISTS pedido_eventos (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            pedido_id INT NOT NULL,
+            evento VARCHAR(20) NOT NULL,
+            datos TEXT NOT NULL,
+            destinatarios VARCHAR(255) NOT NULL,
+            creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            intentos INT NOT NULL DEFAULT 0,
+            disponible_en DATETIME(6) NOT NULL,
+            reclamado_por VARCHAR(32),
+            reclamado_hasta DATETIME(6),
+            despachado_en DATETIME(6),
+            error VARCHAR(255)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """,
+        ORDER_EVENTS_INDEX
+    ],
+    'sqlite': [
+        """
+        CREATE TABLE IF NOT EXISTS pedido_eventos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pedido_id INTEGER NOT NULL,
+            evento VARCHAR(20) NOT NULL,
+            datos TEXT NOT NULL,
+            destinatarios VARCHAR(255) NOT NULL,
+            creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            intentos INTEGER NOT NULL DEFAULT 0,
+            disponible_en DATETIME NOT NULL,
+            reclamado_por VARCHAR(32),
+            reclamado_hasta DATETIME,
+            despachado_en DATETIME,
+            error VARCHAR(255)
+        )
+        """,
+        ORDER_EVENTS_INDEX
+    ]
+}
+
+# Calificaciones de conductores, una por viaje y calificador; `aplicada` indica
+# si ya se sumó al promedio de profiles (ver `flask recompute-ratings`)
+RATINGS = {
+    'mysql': [
+        """
+        CREATE TABLE IF NOT EXISTS calificaciones (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            viaje_id INT NOT NULL,
+            calificador_id INT NOT NULL,
+            conductor_id INT NOT NULL,
+            calificacion TINYINT NOT NULL,
+            aplicada TINYINT(1) NOT NULL DEFAULT 0,
+            creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY uq_calificaciones_viaje_calificador (viaje_id, calificador_id),
+            FOREIGN KEY (viaje_id) REFERENCES viajes(id),
+            FOREIGN KEY (calificador_id) REFERENCES usuarios(id),
+            FOREIGN KEY (conductor_id) REFERENCES usuarios(id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """,
+        create_index('idx_calificaciones_aplicada', 'calificaciones', ('aplicada',))
+    ],
+    'sqlite': [
+        """
+        CREATE TABLE IF NOT EXISTS calificaciones (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            viaje_id INTEGER NOT NULL REFERENCES viajes(id),
+            calificador_id INTEGER NOT NULL REFERENCES usuarios(id),
+            conductor_id INTEGER NOT NULL REFERENCES usuarios(id),
+            calificacion INTEGER NOT NULL,
+            aplicada INTEGER NOT NULL DEFAULT 0,
+            creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (viaje_id, calificador_id)
+        )
+        """,
+        create_index('idx_calificaciones_aplicada', 'calificaciones', ('aplicada',))
+    ]
+}
+
+MIGRATIONS = [
+    (1, 'Esquema inicial', {'mysql': MYSQL_SCHEMA, 'sqlite': SQLITE_SCHEMA}),
+    (2, 'Contadores de viajes y pedidos en profiles', {'mysql': PROFILE_COUNTERS, 'sqlite': PROFILE_COUNTERS}),
+    (3, 'Índices de las consultas frecuentes', {'mysql': QUERY_INDEXES, 'sqlite': QUERY_INDEXES}),
+    (4, 'Bandeja de salida de eventos de pedidos', ORDER_EVENTS),
+    (5, 'Calificaciones de conductores por viaje', RATINGS)
+]
+
+
+def applied_versions(cursor):
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def pending(connection):
+    """Migraciones que faltan por aplicar: [(versión, descripción)]."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(SCHEMA_MIGRATIONS)
+        applied = applied_versions(cursor)
+        connection.commit()
+    finally:
+        cursor.close()
+    return [(version, description) for version, description, _ in MIGRATIONS if version not in applied]
+
+
+def migrate(connection, dialect):
+    """Aplica en orden las migraciones pendientes y devuelve sus versiones.
+
+    En SQLite todo corre en una sola transacción; en MySQL (donde el DDL
+    confirma solo) cada migración se registra al terminar y un candado con
+    nombre evita que dos procesos migren a la vez.
+    """
+    cursor = connection.cursor()
+    try:
+        if dialect == 'mysql':
+            cursor.execute("SELECT GET_LOCK(%s, 60)", (MYSQL_LOCK,))
+            if cursor.fetchall()[0][0] != 1:
+                raise RuntimeError('Otro proceso está aplicando las migraciones.')
+        else:
+            cursor.execute("BEGIN IMMEDIATE")
+
+        try:
+            cursor.execute(SCHEMA_MIGRATIONS)
+            applied = applied_versions(cursor)
+            done = []
+            for version, description, steps in MIGRATIONS:
+                if version in applied:
+                    continue
+                for step in steps[dialect]:
+                    if callable(step):
+                        step(cursor, dialect)
+                    else:
+                        cursor.execute(step)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, descripcion) VALUES (%s, %s)",
+                    (version, description)
+                )
+                if dialect == 'mysql':
+                    connection.commit()
+                done.append(version)
+            connection.commit()
+            return done
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            if dialect == 'mysql':
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (MYSQL_LOCK,))
+                cursor.fetchall()
+    finally:
+        cursor.close()
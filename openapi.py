@@ -0,0 +1,90 @@
+# Especificación Swagger generada una sola vez a partir de las rutas registradas
+import gzip
+import hashlib
+import re
+
+from flask import Response
+
+_PATH_PARAM = re.compile(r'<(?:(\w+):)?(\w+)>')
+_PARAM_TYPES = {'int': 'integer', 'float': 'number'}
+
+
+def api_doc(summary, description, status='200', response=''):
+    """Documenta una ruta; build_spec() toma estos datos de la función registrada."""
+    def decorator(f):
+        f.api_doc = {
+            'summary': summary,
+            'description': description,
+            'responses': {status: {'description': response or summary}}
+        }
+        return f
+    return decorator
+
+
+def build_spec(app, title='API Paso', version='1.0', exclude=()):
+    paths = {}
+    for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+        # Archivos estáticos y blueprints (Swagger UI) no forman parte de la API
+        if rule.endpoint == 'static' or '.' in rule.endpoint or rule.endpoint in exclude:
+            continue
+        view = app.view_functions[rule.endpoint]
+        doc = getattr(view, 'api_doc', None) or {
+            'summary': rule.endpoint,
+            'description': '',
+            'responses': {'200': {'description': 'OK'}}
+        }
+
+        path = _PATH_PARAM.sub(r'{\2}', rule.rule)
+        parameters = [
+            {
+                'name': name,
+                'in': 'path',
+                'required': True,
+                'type': _PARAM_TYPES.get(converter, 'string')
+            }
+            for converter, name in _PATH_PARAM.findall(rule.rule)
+        ]
+
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+            operation = dict(doc)
+            if parameters:
+                operation['parameters'] = parameters
+            if getattr(view, 'requires_token', False):
+                operation['security'] = [{'Bearer': []}]
+            paths.setdefault(path, {})[method.lower()] = operation
+
+    return {
+        'swagger': '2.0',
+        'info': {'version': version, 'title': title},
+        'securityDefinitions': {
+            'Bearer': {'type': 'apiKey', 'name': 'Authorization', 'in': 'header'}
+        },
+        'paths': paths
+    }
+
+
+class SpecCache:
+    """Cuerpo de la especificación ya serializado (y comprimido) con su ETag."""
+
+    def __init__(self, body):
+        self.body = body.encode('utf-8') if isinstance(body, str) else body
+        self.gzipped = gzip.compress(self.body, compresslevel=9, mtime=0)
+        digest = hashlib.sha256(self.body).hexdigest()[:32]
+        self.etag = digest
+        self.gzip_etag = digest + '-gz'
+
+    def response(self, request):
+        use_gzip = request.accept_encodings['gzip'] > 0
+        etag = self.gzip_etag if use_gzip else self.etag
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(self.gzipped if use_gzip else self.body, mimetype='application/json')
+            if use_gzip:
+                response.headers['Content-Encoding'] = 'gzip'
+
+        response.set_etag(etag)
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = 'public, max-age=300'
+        return response
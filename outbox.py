@@ -0,0 +1,213 @@
+# Bandeja de salida (outbox) de las notificaciones de pedidos
+#
+# Las rutas escriben el evento en pedido_eventos dentro de la misma
+# transacción que el cambio del pedido; un hilo de fondo lo entrega por
+# Socket.IO. Así la latencia de la petición no depende del envío y un
+# evento confirmado no se pierde aunque el worker muera antes de emitirlo.
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+logger = logging.getLogger('paso.outbox')
+
+INSERT_EVENT = """
+    INSERT INTO pedido_eventos (pedido_id, evento, datos, destinatarios, disponible_en)
+    VALUES (%s, %s, %s, %s, %s)
+"""
+
+PENDING_EVENTS = """
+    SELECT id
+    FROM pedido_eventos
+    WHERE despachado_en IS NULL AND disponible_en <= %s
+      AND (reclamado_hasta IS NULL OR reclamado_hasta < %s)
+    ORDER BY disponible_en
+    LIMIT %s
+"""
+
+CLAIM_EVENTS = """
+    UPDATE pedido_eventos
+    SET reclamado_por = %s, reclamado_hasta = %s
+    WHERE id IN ({}) AND despachado_en IS NULL
+      AND (reclamado_hasta IS NULL OR reclamado_hasta < %s)
+"""
+
+CLAIMED_EVENTS = """
+    SELECT id, pedido_id, evento, datos, destinatarios, intentos
+    FROM pedido_eventos
+    WHERE id IN ({}) AND reclamado_por = %s
+    ORDER BY id
+"""
+
+MARK_DISPATCHED = "UPDATE pedido_eventos SET despachado_en = %s WHERE id IN ({})"
+
+MARK_FAILED = """
+    UPDATE pedido_eventos
+    SET intentos = intentos + 1, disponible_en = %s, despachado_en = %s, error = %s,
+        reclamado_por = NULL, reclamado_hasta = NULL
+    WHERE id = %s
+"""
+
+PURGE_DISPATCHED = "DELETE FROM pedido_eventos WHERE despachado_en IS NOT NULL AND despachado_en < %s"
+
+
+def record_event(cursor, order_id, event, payload, recipients):
+    """Guarda el evento con el cursor de la transacción que modifica el pedido."""
+    recipients = sorted({int(user_id) for user_id in recipients if user_id is not None})
+    cursor.execute(INSERT_EVENT, (
+        order_id,
+        event,
+        json.dumps(payload, ensure_ascii=False),
+        ','.join(map(str, recipients)),
+        datetime.now()
+    ))
+
+
+class OrderEventDispatcher:
+    """Drena pedido_eventos por lotes y entrega cada evento con `emit(destinatarios, datos)`.
+
+    Despierta con `wake()` (tras un commit en este worker) o cada
+    `poll_interval` segundos (eventos de otros workers o reintentos), y
+    espera `coalesce_window` antes de leer para juntar ráfagas: de varios
+    cambios de estado del mismo pedido en un lote sólo se envía el último.
+    Los eventos se reclaman con un plazo (`lease`), de modo que varios
+    workers pueden drenar a la vez y lo reclamado por un worker caído se
+    vuelve a entregar. Un envío fallido se reintenta con espera creciente
+    hasta `max_attempts` veces.
+    """
+
+    def __init__(self, pool, emit, batch_size=100, poll_interval=1.0, coalesce_window=0.05,
+                 lease=30, max_attempts=5, retention=86400):
+        self._pool = pool
+        self._emit = emit
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.coalesce_window = coalesce_window
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retention = retention
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._started = False
+        self._next_purge = 0.0
+        self._stats = {'batches': 0, 'dispatched': 0, 'coalesced': 0, 'retries': 0, 'failed': 0,
+                       'errors': 0, 'emit_time_total': 0.0}
+
+    def start(self, start_background_task):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        start_background_task(self.run)
+
+    def wake(self):
+        self._wake.set()
+
+    def run(self):
+        while True:
+            if self._wake.wait(self.poll_interval):
+                self._wake.clear()
+                time.sleep(self.coalesce_window)
+            try:
+                while self.drain_once() == self.batch_size:
+                    pass
+                if time.monotonic() >= self._next_purge:
+                    self.purge()
+                    self._next_purge = time.monotonic() + 3600
+            except Exception:
+                # La base no responde: se reintenta en la siguiente vuelta
+                with self._lock:
+                    self._stats['errors'] += 1
+                logger.exception('Error al despachar eventos de pedidos')
+
+    def drain_once(self):
+        """Reclama, entrega y marca un lote; devuelve cuántos eventos había pendientes."""
+        now = datetime.now()
+        token = uuid.uuid4().hex
+        connection = self._pool.get_connection()
+        try:
+            cursor = connection.cursor(dictionary=True)
+            try:
+                cursor.execute(PENDING_EVENTS, (now, now, self.batch_size))
+                ids = [row['id'] for row in cursor.fetchall()]
+                if not ids:
+                    connection.commit()
+                    return 0
+
+                placeholders = ', '.join(['%s'] * len(ids))
+                cursor.execute(CLAIM_EVENTS.format(placeholders), [token, now + timedelta(seconds=self.lease), *ids, now])
+                connection.commit()
+                cursor.execute(CLAIMED_EVENTS.format(placeholders), [*ids, token])
+                events = cursor.fetchall()
+
+                delivered, failed = self._deliver(events)
+
+                finished = datetime.now()
+                if delivered:
+                    cursor.execute(MARK_DISPATCHED.format(', '.join(['%s'] * len(delivered))), [finished, *delivered])
+                for event, error in failed:
+                    attempts = event['intentos'] + 1
+                    gave_up = attempts >= self.max_attempts
+                    retry_at = finished + timedelta(seconds=min(2 ** attempts, 300))
+                    cursor.execute(MARK_FAILED, (retry_at, finished if gave_up else None, error[:255], event['id']))
+                    with self._lock:
+                        self._stats['failed' if gave_up else 'retries'] += 1
+                connection.commit()
+                return len(ids)
+            finally:
+                cursor.close()
+        finally:
+            connection.close()
+
+    def _deliver(self, events):
+        # Sólo el último cambio de estado de cada pedido dentro del lote
+        latest_state = {}
+        for event in events:
+            if event['evento'] == 'estado':
+                latest_state[event['pedido_id']] = event['id']
+
+        delivered = []
+        failed = []
+        coalesced = 0
+        start = time.perf_counter()
+        for event in events:
+            if event['evento'] == 'estado' and latest_state[event['pedido_id']] != event['id']:
+                delivered.append(event['id'])
+                coalesced += 1
+                continue
+            recipients = [int(user_id) for user_id in event['destinatarios'].split(',') if user_id]
+            try:
+                self._emit(recipients, json.loads(event['datos']))
+                delivered.append(event['id'])
+            except Exception as e:
+                failed.append((event, str(e) or e.__class__.__name__))
+
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['dispatched'] += len(delivered) - coalesced
+            self._stats['coalesced'] += coalesced
+            self._stats['emit_time_total'] += time.perf_counter() - start
+        return delivered, failed
+
+    def purge(self):
+        """Borra los eventos entregados hace más de `retention` segundos."""
+        connection = self._pool.get_connection()
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(PURGE_DISPATCHED, (datetime.now() - timedelta(seconds=self.retention),))
+                connection.commit()
+                return cursor.rowcount
+            finally:
+                cursor.close()
+        finally:
+            connection.close()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+        data['running'] = self._started
+        data['emit_time_avg'] = data['emit_time_total'] / data['dispatched'] if data['dispatched'] else 0.0
+        return data
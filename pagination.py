@@ -0,0 +1,59 @@
+# Paginación por cursor (keyset) para los listados
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Encabezado con el token de la siguiente página (ausente en la última)
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+class InvalidPageRequest(ValueError):
+    pass
+
+
+def page_size(args):
+    value = args.get('limit')
+    if value is None or value == '':
+        return DEFAULT_PAGE_SIZE
+    try:
+        size = int(value)
+    except ValueError:
+        raise InvalidPageRequest('El parámetro limit debe ser un número entero.')
+    if size < 1:
+        raise InvalidPageRequest('El parámetro limit debe ser mayor que 0.')
+    return min(size, MAX_PAGE_SIZE)
+
+
+def encode_cursor(values):
+    # Las fechas y decimales viajan como texto ISO dentro del token
+    raw = json.dumps([v if isinstance(v, (int, float)) or v is None else str(v) for v in values],
+                     separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(args, length):
+    """Devuelve los valores de la clave del último registro visto, o None en la primera página."""
+    token = args.get('cursor')
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise InvalidPageRequest('Cursor inválido.')
+    if not isinstance(values, list) or len(values) != length:
+        raise InvalidPageRequest('Cursor inválido.')
+    # Sólo escalares, como los que produce encode_cursor: una lista u objeto llegaría al driver
+    if not all(value is None or isinstance(value, (str, int, float)) for value in values):
+        raise InvalidPageRequest('Cursor inválido.')
+    return values
+
+
+def split_page(rows, size, key):
+    """Separa la fila extra pedida a la base y calcula el cursor de la siguiente página."""
+    if len(rows) <= size:
+        return rows, None
+    rows = rows[:size]
+    return rows, encode_cursor(key(rows[-1]))
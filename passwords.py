@@ -0,0 +1,102 @@
+# Hash y verificación de contraseñas con bcrypt en un pool de hilos acotado
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import bcrypt
+
+
+class PasswordHasherBusy(Exception):
+    """El pool de bcrypt está saturado; la petición debe responder 503."""
+
+
+class PasswordHasher:
+    """Ejecuta bcrypt fuera del hilo de la petición, con una cola acotada.
+
+    Como máximo `workers` hashes corren a la vez y `queue_limit` esperan; si
+    no hay lugar la llamada falla al instante con PasswordHasherBusy en vez
+    de bloquear al worker. `rounds` es el costo para hashes nuevos. Los
+    `listeners` reciben `(tipo, segundos en cola, segundos de bcrypt)`.
+    """
+
+    def __init__(self, workers=2, queue_limit=16, rounds=12, timeout=10):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.rounds = rounds
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.listeners = []
+        self._stats = {'hashes': 0, 'checks': 0, 'rejected': 0, 'timeouts': 0,
+                       'queue_time_total': 0.0, 'run_time_total': 0.0}
+
+    def _run(self, kind, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise PasswordHasherBusy('Demasiadas solicitudes de autenticación en curso.')
+
+        submitted = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                run_time = time.perf_counter() - started
+                with self._lock:
+                    self._stats[kind] += 1
+                    self._stats['queue_time_total'] += started - submitted
+                    self._stats['run_time_total'] += run_time
+                for listener in self.listeners:
+                    listener(kind, started - submitted, run_time)
+
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self._executor.submit(task)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise PasswordHasherBusy('La verificación de la contraseña tardó demasiado.')
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def hash(self, password):
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        hashed = self._run('hashes', bcrypt.hashpw, password.encode('utf-8'), salt)
+        return hashed.decode('utf-8')
+
+    def check(self, password, hashed):
+        return self._run('checks', bcrypt.checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    def needs_rehash(self, hashed):
+        # Formato $2b$<costo>$<salt+hash>; sólo se sube el costo, bajar BCRYPT_ROUNDS no debilita hashes
+        try:
+            return int(hashed.split('$')[2]) < self.rounds
+        except (IndexError, ValueError):
+            return False
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data['pending'] = self._pending
+        data['workers'] = self.workers
+        data['queue_limit'] = self.queue_limit
+        data['rounds'] = self.rounds
+        done = data['hashes'] + data['checks']
+        data['run_time_avg'] = data['run_time_total'] / done if done else 0.0
+        data['queue_time_avg'] = data['queue_time_total'] / done if done else 0.0
+        return data
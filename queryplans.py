@@ -0,0 +1,73 @@
+# Verificación de planes de ejecución: ninguna consulta de app.py debe recorrer una tabla completa
+import ast
+import re
+
+# Marca para las consultas que recorren la tabla a propósito (cargas completas, reparaciones)
+FULL_SCAN_OK = '/* full-scan */'
+
+_STATEMENT = re.compile(r'^\s*(SELECT\s.+\sFROM\s|UPDATE\s.+\sSET\s|DELETE\s+FROM\s)', re.IGNORECASE | re.DOTALL)
+_LIMIT_PARAM = re.compile(r'\bLIMIT\s*$', re.IGNORECASE)
+
+# Filas estimadas a partir de las cuales se reporta un recorrido que el optimizador eligió
+# pudiendo usar un índice: con tablas pequeñas o vacías (una base recién migrada) MySQL
+# prefiere recorrerlas, y eso no dice nada del plan con datos reales
+FULL_INDEX_SCAN_ROWS = 1000
+
+
+def source_queries(path):
+    """Consultas literales (SELECT/UPDATE/DELETE) de un archivo de Python.
+
+    Las plantillas con `{}` (listas IN armadas con format) se toman con un
+    solo placeholder. Las consultas armadas con f-strings no aparecen aquí:
+    quien las construye debe aportar ejemplos aparte.
+    """
+    with open(path, encoding='utf-8') as source:
+        tree = ast.parse(source.read(), path)
+
+    # Los fragmentos literales de un f-string no son consultas completas
+    fragments = {id(part) for node in ast.walk(tree) if isinstance(node, ast.JoinedStr) for part in node.values}
+
+    queries = []
+    for node in ast.walk(tree):
+        if id(node) in fragments:
+            continue
+        if isinstance(node, ast.Constant) and isinstance(node.value, str) and _STATEMENT.match(node.value):
+            queries.append((node.lineno, node.value.replace('{}', '%s').strip().rstrip(';')))
+    return [query for _, query in sorted(queries)]
+
+
+def sample_params(query):
+    """Parámetros de ejemplo para un EXPLAIN: 10 tras un LIMIT, '1' en el resto."""
+    params = []
+    for match in re.finditer(r'%s', query):
+        params.append(10 if _LIMIT_PARAM.search(query[:match.start()]) else '1')
+    return params
+
+
+def full_scans(dialect, plan):
+    """Pasos del plan que leen una tabla (o un índice) completa."""
+    scans = []
+    for row in plan:
+        if dialect == 'mysql':
+            # ALL lee la tabla e index el índice completo. Sin índices posibles es un
+            # índice faltante; con ellos, sólo cuenta si el optimizador estima muchas filas
+            many_rows = int(row.get('rows') or 0) >= FULL_INDEX_SCAN_ROWS
+            if (row.get('type') == 'ALL' and (not row.get('possible_keys') or many_rows)) or (
+                    row.get('type') == 'index' and (row.get('key') is None or many_rows)):
+                scans.append(f"{row.get('table')}: type {row.get('type')}, key {row.get('key')}, "
+                             f"{row.get('rows')} filas estimadas")
+        else:
+            detail = row['detail']
+            if re.match(r'SCAN (TABLE )?\w+', detail) and ' USING ' not in detail and 'CONSTANT ROW' not in detail:
+                scans.append(detail)
+    return scans
+
+
+def check_query_plans(backend, connection, queries):
+    """EXPLAIN de cada (consulta, parámetros); devuelve [(consulta, plan, recorridos completos)]."""
+    results = []
+    for query, params in queries:
+        plan = backend.explain(connection, query, params)
+        scans = [] if FULL_SCAN_OK in query else full_scans(backend.name, plan)
+        results.append((query, plan, scans))
+    return results
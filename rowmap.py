@@ -0,0 +1,75 @@
+# Mapeo de filas: de las tuplas de un cursor normal al dict de la respuesta en un solo paso
+#
+# cursor(dictionary=True) arma un dict por fila y varios handlers lo copian
+# después a otro con la forma de la respuesta. Un RowMapper genera, una vez
+# por forma de resultado (nombres de columna), una función que construye
+# directamente el dict final con un literal: sin zip, sin dict intermedio.
+import threading
+
+
+class RowMapper:
+    """Convierte tuplas de un cursor en dicts con las columnas (o alias) como claves.
+
+    `nested` agrupa columnas en un objeto anidado: {'conductor': {'nombre':
+    'conductor_nombre'}}. `defaults` reemplaza valores vacíos (None, 0, '')
+    de una columna por un texto fijo. El resto de columnas se copia con su
+    nombre. La función se compila la primera vez que se ve cada lista de
+    columnas (p. ej. un SELECT * antes y después de una migración).
+    """
+
+    def __init__(self, nested=None, defaults=None):
+        self.nested = nested or {}
+        self.defaults = defaults or {}
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def compile(self, columns):
+        columns = tuple(columns)
+        mapper = self._compiled.get(columns)
+        if mapper is None:
+            with self._lock:
+                mapper = self._compiled.get(columns)
+                if mapper is None:
+                    mapper = self._compiled[columns] = self._build(columns)
+        return mapper
+
+    def _value(self, index, column, constants):
+        if column not in self.defaults:
+            return f'row[{index}]'
+        constants.append(self.defaults[column])
+        return f'(row[{index}] or _c[{len(constants) - 1}])'
+
+    def _build(self, columns):
+        positions = {column: index for index, column in enumerate(columns)}
+        grouped = {column for fields in self.nested.values() for column in fields.values()}
+        missing = grouped - positions.keys()
+        if missing:
+            raise KeyError(f'Columnas ausentes en el resultado: {", ".join(sorted(missing))}')
+
+        constants = []
+        items = []
+        for index, column in enumerate(columns):
+            if column not in grouped:
+                items.append(f'{column!r}: {self._value(index, column, constants)}')
+        for key, fields in self.nested.items():
+            inner = ', '.join(f'{field!r}: {self._value(positions[column], column, constants)}'
+                              for field, column in fields.items())
+            items.append(f'{key!r}: {{{inner}}}')
+
+        namespace = {'_c': tuple(constants)}
+        exec(f'def map_row(row):\n    return {{{", ".join(items)}}}\n', namespace)
+        return namespace['map_row']
+
+    def fetchone(self, cursor):
+        row = cursor.fetchone()
+        return None if row is None else self.compile(cursor.column_names)(row)
+
+    def fetchall(self, cursor):
+        return list(map(self.compile(cursor.column_names), cursor.fetchall()))
+
+    def fetchmany(self, cursor, size):
+        return list(map(self.compile(cursor.column_names), cursor.fetchmany(size)))
+
+
+# Copia cada columna con su nombre o alias, como cursor(dictionary=True)
+ROWS = RowMapper()
@@ -0,0 +1,218 @@
+# Índice invertido de n-gramas en memoria para buscar tiendas por nombre, ciudad y dirección
+import threading
+import time
+import unicodedata
+from decimal import Decimal
+
+# Campos indexados y su peso en el ranking
+FIELDS = (('nombre', 4), ('ciudad', 2), ('direccion', 1))
+
+# Los términos de 3 o más letras se buscan por trigramas (subcadena); los más
+# cortos sólo como inicio de palabra
+GRAM = 3
+
+
+def normalize(text):
+    """Minúsculas sin acentos y con cualquier signo convertido en espacio."""
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+    return ' '.join(''.join(ch if ch.isalnum() else ' ' for ch in stripped).split())
+
+
+def _grams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class StoreSearchIndex:
+    """Búsqueda por prefijo y subcadena, insensible a acentos, con ranking.
+
+    Se construye desde `loader` la primera vez que se usa y se reconstruye
+    cada `refresh_interval` segundos para recoger altas hechas por otros
+    workers; las altas de este worker se añaden al momento con `add()`.
+    """
+
+    def __init__(self, loader, refresh_interval=300):
+        self._loader = loader
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._docs = {}
+        self._postings = {}
+        self._by_city = {}
+        self._built_at = None
+        # Altas recibidas durante una reconstrucción: se aplican al índice nuevo
+        self._added_during_rebuild = None
+        self._stats = {'builds': 0, 'searches': 0, 'search_time_total': 0.0, 'search_time_max': 0.0}
+
+    def _ensure_fresh(self):
+        if self._built_at is not None and time.monotonic() - self._built_at < self.refresh_interval:
+            return
+        if self._built_at is None:
+            # Primera construcción: todos esperan a que termine
+            with self._rebuild_lock:
+                if self._built_at is None:
+                    self.rebuild()
+        elif self._rebuild_lock.acquire(blocking=False):
+            # Reconstrucción periódica en segundo plano: mientras tanto se usa el índice anterior
+            threading.Thread(target=self._background_rebuild, daemon=True).start()
+
+    def _background_rebuild(self):
+        try:
+            self.rebuild()
+        except Exception:
+            # Se reintentará en la siguiente búsqueda; el índice anterior sigue siendo válido
+            self.mark_stale()
+        finally:
+            self._rebuild_lock.release()
+
+    def rebuild(self):
+        docs = {}
+        postings = {}
+        by_city = {}
+        with self._lock:
+            self._added_during_rebuild = []
+        try:
+            for store in self._loader():
+                doc = self._make_doc(store)
+                docs[doc['id']] = doc
+                self._index_doc(postings, by_city, doc)
+        except BaseException:
+            with self._lock:
+                self._added_during_rebuild = None
+            raise
+        with self._lock:
+            # La carga pudo leer la tabla antes de estas altas
+            for doc in self._added_during_rebuild:
+                docs[doc['id']] = doc
+                self._index_doc(postings, by_city, doc)
+            self._added_during_rebuild = None
+            self._docs = docs
+            self._postings = postings
+            self._by_city = by_city
+            self._built_at = time.monotonic()
+            self._stats['builds'] += 1
+
+    def refresh(self):
+        """Reconstruye en el momento (tras una importación masiva); sin índice aún no hace nada."""
+        if self._built_at is None:
+            return
+        # Espera a una reconstrucción en curso: pudo leer la tabla antes de las altas
+        with self._rebuild_lock:
+            try:
+                self.rebuild()
+            except Exception:
+                # La siguiente búsqueda lo intentará en segundo plano
+                self.mark_stale()
+
+    def mark_stale(self):
+        with self._lock:
+            if self._built_at is not None:
+                self._built_at = time.monotonic() - self.refresh_interval
+
+    def add(self, store):
+        doc = self._make_doc(store)
+        with self._lock:
+            if self._added_during_rebuild is not None:
+                self._added_during_rebuild.append(doc)
+            # Si el índice aún no existe, la primera búsqueda ya cargará esta tienda
+            if self._built_at is None:
+                return
+            self._docs[doc['id']] = doc
+            self._index_doc(self._postings, self._by_city, doc)
+
+    @staticmethod
+    def _make_doc(store):
+        rating = store.get('promedio_calificacion')
+        return {
+            'id': store['id'],
+            'ciudad': normalize(store.get('ciudad')),
+            'rating': float(rating) if isinstance(rating, (int, float, Decimal)) else 0.0,
+            'fields': tuple((normalize(store.get(field)), weight) for field, weight in FIELDS)
+        }
+
+    @staticmethod
+    def _index_doc(postings, by_city, doc):
+        keys = set()
+        for text, _ in doc['fields']:
+            keys |= _grams(text, GRAM)
+            for word in text.split():
+                keys.update(word[:n] for n in range(1, GRAM))
+        for key in keys:
+            postings.setdefault(key, set()).add(doc['id'])
+        by_city.setdefault(doc['ciudad'], set()).add(doc['id'])
+
+    def _candidates(self, token):
+        key_grams = [token[:GRAM - 1]] if len(token) < GRAM else _grams(token, GRAM)
+        sets = [self._postings.get(gram) for gram in key_grams]
+        if any(s is None for s in sets):
+            return set()
+        sets.sort(key=len)
+        result = set(sets[0])
+        for other in sets[1:]:
+            result &= other
+            if not result:
+                break
+        return result
+
+    @staticmethod
+    def _score(doc, token):
+        best = 0
+        for text, weight in doc['fields']:
+            position = text.find(token)
+            if position < 0:
+                continue
+            if text == token:
+                score = 4
+            elif position == 0:
+                score = 3
+            elif text[position - 1] == ' ':
+                score = 2  # Prefijo de una palabra
+            else:
+                score = 1
+            best = max(best, score * weight)
+        return best
+
+    def search(self, query, city=None, min_rating=None):
+        """Devuelve los ids de las tiendas que contienen todos los términos, de mejor a peor."""
+        self._ensure_fresh()
+        start = time.perf_counter()
+        tokens = normalize(query).split()
+        city = normalize(city) if city else None
+
+        with self._lock:
+            candidates = set(self._by_city.get(city, ())) if city else None
+            for token in tokens:
+                ids = self._candidates(token)
+                candidates = ids if candidates is None else candidates & ids
+                if not candidates:
+                    break
+            candidates = candidates if candidates is not None else set(self._docs)
+
+            ranked = []
+            for doc_id in candidates:
+                doc = self._docs[doc_id]
+                if min_rating is not None and doc['rating'] < min_rating:
+                    continue
+                # Los n-gramas sólo preseleccionan: cada término debe aparecer completo
+                scores = [self._score(doc, token) for token in tokens]
+                if all(scores):
+                    ranked.append((-sum(scores), -doc['rating'], doc_id))
+
+            ranked.sort()
+            elapsed = time.perf_counter() - start
+            self._stats['searches'] += 1
+            self._stats['search_time_total'] += elapsed
+            self._stats['search_time_max'] = max(self._stats['search_time_max'], elapsed)
+
+        return [doc_id for _, _, doc_id in ranked]
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data['documents'] = len(self._docs)
+            data['grams'] = len(self._postings)
+            data['age'] = time.monotonic() - self._built_at if self._built_at is not None else None
+        data['search_time_avg'] = data['search_time_total'] / data['searches'] if data['searches'] else 0.0
+        return data
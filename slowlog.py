@@ -0,0 +1,161 @@
+# Registro de consultas lentas: JSON por línea en un archivo rotativo, con su EXPLAIN
+#
+# Se engancha al pool como listener de consultas (ver InstrumentedCursor en
+# db.py). Cada sentencia que supera el umbral deja una línea con la SQL
+# normalizada, la forma de los parámetros (tipos y tamaños, nunca valores:
+# hay correos y contraseñas de por medio), la ruta y los tiempos. La primera
+# vez que una sentencia resulta lenta, un hilo aparte le hace EXPLAIN con
+# una conexión propia y lo deja en una línea `explain` con la misma huella.
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from datetime import datetime
+
+from flask import has_request_context, request
+
+from db import DB_ERRORS, normalize_statement
+
+# Sentencias a las que se les puede pedir el plan (en MySQL y en SQLite)
+EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE')
+
+
+def fingerprint(statement):
+    return hashlib.sha1(statement.encode('utf-8')).hexdigest()[:16]
+
+
+def _shape(value):
+    if value is None:
+        return 'null'
+    if isinstance(value, (str, bytes, bytearray)):
+        return f'{type(value).__name__}({len(value)})'
+    if isinstance(value, (list, tuple)):
+        return [_shape(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _shape(item) for key, item in value.items()}
+    return type(value).__name__
+
+
+def params_shape(params, many=False):
+    """Tipos y longitudes de los parámetros; de un executemany, el total y la primera fila."""
+    if many:
+        rows = list(params or ())
+        return {'rows': len(rows), 'first': _shape(rows[0]) if rows else None}
+    return _shape(params)
+
+
+class SlowQueryLog:
+    """Listener del pool que escribe las sentencias de al menos `threshold` segundos.
+
+    El archivo rota al llegar a `max_bytes` y guarda `backup_count`
+    anteriores. `connect` abre la conexión (fuera del pool) con la que se
+    piden los planes a `backend.explain`; sin ella no se captura EXPLAIN.
+    """
+
+    def __init__(self, path, threshold=0.2, max_bytes=10 * 1024 * 1024, backup_count=5,
+                 backend=None, connect=None, max_explained=2000):
+        self.path = path
+        self.threshold = threshold
+        self._backend = backend
+        self._connect = connect
+        self._connection = None
+        self.max_explained = max_explained
+        self._explained = set()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=100)
+        self._thread = None
+        self._stats = {'slow_queries': 0, 'explains': 0, 'explain_errors': 0, 'explains_dropped': 0}
+
+        # Logger propio, sin propagar: las líneas sólo van al archivo
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                                       encoding='utf-8', delay=True)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self._logger = logging.getLogger(f'paso.slowqueries.{id(self)}')
+        self._logger.handlers = [handler]
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+
+    def __call__(self, query, params, elapsed, rows):
+        if elapsed < self.threshold:
+            return
+        statement = normalize_statement(query)
+        if statement.upper().startswith('EXPLAIN'):
+            return
+        key = fingerprint(statement)
+        entry = {
+            'type': 'slow_query',
+            'time': datetime.now().isoformat(timespec='milliseconds'),
+            'duration_ms': round(elapsed * 1000, 2),
+            'rows': rows,
+            'fingerprint': key,
+            'statement': statement,
+            'params': params_shape(params, many=isinstance(params, list) and bool(params)
+                                   and isinstance(params[0], (list, tuple))),
+            'pid': os.getpid()
+        }
+        if has_request_context():
+            entry['route'] = request.url_rule.rule if request.url_rule else request.path
+            entry['method'] = request.method
+        else:
+            entry['route'] = threading.current_thread().name
+        self._write(entry)
+
+        with self._lock:
+            self._stats['slow_queries'] += 1
+            first = key not in self._explained and len(self._explained) < self.max_explained
+            if first:
+                self._explained.add(key)
+        if first and self._connect is not None and statement.upper().startswith(EXPLAINABLE):
+            self._schedule(key, query, params)
+
+    def _write(self, entry):
+        self._logger.info(json.dumps(entry, ensure_ascii=False, default=str))
+
+    def _schedule(self, key, query, params):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._explain_forever, name='slow-query-explain',
+                                                daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait((key, query, params))
+        except queue.Full:
+            with self._lock:
+                self._stats['explains_dropped'] += 1
+                # Se reintentará la próxima vez que la sentencia sea lenta
+                self._explained.discard(key)
+
+    def _explain_forever(self):
+        while True:
+            key, query, params = self._queue.get()
+            try:
+                if self._connection is None:
+                    self._connection = self._connect()
+                plan = self._backend.explain(self._connection, query, params)
+                self._connection.rollback()
+                self._write({'type': 'explain', 'fingerprint': key, 'statement': normalize_statement(query),
+                             'plan': plan})
+                with self._lock:
+                    self._stats['explains'] += 1
+            except DB_ERRORS as err:
+                with self._lock:
+                    self._stats['explain_errors'] += 1
+                self._write({'type': 'explain', 'fingerprint': key, 'error': str(err)})
+                # La conexión pudo quedar inservible: se abre otra en el siguiente plan
+                if self._connection is not None:
+                    try:
+                        self._connection.close()
+                    except Exception:
+                        pass
+                    self._connection = None
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data['explained'] = len(self._explained)
+        data['path'] = self.path
+        data['threshold_ms'] = self.threshold * 1000
+        return data
@@ -0,0 +1,73 @@
+# Respuestas en streaming (JSON / NDJSON) para descargar listados completos
+from flask import Response, current_app, stream_with_context
+
+from db import DB_ERRORS
+from rowmap import ROWS
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Filas que se leen del cursor y se serializan por cada fragmento enviado
+CHUNK_ROWS = 500
+
+
+def wants_stream(request):
+    if request.args.get('stream', '').lower() in ('1', 'true'):
+        return True
+    return wants_ndjson(request)
+
+
+def wants_ndjson(request):
+    # Sólo cuando el cliente lo pide explícitamente, no por un comodín */*
+    return any(mimetype == NDJSON_MIMETYPE and quality > 0 for mimetype, quality in request.accept_mimetypes)
+
+
+def stream_query(pool, request, query, params=(), wrap_key=None):
+    """Ejecuta `query` con un cursor sin buffer y envía las filas a medida que se leen.
+
+    La conexión queda tomada del pool hasta que termina (o se corta) la
+    respuesta. En modo JSON se envía un arreglo, o un objeto `{wrap_key: [...]}`
+    para conservar la forma de la respuesta paginada.
+    """
+    ndjson = wants_ndjson(request)
+    connection = pool.get_connection()
+    try:
+        cursor = connection.cursor(buffered=False)
+        cursor.execute(query, params)
+    except Exception:
+        connection.close()
+        raise
+
+    dumps = current_app.json.dumps
+
+    def generate():
+        try:
+            if ndjson:
+                while True:
+                    rows = ROWS.fetchmany(cursor, CHUNK_ROWS)
+                    if not rows:
+                        break
+                    yield ''.join(dumps(row) + '\n' for row in rows)
+            else:
+                yield '{"%s":[' % wrap_key if wrap_key else '['
+                separator = ''
+                while True:
+                    rows = ROWS.fetchmany(cursor, CHUNK_ROWS)
+                    if not rows:
+                        break
+                    yield separator + ','.join(dumps(row) for row in rows)
+                    separator = ','
+                yield ']}' if wrap_key else ']'
+        finally:
+            try:
+                cursor.close()
+            except DB_ERRORS:
+                # Filas sin leer si el cliente cortó la descarga; el pool descarta la conexión
+                pass
+            connection.close()
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype=NDJSON_MIMETYPE if ndjson else 'application/json'
+    )
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
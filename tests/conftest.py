@@ -0,0 +1,115 @@
+# Pruebas sobre el backend SQLite en memoria (mismo esquema que MySQL, ver db.py)
+import itertools
+import os
+import sys
+
+os.environ['DB_BACKEND'] = 'sqlite'
+os.environ['SQLITE_PATH'] = ':memory:'
+os.environ['BCRYPT_ROUNDS'] = '4'
+os.environ['BCRYPT_WORKERS'] = '1'
+os.environ['SLOW_QUERY_LOG'] = ''
+os.environ.pop('METRICS_DIR', None)
+os.environ.pop('SOCKETIO_MESSAGE_QUEUE', None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import app as paso
+
+paso.app.config['SECRET_KEY'] = 'pruebas'
+
+_sequence = itertools.count(1)
+
+
+@pytest.fixture
+def client():
+    return paso.app.test_client()
+
+
+@pytest.fixture
+def app_module():
+    return paso
+
+
+@pytest.fixture
+def make_user(client):
+    """Registra un usuario nuevo; devuelve (id, encabezados con su token)."""
+    def make():
+        n = next(_sequence)
+        email = f'usuario{n}@paso.mx'
+        response = client.post('/register', json={
+            'usuario': f'usuario{n}', 'correo': email, 'contraseña': 'secreta',
+            'APaterno': 'A', 'AMaterno': 'B', 'fecha_nacimiento': '1990-01-01', 'sexo': 'F'
+        })
+        assert response.status_code == 201, response.get_data(as_text=True)
+        token = client.post('/login', json={'email': email, 'password': 'secreta'}).json['token']
+        headers = {'Authorization': 'Bearer ' + token}
+        user_id = client.get('/profile', headers=headers).json['user_id']
+        return user_id, headers
+    return make
+
+
+@pytest.fixture
+def make_trip(client):
+    def make(headers, destination='CDMX', arrival_date='2025-01-01'):
+        response = client.post('/registrarViaje', headers=headers, json={
+            'departureCity': 'León', 'destination': destination, 'arrivalDate': arrival_date,
+            'returnDate': '2025-02-01', 'coldContainers': 1, 'hotContainers': 0
+        })
+        assert response.status_code == 201, response.get_data(as_text=True)
+        connection = paso.db_pool.get_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT MAX(id) FROM viajes")
+            trip_id = cursor.fetchone()[0]
+            cursor.close()
+        finally:
+            connection.close()
+        return trip_id
+    return make
+
+
+@pytest.fixture
+def make_shop(client):
+    def make(name=None, city='León'):
+        name = name or f'Tienda {next(_sequence)}'
+        response = client.post('/add-shop', json={
+            'name': name, 'address': 'Calle 1', 'state': 'Gto', 'city': city,
+            'schedule': '9-5', 'phone': '1', 'email': 't@paso.mx', 'logo_url': 'u'
+        })
+        assert response.status_code == 201, response.get_data(as_text=True)
+        connection = paso.db_pool.get_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT MAX(id) FROM tiendas")
+            shop_id = cursor.fetchone()[0]
+            cursor.close()
+        finally:
+            connection.close()
+        return shop_id
+    return make
+
+
+@pytest.fixture
+def make_order(client):
+    def make(buyer_id, buyer_headers, trip_id, shop_id):
+        client.post('/cards/add', headers=buyer_headers, json={
+            'cardName': 'A B', 'cardNumber': '4111111111111111', 'expiryDate': '12/30'
+        })
+        card_id = client.get('/cards', headers=buyer_headers).json[0]['id']
+        response = client.post('/enviarPedido', headers=buyer_headers, json={
+            'userId': buyer_id, 'storeId': shop_id, 'tripId': trip_id, 'cardId': card_id,
+            'total': '10.00', 'details': 'x', 'state': 'Pendiente'
+        })
+        assert response.status_code == 201, response.get_data(as_text=True)
+        connection = paso.db_pool.get_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT MAX(id) FROM pedidos")
+            order_id = cursor.fetchone()[0]
+            cursor.close()
+        finally:
+            connection.close()
+        return order_id
+    return make
@@ -0,0 +1,83 @@
+import json
+
+from db import MySQLBackend
+
+
+def fetch(app_module, query, params=()):
+    connection = app_module.db_pool.get_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+    finally:
+        connection.close()
+
+
+def setup_orders(make_user, make_trip, make_shop, make_order, count=3):
+    buyer_id, buyer = make_user()
+    driver_id, driver = make_user()
+    trip_id = make_trip(driver)
+    shop_id = make_shop()
+    order_ids = [make_order(buyer_id, buyer, trip_id, shop_id) for _ in range(count)]
+    return buyer_id, driver_id, driver, order_ids
+
+
+def test_bulk_state_updates_only_the_drivers_orders(client, app_module, make_user, make_trip, make_shop, make_order):
+    buyer_id, driver_id, driver, order_ids = setup_orders(make_user, make_trip, make_shop, make_order)
+    _, stranger = make_user()
+
+    response = client.put('/pedidos/estado', headers=stranger, json={'orderIds': order_ids, 'state': 'Aceptado'})
+    assert response.status_code == 200 and response.json['updated'] == []
+
+    response = client.put('/pedidos/estado', headers=driver, json={'orderIds': order_ids + [999999], 'state': 'Aceptado'})
+    assert response.json == {'updated': order_ids, 'not_found': [999999]}
+    states = fetch(app_module, "SELECT DISTINCT estado FROM pedidos WHERE id IN ({})".format(
+        ', '.join(['%s'] * len(order_ids))), order_ids)
+    assert states == [('Aceptado',)]
+
+    # Un solo evento por usuario con todos sus pedidos
+    events = fetch(app_module, "SELECT destinatarios, datos FROM pedido_eventos WHERE evento = 'lote' AND pedido_id = %s",
+                   (order_ids[0],))
+    recipients = sorted(row[0] for row in events)
+    assert recipients == sorted([str(buyer_id), str(driver_id)])
+    assert all(json.loads(row[1])['order_ids'] == order_ids for row in events)
+
+
+def test_bulk_delivery_counts_one_trip(client, app_module, make_user, make_trip, make_shop, make_order):
+    _, driver_id, driver, order_ids = setup_orders(make_user, make_trip, make_shop, make_order)
+    travels = fetch(app_module, "SELECT travels FROM profiles WHERE user_id = %s", (driver_id,))[0][0]
+
+    assert client.put(f'/pedidos/{order_ids[0]}/entregado', headers=driver).status_code == 200
+    response = client.put('/pedidos/entregado', headers=driver, json={'orderIds': order_ids})
+    assert response.json == {'updated': order_ids[1:], 'already_delivered': order_ids[:1], 'not_found': []}
+    assert fetch(app_module, "SELECT travels FROM profiles WHERE user_id = %s", (driver_id,))[0][0] == travels + 2
+
+
+def test_bulk_request_validation(client, make_user, app_module):
+    _, headers = make_user()
+    assert client.put('/pedidos/estado', headers=headers, json={'orderIds': [1]}).status_code == 400
+    assert client.put('/pedidos/entregado', headers=headers, json={'orderIds': 'x'}).status_code == 400
+    too_many = list(range(1, app_module.BULK_ORDER_LIMIT + 2))
+    assert client.put('/pedidos/entregado', headers=headers, json={'orderIds': too_many}).status_code == 400
+
+
+class RecordingCursor:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, query, params=()):
+        self.statements.append(query)
+
+    def fetchall(self):
+        return []
+
+
+def test_bulk_delivery_reads_its_orders_with_a_lock(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'db_backend', MySQLBackend({}))
+    cursor = RecordingCursor()
+    app_module.order_participants(cursor, [1, 2], driver=3, lock=True)
+    app_module.order_participants(cursor, [1, 2], driver=3)
+    assert cursor.statements[0].endswith(' FOR UPDATE')
+    assert 'FOR UPDATE' not in cursor.statements[1]
@@ -0,0 +1,37 @@
+import cache as cache_module
+from cache import TTLCache
+
+
+def test_invalidate_prefix_only_drops_matching_keys():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set(('products', '1', 0), 'a')
+    cache.set(('products', '2', 0), 'b')
+    cache.invalidate_prefix(('products', '1'))
+    assert cache.get(('products', '1', 0)) is None
+    assert cache.get(('products', '2', 0)) == 'b'
+
+
+def test_new_shop_invalidates_the_shop_listing(client, make_shop):
+    make_shop(city='Silao')
+    assert len(client.get('/get-tiendas?city=Silao').json) == 1
+    shop_id = make_shop(city='Silao')
+    after = client.get('/get-tiendas?city=Silao').json
+    assert [shop['id'] for shop in after][-1] == shop_id and len(after) == 2
+
+
+def test_shop_added_by_another_worker_shows_up_after_the_ttl(client, app_module, make_shop, monkeypatch):
+    make_shop(city='Celaya')
+    assert len(client.get('/get-tiendas?city=Celaya').json) == 1
+
+    # Alta hecha en otro worker: esta caché no se entera
+    connection = app_module.db_pool.get_connection()
+    cursor = connection.cursor()
+    cursor.execute("INSERT INTO tiendas (nombre, ciudad) VALUES (%s, %s)", ('Otra', 'Celaya'))
+    connection.commit()
+    cursor.close()
+    connection.close()
+    assert len(client.get('/get-tiendas?city=Celaya').json) == 1
+
+    now = cache_module.time.monotonic()
+    monkeypatch.setattr(cache_module.time, 'monotonic', lambda: now + app_module.catalog_cache.ttl)
+    assert len(client.get('/get-tiendas?city=Celaya').json) == 2
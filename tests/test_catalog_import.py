@@ -0,0 +1,110 @@
+import io
+import json
+
+import pytest
+
+import catalog_import
+
+
+def test_json_array_import_reports_row_errors(client):
+    rows = [{'name': f'Importada {n}', 'city': 'León'} for n in range(1200)] + [{'city': 'sin nombre'}]
+    response = client.post('/import-shops', data=json.dumps(rows), content_type='application/json')
+    assert response.status_code == 200
+    summary = response.json
+    assert summary['inserted'] == 1200 and summary['failed'] == 1
+    assert summary['errors'] == [{'row': 1201, 'error': 'name es requerido'}]
+
+
+def test_ndjson_products_for_missing_shops_are_rejected(client, make_shop):
+    shop_id = make_shop()
+    lines = [json.dumps({'shop': shop_id if n % 2 else 999999, 'name': f'P{n}', 'quantity': 1, 'unit': 'kg',
+                         'storePrice': '1.50', 'publicPrice': 2, 'image': 'i'}) for n in range(10)]
+    response = client.post('/import-products', data='\n'.join(lines) + '\n{roto\n', content_type='application/x-ndjson')
+    summary = response.json
+    assert summary['inserted'] == 5 and summary['failed'] == 6
+    assert {'row': 1, 'error': 'La tienda 999999 no existe'} in summary['errors']
+    assert len(client.get(f'/products?store_id={shop_id}').json) == 5
+
+
+def test_csv_import_validates_types(client, make_shop):
+    shop_id = make_shop()
+    body = ('shop,name,quantity,unit,storePrice,publicPrice,image\n'
+            f'{shop_id},Café,2,kg,1,2,i\n{shop_id},X,2.5,kg,1,2,i\n{shop_id},Y,2,kg,-1,2,i\n')
+    summary = client.post('/import-products', data=body.encode(), content_type='text/csv').json
+    assert summary['inserted'] == 1
+    assert [error['row'] for error in summary['errors']] == [2, 3]
+
+
+def test_unsupported_content_type(client):
+    assert client.post('/import-shops', data='x', content_type='text/plain').status_code == 415
+
+
+def test_json_array_is_read_incrementally(monkeypatch):
+    monkeypatch.setattr(catalog_import, 'READ_SIZE', 3)
+    items = [{'n': n, 'texto': 'ñ' * n} for n in range(20)] + [12345]
+    records = catalog_import.read_records(io.BytesIO(json.dumps(items).encode()), 'application/json')
+    assert [record for _, record in records] == items
+
+
+def test_truncated_body_keeps_committed_rows_and_answers_200(client):
+    body = json.dumps([{'name': f'Parcial {n}', 'city': 'Irapuato'} for n in range(3)])[:-1] + ', {"name": '
+    response = client.post('/import-shops', data=body, content_type='application/json')
+    assert response.status_code == 200
+    assert response.json['inserted'] == 3 and 'aborted' in response.json
+    assert len(client.get('/get-tiendas?city=Irapuato').json) == 3
+
+
+def test_unreadable_body_with_nothing_saved_is_a_400(client):
+    response = client.post('/import-shops', data='[{"name": ', content_type='application/json')
+    assert response.status_code == 400
+    assert response.json['inserted'] == 0 and 'aborted' in response.json
+
+
+class CountingStream(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.read_bytes = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.read_bytes += len(data)
+        return data
+
+    def read1(self, size=-1):
+        data = super().read1(size)
+        self.read_bytes += len(data)
+        return data
+
+    def readinto(self, buffer):
+        count = super().readinto(buffer)
+        self.read_bytes += count
+        return count
+
+
+def test_malformed_array_stops_without_reading_the_rest():
+    rest = json.dumps([{'name': 'x' * 50}] * 50000).encode()
+    stream = CountingStream(b'[{"name": "a"}, {roto' + rest[1:])
+    with pytest.raises(catalog_import.ImportFormatError):
+        list(catalog_import.read_records(stream, 'application/json'))
+    assert stream.read_bytes < len(rest) / 10
+
+
+def test_elements_cut_between_reads_are_completed(monkeypatch):
+    monkeypatch.setattr(catalog_import, 'READ_SIZE', 2)
+    items = [{'texto': 'comillas \\" y \\u00f1 ñ', 'n': 12345.5, 'ok': True, 'nada': None}] * 3
+    records = catalog_import.read_records(io.BytesIO(json.dumps(items).encode()), 'application/json')
+    assert [record for _, record in records] == items
+
+
+def test_oversized_elements_are_rejected(monkeypatch):
+    monkeypatch.setattr(catalog_import, 'MAX_RECORD_SIZE', 1000)
+    monkeypatch.setattr(catalog_import, 'READ_SIZE', 100)
+    body = json.dumps([{'name': 'a'}, {'name': 'x' * 5000}]).encode()
+    records = catalog_import.read_records(io.BytesIO(body), 'application/json')
+    assert next(records) == (1, {'name': 'a'})
+    with pytest.raises(catalog_import.ImportFormatError):
+        next(records)
+
+    lines = (json.dumps({'name': 'a'}) + '\n' + json.dumps({'name': 'x' * 5000}) + '\n').encode()
+    with pytest.raises(catalog_import.ImportFormatError):
+        list(catalog_import.read_records(io.BytesIO(lines), 'application/x-ndjson'))
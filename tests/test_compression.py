@@ -0,0 +1,58 @@
+import gzip
+
+import pytest
+from flask import Flask, jsonify
+
+import compression
+from compression import ResponseCompressor
+
+BODY = {'tiendas': [{'nombre': f'Tienda {n}', 'ciudad': 'León'} for n in range(100)]}
+
+
+@pytest.fixture
+def compressed_app():
+    app = Flask(__name__)
+
+    @app.route('/grande')
+    def large():
+        return jsonify(BODY)
+
+    @app.route('/chica')
+    def small():
+        return jsonify({'ok': True})
+
+    compressor = ResponseCompressor(app, min_size=200)
+    return app, compressor
+
+
+def test_brotli_is_installed():
+    # Está en requirements.txt: sin él sólo habría gzip
+    assert compression.brotli is not None
+
+
+@pytest.mark.parametrize('accept, encoding', [('br, gzip', 'br'), ('gzip', 'gzip'), ('br;q=0, gzip', 'gzip')])
+def test_negotiates_the_encoding(compressed_app, accept, encoding):
+    app, _ = compressed_app
+    response = app.test_client().get('/grande', headers={'Accept-Encoding': accept})
+    assert response.headers['Content-Encoding'] == encoding
+    assert 'Accept-Encoding' in response.headers['Vary']
+    data = response.get_data()
+    raw = compression.brotli.decompress(data) if encoding == 'br' else gzip.decompress(data)
+    assert raw == app.test_client().get('/grande').get_data()
+
+
+def test_small_or_unrequested_responses_are_untouched(compressed_app):
+    app, _ = compressed_app
+    client = app.test_client()
+    assert 'Content-Encoding' not in client.get('/chica', headers={'Accept-Encoding': 'gzip'}).headers
+    assert 'Content-Encoding' not in client.get('/grande').headers
+
+
+def test_public_responses_reuse_the_compressed_bytes(compressed_app):
+    app, compressor = compressed_app
+    client = app.test_client()
+    for _ in range(3):
+        client.get('/grande', headers={'Accept-Encoding': 'br'})
+    client.get('/grande', headers={'Accept-Encoding': 'br', 'Authorization': 'Bearer x'})
+    stats = compressor.stats()['routes']['/grande']
+    assert stats['responses'] == 4 and stats['cache_hits'] == 2
@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+from db import ConnectionPool, PoolTimeoutError, normalize_statement
+
+
+class FakeConnection:
+    def __init__(self):
+        self.in_transaction = False
+        self.rollbacks = 0
+        self.closed = False
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def ping(self, reconnect=False):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def test_connections_are_reused():
+    created = []
+    pool = ConnectionPool(lambda: created.append(FakeConnection()) or created[-1], size=2)
+    first = pool.get_connection()
+    raw = first._raw
+    first.close()
+    second = pool.get_connection()
+    assert second._raw is raw and len(created) == 1
+    second.close()
+    assert pool.stats()['created'] == 1
+
+
+def test_pool_size_is_bounded():
+    pool = ConnectionPool(FakeConnection, size=1, timeout=0.05)
+    held = pool.get_connection()
+    with pytest.raises(PoolTimeoutError):
+        pool.get_connection()
+
+    # Al devolverla, quien espera la recibe
+    threading.Timer(0.02, held.close).start()
+    pool.timeout = 1
+    pool.get_connection().close()
+    assert pool.stats()['timeouts'] == 1 and pool.stats()['waits'] == 1
+
+
+def test_release_rolls_back_open_transactions_once():
+    pool = ConnectionPool(FakeConnection, size=1)
+    connection = pool.get_connection()
+    raw = connection._raw
+    raw.in_transaction = True
+    connection.close()
+    connection.close()
+    assert raw.rollbacks == 1
+    assert pool.get_connection()._raw is raw
+
+
+def test_in_lists_of_any_size_normalize_alike():
+    one = normalize_statement("SELECT * FROM pedidos\n  WHERE id IN (%s);")
+    many = normalize_statement("SELECT * FROM pedidos WHERE id IN (%s, %s, %s)")
+    assert one == many == 'SELECT * FROM pedidos WHERE id IN (...)'
@@ -0,0 +1,55 @@
+import json
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from jsoncodec import FastJSONProvider, orjson
+
+ROW = {
+    'fecha_creacion': datetime(2025, 1, 1, 8, 30, 15),
+    'arrival_date': date(2025, 2, 1),
+    'actualizado': datetime(2025, 3, 9, 23, 59, tzinfo=timezone(timedelta(hours=-6))),
+    'total': Decimal('12.50'),
+    'nombre': 'Café',
+}
+
+BACKENDS = [False] + ([True] if orjson is not None else [])
+
+
+@pytest.mark.parametrize('use_orjson', BACKENDS)
+def test_dates_match_the_default_provider(use_orjson):
+    app = Flask(__name__)
+    expected = json.loads(DefaultJSONProvider(app).dumps(ROW))
+    actual = json.loads(FastJSONProvider(app, use_orjson=use_orjson).dumps(ROW))
+    for field in ('fecha_creacion', 'arrival_date', 'actualizado'):
+        assert actual[field].encode() == expected[field].encode()
+    assert actual == expected
+
+
+@pytest.mark.parametrize('use_orjson', BACKENDS)
+def test_date_format_matches_werkzeug_across_the_calendar(use_orjson):
+    app = Flask(__name__)
+    provider = FastJSONProvider(app, use_orjson=use_orjson)
+    values = [datetime(2024, 2, 29, 0, 0, 1) + timedelta(days=n * 37, seconds=n * 3671) for n in range(200)]
+    values += [value.date() for value in values] + [datetime(999, 12, 31, 23, 59, 59),
+                                                      datetime(2025, 1, 1, 0, 30, tzinfo=timezone(timedelta(hours=5)))]
+    assert json.loads(provider.dumps(values)) == json.loads(DefaultJSONProvider(app).dumps(values))
+
+
+@pytest.mark.parametrize('use_orjson', BACKENDS)
+def test_output_is_compact_sorted_utf8(use_orjson):
+    app = Flask(__name__)
+    provider = FastJSONProvider(app, use_orjson=use_orjson)
+    assert provider.dumps({'b': Decimal('1.10'), 'a': 'ñ', 'c': timedelta(hours=-1)}) == \
+        '{"a":"ñ","b":"1.10","c":"-1:00:00"}'
+
+
+def test_both_backends_agree():
+    if orjson is None:
+        pytest.skip('orjson no está instalado')
+    app = Flask(__name__)
+    rows = [dict(ROW, id=n) for n in range(5)]
+    assert FastJSONProvider(app, use_orjson=True).dumps(rows) == FastJSONProvider(app, use_orjson=False).dumps(rows)
@@ -0,0 +1,53 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from metrics import RETIRED_FILE, MetricsRegistry, clear_directory
+
+
+@pytest.mark.parametrize('path', ['/metrics', '/internal/stats'])
+def test_internal_routes_are_restricted(client, app_module, monkeypatch, path):
+    assert client.get(path).status_code == 200
+    outside = {'REMOTE_ADDR': '203.0.113.7'}
+    assert client.get(path, environ_base=outside).status_code == 403
+
+    monkeypatch.setattr(app_module, 'INTERNAL_TOKEN', 'secreto')
+    assert client.get(path, environ_base=outside, headers={'Authorization': 'Bearer otro'}).status_code == 403
+    assert client.get(path, environ_base=outside, headers={'Authorization': 'Bearer secreto'}).status_code == 200
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def test_dead_workers_are_retired_without_lowering_totals(tmp_path):
+    registry = MetricsRegistry(directory=str(tmp_path))
+    requests = registry.counter('paso_pruebas_total', 'Pruebas', ('route',))
+    requests.inc('/a')
+    key = json.dumps(['/a'])
+
+    alive = tmp_path / f'metrics-{os.getppid()}.json'
+    alive.write_text(json.dumps({'paso_pruebas_total': {key: 2}}))
+    for _ in range(2):
+        (tmp_path / f'metrics-{dead_pid()}.json').write_text(json.dumps({'paso_pruebas_total': {key: 4}}))
+
+    assert registry.collect()['paso_pruebas_total'] == {key: 11}
+    assert sorted(path.name for path in tmp_path.glob('metrics-*.json')) == sorted([alive.name, RETIRED_FILE])
+
+    # Otro worker que termina se suma a los ya retirados
+    (tmp_path / f'metrics-{dead_pid()}.json').write_text(json.dumps({'paso_pruebas_total': {key: 1}}))
+    assert registry.collect()['paso_pruebas_total'] == {key: 12}
+    assert registry.collect()['paso_pruebas_total'] == {key: 12}
+
+
+def test_clear_directory(tmp_path):
+    (tmp_path / 'metrics-1.json').write_text('{}')
+    (tmp_path / RETIRED_FILE).write_text('{}')
+    (tmp_path / 'otro.txt').write_text('')
+    clear_directory(str(tmp_path))
+    assert [path.name for path in tmp_path.iterdir()] == ['otro.txt']
@@ -0,0 +1,61 @@
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from pagination import InvalidPageRequest, decode_cursor, encode_cursor, page_size, split_page
+
+
+def test_cursor_round_trip():
+    token = encode_cursor(('2025-01-01', 7))
+    assert decode_cursor(MultiDict({'cursor': token}), 2) == ['2025-01-01', 7]
+
+
+def test_missing_cursor_is_first_page():
+    assert decode_cursor(MultiDict(), 1) is None
+
+
+@pytest.mark.parametrize('token', ['no-es-base64!', encode_cursor((1,)), 'e30', 'W1sxXSwxXQ', 'W3siYSI6MX0sMV0'])
+def test_malformed_cursor_is_rejected(token):
+    with pytest.raises(InvalidPageRequest):
+        decode_cursor(MultiDict({'cursor': token}), 2)
+
+
+@pytest.mark.parametrize('limit, expected', [(None, 50), ('5', 5), ('1000', 200)])
+def test_page_size(limit, expected):
+    assert page_size(MultiDict({'limit': limit} if limit else {})) == expected
+
+
+@pytest.mark.parametrize('limit', ['0', 'x'])
+def test_invalid_page_size(limit):
+    with pytest.raises(InvalidPageRequest):
+        page_size(MultiDict({'limit': limit}))
+
+
+def test_split_page_returns_cursor_only_when_more_rows():
+    rows = [{'id': n} for n in range(4)]
+    page, cursor = split_page(rows, 3, lambda row: (row['id'],))
+    assert len(page) == 3 and decode_cursor(MultiDict({'cursor': cursor}), 1) == [2]
+    assert split_page(rows, 4, lambda row: (row['id'],)) == (rows, None)
+
+
+def test_trips_are_paged_without_gaps_or_repeats(client, make_user, make_trip):
+    _, headers = make_user()
+    created = {make_trip(headers, destination='Paginada', arrival_date=f'2025-03-0{day}') for day in (1, 2, 2, 3, 4)}
+
+    seen = []
+    cursor = None
+    while True:
+        url = '/viajes?destination=Paginada&limit=2' + (f'&cursor={cursor}' if cursor else '')
+        response = client.get(url)
+        assert response.status_code == 200
+        seen.extend(trip['id'] for trip in response.json['trips'])
+        cursor = response.json['next_cursor']
+        if not cursor:
+            break
+    assert sorted(seen) == sorted(created) and len(seen) == len(created)
+
+
+@pytest.mark.parametrize('token', ['basura', 'W1sxXSwxXQ'])
+def test_invalid_cursor_is_a_400(client, token):
+    response = client.get('/viajes?cursor=' + token)
+    assert response.status_code == 400
+    assert response.json == {'error': 'Cursor inválido.'}
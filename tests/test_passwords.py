@@ -0,0 +1,13 @@
+import pytest
+
+from passwords import PasswordHasher
+
+
+@pytest.mark.parametrize('cost, expected', [(4, True), (6, False), (8, False)])
+def test_needs_rehash_only_raises_the_cost(cost, expected):
+    hasher = PasswordHasher(workers=1, rounds=6)
+    assert hasher.needs_rehash(f'$2b${cost:02d}$' + 'x' * 53) is expected
+
+
+def test_needs_rehash_ignores_unknown_formats():
+    assert PasswordHasher(workers=1).needs_rehash('texto-plano') is False
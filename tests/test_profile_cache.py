@@ -0,0 +1,47 @@
+import cache as cache_module
+from cache import TTLCache
+
+
+def test_value_read_before_an_invalidation_is_not_stored():
+    cache = TTLCache(maxsize=10, ttl=60)
+    snapshot = cache.snapshot()
+    cache.invalidate(('shops', 0))
+    cache.set(('shops', 0), 'viejo', since=snapshot)
+    assert cache.get(('shops', 0)) is None
+
+
+def test_entries_expire(monkeypatch):
+    cache = TTLCache(maxsize=10, ttl=1)
+    cache.set('k', 'v')
+    now = cache_module.time.monotonic()
+    monkeypatch.setattr(cache_module.time, 'monotonic', lambda: now + 2)
+    assert cache.get('k') is None
+
+
+def test_order_refreshes_the_buyer_profile(client, make_user, make_trip, make_shop, make_order):
+    buyer_id, buyer = make_user()
+    _, driver = make_user()
+    trip_id = make_trip(driver)
+    shop_id = make_shop()
+
+    assert client.get('/profile', headers=buyer).json['orderCount'] == 0
+    make_order(buyer_id, buyer, trip_id, shop_id)
+    assert client.get('/profile', headers=buyer).json['orderCount'] == 1
+
+
+def test_order_with_text_user_id_refreshes_the_profile(client, make_user, make_trip, make_shop, make_order):
+    buyer_id, buyer = make_user()
+    _, driver = make_user()
+    trip_id = make_trip(driver)
+    shop_id = make_shop()
+    make_order(buyer_id, buyer, trip_id, shop_id)
+    assert client.get('/profile', headers=buyer).json['orderCount'] == 1
+
+    card_id = client.get('/cards', headers=buyer).json[0]['id']
+    order = {'userId': str(buyer_id), 'storeId': shop_id, 'tripId': trip_id, 'cardId': card_id,
+             'total': '10.00', 'details': 'x', 'state': 'Pendiente'}
+    assert client.post('/enviarPedido', headers=buyer, json=order).status_code == 201
+    assert client.get('/profile', headers=buyer).json['orderCount'] == 2
+
+    order['userId'] = 'uno'
+    assert client.post('/enviarPedido', headers=buyer, json=order).status_code == 400
@@ -0,0 +1,24 @@
+import pytest
+
+from queryplans import full_scans
+
+
+@pytest.mark.parametrize('row, flagged', [
+    ({'table': 'pedidos', 'type': 'ALL', 'possible_keys': None, 'key': None, 'rows': 10}, True),
+    # Había índices posibles pero el optimizador no eligió ninguno
+    ({'table': 'pedidos', 'type': 'ALL', 'possible_keys': 'idx_usuario', 'key': None, 'rows': 50000}, True),
+    # Tabla pequeña o vacía (base recién migrada): recorrerla es lo más barato
+    ({'table': 'pedidos', 'type': 'ALL', 'possible_keys': 'idx_usuario', 'key': None, 'rows': 1}, False),
+    ({'table': 'pedidos', 'type': 'ALL', 'possible_keys': None, 'key': None, 'rows': 1}, True),
+    ({'table': 'pedidos', 'type': 'index', 'possible_keys': None, 'key': 'PRIMARY', 'rows': 50000}, True),
+    ({'table': 'pedidos', 'type': 'index', 'possible_keys': None, 'key': 'PRIMARY', 'rows': 5}, False),
+    ({'table': 'pedidos', 'type': 'ref', 'possible_keys': 'idx_usuario', 'key': 'idx_usuario', 'rows': 50000}, False),
+])
+def test_mysql_full_scans(row, flagged):
+    assert bool(full_scans('mysql', [row])) is flagged
+
+
+def test_sqlite_full_scans():
+    plan = [{'detail': 'SCAN pedidos'}, {'detail': 'SCAN v USING INDEX idx_viajes_usuario'},
+            {'detail': 'SEARCH p USING INDEX idx (usuario_id=?)'}]
+    assert full_scans('sqlite', plan) == ['SCAN pedidos']
@@ -0,0 +1,53 @@
+import pytest
+
+
+def driver_rating(app_module, driver_id):
+    connection = app_module.db_pool.get_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT rating, rating_count FROM profiles WHERE user_id = %s", (driver_id,))
+        row = cursor.fetchone()
+        cursor.close()
+        return float(row[0]), row[1]
+    finally:
+        connection.close()
+
+
+def rate_trip(client, make_user, trip_id, rating):
+    _, rater = make_user()
+    return client.post('/calificarConductor', headers=rater, json={'tripId': trip_id, 'rating': rating})
+
+
+@pytest.mark.parametrize('rating', [4.5, 0, 6, '5', True])
+def test_only_whole_ratings_from_1_to_5(client, make_user, make_trip, rating):
+    _, driver = make_user()
+    trip_id = make_trip(driver)
+    assert rate_trip(client, make_user, trip_id, rating).status_code == 400
+
+
+@pytest.mark.parametrize('deferred', [False, True])
+def test_immediate_and_deferred_modes_agree(client, app_module, make_user, make_trip, monkeypatch, deferred):
+    monkeypatch.setattr(app_module, 'RATINGS_DEFERRED', deferred)
+    driver_id, driver = make_user()
+    trip_id = make_trip(driver)
+    for rating in (4, 5.0, 5):
+        assert rate_trip(client, make_user, trip_id, rating).status_code == 200
+
+    if deferred:
+        connection = app_module.db_pool.get_connection()
+        try:
+            app_module.apply_pending_ratings(connection)
+        finally:
+            connection.close()
+
+    rating, count = driver_rating(app_module, driver_id)
+    assert count == 3 and rating == pytest.approx(14 / 3)
+
+
+def test_a_trip_is_rated_once_per_user(client, make_user, make_trip):
+    _, driver = make_user()
+    trip_id = make_trip(driver)
+    _, rater = make_user()
+    body = {'tripId': trip_id, 'rating': 5}
+    assert client.post('/calificarConductor', headers=rater, json=body).status_code == 200
+    assert client.post('/calificarConductor', headers=rater, json=body).status_code == 409
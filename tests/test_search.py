@@ -0,0 +1,56 @@
+import json
+import threading
+
+from search import StoreSearchIndex, normalize
+
+
+def test_normalize_ignores_accents_case_and_signs():
+    assert normalize('Café-Doña  LUPE!') == 'cafe dona lupe'
+
+
+def test_search_ranks_name_prefix_first():
+    stores = [{'id': 1, 'nombre': 'Abarrotes', 'ciudad': 'León', 'direccion': 'Calle Café'},
+              {'id': 2, 'nombre': 'Café Uno', 'ciudad': 'León', 'direccion': ''},
+              {'id': 3, 'nombre': 'El Cafetal', 'ciudad': 'Silao', 'direccion': ''}]
+    index = StoreSearchIndex(lambda: stores)
+    assert index.search('cafe') == [2, 3, 1]
+    assert index.search('caf', city='silao') == [3]
+
+
+def test_store_added_during_a_rebuild_is_kept():
+    stores = [{'id': 1, 'nombre': 'Abarrotes', 'ciudad': 'León'}]
+    loading = threading.Event()
+    release = threading.Event()
+
+    def slow_loader():
+        rows = list(stores)
+        if index.stats()['builds']:
+            loading.set()
+            release.wait(5)
+        return rows
+
+    index = StoreSearchIndex(slow_loader)
+    index.search('abarrotes')
+
+    # La reconstrucción ya leyó la tabla cuando llega el alta
+    rebuild = threading.Thread(target=index.rebuild)
+    rebuild.start()
+    assert loading.wait(5)
+    new_store = {'id': 2, 'nombre': 'Café Nuevo', 'ciudad': 'León'}
+    stores.append(new_store)
+    index.add(new_store)
+    release.set()
+    rebuild.join(5)
+
+    assert index.search('cafe') == [2]
+
+
+def test_imported_shops_are_searchable_right_away(client, make_shop):
+    make_shop(name='Abarrotes Índice')
+    # Construye el índice y deja en caché la búsqueda vacía
+    assert client.get('/get-tiendas?search=cafe').json == []
+
+    response = client.post('/import-shops', data=json.dumps([{'name': 'Café Uno', 'city': 'León'}]),
+                           content_type='application/json')
+    assert response.json['inserted'] == 1
+    assert [shop['nombre'] for shop in client.get('/get-tiendas?search=cafe').json] == ['Café Uno']
@@ -0,0 +1,66 @@
+import json
+import time
+
+from slowlog import SlowQueryLog, fingerprint, params_shape
+
+QUERY = "SELECT id, nombre FROM tiendas WHERE ciudad = %s AND id IN (%s, %s)"
+
+
+def entries(path, kind=None):
+    if not path.exists():
+        return []
+    rows = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    return [row for row in rows if kind is None or row['type'] == kind]
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_only_statements_over_the_threshold_are_logged(tmp_path):
+    path = tmp_path / 'slow.log'
+    log = SlowQueryLog(str(path), threshold=0.2)
+    log(QUERY, ('León', 1, 2), 0.19, 1)
+    log(QUERY, ('León', 1, 2), 0.2, 1)
+    log("EXPLAIN " + QUERY, ('León', 1, 2), 5, 1)
+
+    logged = entries(path)
+    assert len(logged) == 1 and logged[0]['duration_ms'] == 200.0
+    assert log.stats()['slow_queries'] == 1
+
+
+def test_parameters_are_logged_by_shape_only(tmp_path):
+    path = tmp_path / 'slow.log'
+    log = SlowQueryLog(str(path), threshold=0)
+    secret = 'contraseña-secreta@paso.mx'
+    log("UPDATE usuarios SET correo = %s WHERE id = %s", (secret, 7), 0.5, 1)
+    log("INSERT INTO tiendas (nombre, ciudad) VALUES (%s, %s)", [(secret, None), ('b', 'c')], 0.5, 2)
+
+    text = path.read_text(encoding='utf-8')
+    assert secret not in text and '"7"' not in text
+    single, many = entries(path)
+    assert single['params'] == [f'str({len(secret)})', 'int']
+    assert many['params'] == {'rows': 2, 'first': [f'str({len(secret)})', 'null']}
+    assert params_shape({'a': b'xy'}) == {'a': 'bytes(2)'}
+
+
+def test_explain_runs_once_per_fingerprint(tmp_path, app_module):
+    path = tmp_path / 'slow.log'
+    log = SlowQueryLog(str(path), threshold=0, backend=app_module.db_backend, connect=app_module.db_backend.connect)
+    for cities in (('León', 1, 2), ('Silao', 3, 4), ('León', 5, 6)):
+        log(QUERY, cities, 0.5, 0)
+    # La lista IN de otro tamaño es la misma sentencia normalizada
+    log("SELECT id, nombre FROM tiendas WHERE ciudad = %s AND id IN (%s)", ('León', 1), 0.5, 0)
+    log("SELECT id FROM productos WHERE tienda_id = %s", (1,), 0.5, 0)
+
+    wait_for(lambda: len(entries(path, 'explain')) == 2)
+    time.sleep(0.1)
+    explains = entries(path, 'explain')
+    slow = entries(path, 'slow_query')
+    assert len(explains) == 2 and all('plan' in entry for entry in explains)
+    assert {entry['fingerprint'] for entry in explains} == {entry['fingerprint'] for entry in slow}
+    assert fingerprint(slow[0]['statement']) == slow[0]['fingerprint']
+    assert log.stats()['explains'] == 2 and log.stats()['explained'] == 2